@@ -3,10 +3,13 @@
 import os, sys
 import gradio as gr
 from src.gradio_demo import SadTalker
+from src.utils.model_registry import ModelRegistry
+from src.utils.job_scheduler import JobScheduler, render_devices, device_memory_gb
+from src.utils.render_planner import estimate_render_memory_gb, estimate_render_work
 
 # thêm import
 from home import create_home_tab, custom_home_css, create_global_navbar
-from lecture_output import generate_lecture_video_handler
+from lecture_output import generate_lecture_video_handler, parse_user_slides_text, lecture_project_name
 
 from index import create_index_interface
 from lecture_input import create_lecture_editor_interface
@@ -21,7 +24,23 @@ def switch_to(target, home, index, editor):
 
 def sadtalker_demo_with_home(checkpoint_path='checkpoints', config_path='src/config', warpfn=None):
     os.environ['PYTORCH_CUDA_ALLOC_CONF'] = 'max_split_size_mb:128'
-    sad_talker = SadTalker(checkpoint_path, config_path, lazy_load=True)
+
+    # Mỗi worker render sở hữu SadTalker + bộ model riêng trên thiết bị của nó; job chỉ được chạy khi
+    # bộ nhớ ước tính còn đủ. Job nhỏ (ít slide) được ưu tiên, job chờ lâu được nâng dần ưu tiên.
+    devices = render_devices()
+
+    def make_render_worker(i):
+        # các tensor tạo bằng kiểu 'torch.cuda.*' nằm trên GPU hiện tại của thread, mặc định là cuda:0
+        if devices[i].startswith('cuda'):
+            import torch
+            torch.cuda.set_device(devices[i])
+        return SadTalker(checkpoint_path, config_path, lazy_load=True, device=devices[i],
+                         model_registry=ModelRegistry(max_entries=1))
+
+    # ngân sách bộ nhớ riêng cho từng thiết bị: hai worker chung một GPU chia nhau bộ nhớ của GPU đó
+    scheduler = JobScheduler(make_render_worker, devices=devices,
+                             memory_budget_gb={d: 0.9 * gb for d, gb in device_memory_gb(devices).items()},
+                             aging_seconds=30.0)
 
     with gr.Blocks(analytics_enabled=False, title="SadTalker", css=custom_home_css()) as ui:
         app_state = gr.State({})
@@ -42,29 +61,76 @@ def sadtalker_demo_with_home(checkpoint_path='checkpoints', config_path='src/con
             with gr.Column(visible=False, elem_classes=["editor-page"]) as editor_page:
                 editor_cmp = create_lecture_editor_interface(app_state)
 
-                def _generate_from_editor(state, slides_text, pose, size, prep, still, enh, batch, rate):
-                    return generate_lecture_video_handler(
-                        sad_talker,
-                        state.get("pptx_file"),
-                        state.get("source_image"),
-                        (state.get("audio_language") or "vi"),
-                        state.get("voice_mode"),
-                        state.get("cloned_voice"),
-                        (state.get("builtin_gender") or "Nữ"),
-                        state.get("builtin_voice"),
-                        (state.get("cloned_lang") or "vi"),
-                        prep, still, enh, batch, size, pose, rate,
-                        user_slides_text=slides_text
-                    )
+                job_id = gr.State(None)
+                shown_job = gr.State(None)
 
+                def _generate_from_editor(state, slides_text, pose, size, prep, still, enh, batch, rate):
+                    state = dict(state or {})
+
+                    def run(sad_talker, job):
+                        return generate_lecture_video_handler(
+                            sad_talker,
+                            state.get("pptx_file"),
+                            state.get("source_image"),
+                            (state.get("audio_language") or "vi"),
+                            state.get("voice_mode"),
+                            state.get("cloned_voice"),
+                            (state.get("builtin_gender") or "Nữ"),
+                            state.get("builtin_voice"),
+                            (state.get("cloned_lang") or "vi"),
+                            prep, still, enh, batch, size, pose, rate,
+                            user_slides_text=slides_text,
+                            job=job
+                        )
+
+                    # số slide chỉ để ước lượng ưu tiên: text nhập tay, hoặc slide đã trích xuất
+                    if slides_text and str(slides_text).strip():
+                        n_slides = len(parse_user_slides_text(slides_text))
+                    else:
+                        n_slides = len(state.get("slides_data") or [])
+                    new_id = scheduler.submit(run, name=f"lecture ({n_slides} slide)",
+                                              priority=estimate_render_work(n_slides, size, enh),
+                                              est_mem_gb=estimate_render_memory_gb(size, enh, batch),
+                                              # hai job cùng deck + ảnh giáo viên ghi chung thư mục dự án: chạy lần lượt
+                                              key=lecture_project_name(state.get("pptx_file"), state.get("source_image")))
+                    return new_id, gr.update(value=None), f"🕒 Đã xếp hàng job {new_id}"
+
+                def _poll_job(current_id, shown):
+                    if not current_id:
+                        return gr.update(), gr.update(), shown
+                    info = scheduler.status(current_id)
+                    if info is None:
+                        return gr.update(), gr.update(), shown
+                    if info['status'] == 'queued':
+                        return gr.update(), f"🕒 Job {current_id}: đang chờ (vị trí {info['position']})", shown
+                    if info['status'] == 'running':
+                        return gr.update(), f"⏳ Job {current_id}: {info['progress'] * 100:.0f}% — {info['message']}", shown
+                    if current_id == shown:
+                        return gr.update(), gr.update(), shown
+                    if info['status'] == 'done':
+                        video, text = scheduler.get(current_id).result or (None, "❌ Job không trả về kết quả")
+                        return video, text, current_id
+                    if info['status'] == 'cancelled':
+                        return gr.update(), f"🛑 Job {current_id} đã hủy", current_id
+                    return gr.update(), f"❌ Job {current_id} lỗi: {info['error']}", current_id
+
+                def _cancel_job(current_id):
+                    if current_id and scheduler.cancel(current_id):
+                        return f"🛑 Đang hủy job {current_id} (dừng sau slide hiện tại)…"
+                    return gr.update()
+
+                # Nút bấm chỉ xếp hàng job rồi trả về ngay; trạng thái/kết quả được hỏi lại mỗi 2 giây
                 editor_cmp["generate_btn"].click(
                     fn=_generate_from_editor,
                     inputs=[app_state, editor_cmp["slides_text"], editor_cmp["pose_style"],
                             editor_cmp["size_of_image"], editor_cmp["preprocess_type"],
                             editor_cmp["is_still_mode"], editor_cmp["enhancer"],
                             editor_cmp["batch_size"], editor_cmp["speech_rate"]],
-                    outputs=[editor_cmp["final_video"], editor_cmp["info"]],
+                    outputs=[job_id, editor_cmp["final_video"], editor_cmp["info"]],
                 )
+                editor_cmp["cancel_btn"].click(fn=_cancel_job, inputs=[job_id], outputs=[editor_cmp["info"]])
+                ui.load(_poll_job, inputs=[job_id, shown_job],
+                        outputs=[editor_cmp["final_video"], editor_cmp["info"], shown_job], every=2)
 
         # ĐIỀU HƯỚNG NAVBAR
         nav["nav_home_btn"].click(  lambda: switch_to("home",  None, None, None), outputs=[home_page, index_page, editor_page])
@@ -83,6 +149,8 @@ def sadtalker_demo_with_home(checkpoint_path='checkpoints', config_path='src/con
 
 if __name__ == "__main__":
     demo = sadtalker_demo_with_home()
+    # hàng đợi của Gradio cần cho việc hỏi trạng thái job định kỳ (every=...)
+    demo.queue(concurrency_count=8)
     demo.launch(
         server_name='127.0.0.1',
         server_port=7862,
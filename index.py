@@ -15,6 +15,7 @@ LIBREOFFICE_APPIMAGE = "/home/dunghm/LibreOffice-still.basic-x86_64.AppImage"
 
 # ==== VOICE (Edge TTS + XTTS clone) ====
 from src.utils.xtts_clone import create_cloned_voice, list_supported_languages
+from src.utils.tts_cache import get_tts_cache
 
 logger = logging.getLogger(__name__)
 
@@ -35,31 +36,42 @@ EDGE_VOICE_BY_LANG_GENDER = {
 def convert_text_to_audio(text, language='vi', gender='Nữ', preferred_voice: str | None = None):
     """
     TTS ưu tiên Edge TTS (nếu có voice), fallback gTTS. Trả về đường dẫn file mp3 tạm.
+    Kết quả được lưu vào TTS cache theo (text, engine, voice, ngôn ngữ) nên câu đã đọc rồi không gọi TTS lại.
     """
     try:
         language = language or 'vi'
         if not text or not text.strip():
             return None
 
+        # chọn voice
+        voice = preferred_voice or _get_edge_voice(language, gender)
+        use_edge = edge_tts is not None and bool(voice)
+        cache = get_tts_cache()
+        cache_key = cache.key(text, 'edge' if use_edge else 'gtts', voice if use_edge else '', language)
+        cached = cache.fetch(cache_key, '.mp3')
+        if cached:
+            return cached
+
         tmp = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
         out_path = tmp.name
         tmp.close()
 
-        # chọn voice
-        voice = preferred_voice or _get_edge_voice(language, gender)
-        if edge_tts is not None and voice:
+        if use_edge:
             try:
                 async def _save():
                     communicate = edge_tts.Communicate(text=text, voice=voice, rate="+0%", volume="+0%")
                     await communicate.save(out_path)
                 asyncio.run(_save())
+                cache.store(cache_key, out_path)
                 return out_path
             except Exception:
                 pass  # fallback
 
-        # Fallback gTTS
+        # Fallback gTTS (chỉ cache khi gTTS là engine được chọn, để lần sau vẫn thử lại Edge)
         tts = gTTS(text=text, lang=language, slow=False)
         tts.save(out_path)
+        if not use_edge:
+            cache.store(cache_key, out_path)
         return out_path
     except Exception:
         return None
@@ -122,29 +134,16 @@ def _handle_create_clone(file):
 
 # ==== PPTX → ảnh + trích xuất text (tận dụng hạ tầng sẵn có) ====
 from pptx import Presentation
-from pdf2image import convert_from_path
-from PIL import Image
-import pytesseract
+from src.utils.office_convert import convert_pptx_to_images, SLIDE_WIDTH
+from src.utils.slide_ocr import ocr_slides
 import zipfile, xml.etree.ElementTree as ET
 from src.utils.math_formula_processor import MathFormulaProcessor, process_math_text
 
-def _convert_pptx_to_images(pptx_path, dpi=220):
+def _convert_pptx_to_images(pptx_path, width=SLIDE_WIDTH):
+    """LibreOffice chạy sẵn (giữ ấm) → PDF → PNG song song theo bề rộng video; cache theo hash file PPTX."""
     if which(LIBREOFFICE_APPIMAGE) is None:
         raise RuntimeError("Không tìm thấy LibreOffice AppImage. Kiểm tra đường dẫn.")
-    tmpdir = tempfile.mkdtemp(prefix="pptx2img_")
-    import subprocess
-    subprocess.run(
-        [LIBREOFFICE_APPIMAGE, "--headless", "--convert-to", "pdf", "--outdir", tmpdir, pptx_path],
-        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-    )
-    pdf_path = os.path.join(tmpdir, os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf")
-    images = convert_from_path(pdf_path, dpi=dpi, output_folder=tmpdir, fmt='png')
-    out = []
-    for i, img in enumerate(images, 1):
-        p = os.path.join(tmpdir, f"slide-{i:02d}.png")
-        img.save(p)
-        out.append(p)
-    return out
+    return convert_pptx_to_images(pptx_path, LIBREOFFICE_APPIMAGE, width=width)
 
 # --- một bản trích xuất gọn: ưu tiên math_processor, rơi xuống đọc thô + OCR ---
 def _as_path(p):
@@ -166,7 +165,7 @@ def _extract_slides_from_pptx(pptx_file):
         raise RuntimeError("Không tìm thấy file PowerPoint hợp lệ.")
 
     # convert PPTX -> ảnh PNG
-    imgs = _convert_pptx_to_images(pptx_path, dpi=220)
+    imgs = _convert_pptx_to_images(pptx_path)
 
     slides = []
     # Ưu tiên MathFormulaProcessor
@@ -182,13 +181,8 @@ def _extract_slides_from_pptx(pptx_file):
                 "has_math_objects": s["has_math_objects"]
             })
     else:
-        # Fallback đọc thô + OCR
+        # Fallback đọc thô (OCR chung ở dưới)
         from pptx import Presentation
-        from PIL import Image
-        try:
-            import pytesseract
-        except Exception:
-            pytesseract = None
 
         prs = Presentation(pptx_path)
         for i, slide in enumerate(prs.slides):
@@ -202,18 +196,18 @@ def _extract_slides_from_pptx(pptx_file):
                 except Exception:
                     pass
             text = process_math_text("\n".join(chunks).strip())
-            if not text and i < len(imgs) and pytesseract is not None:
-                try:
-                    ocr = pytesseract.image_to_string(Image.open(imgs[i]), lang="vie+eng")
-                    text = process_math_text((ocr or "").strip())
-                except Exception:
-                    text = ""
             slides.append({
                 "slide_number": i + 1,
                 "text": text,
                 "image_path": imgs[i] if i < len(imgs) else None,
                 "has_math_objects": False
             })
+
+    # Slide không có chữ (ảnh chụp/scan) → OCR song song trên pool dùng chung, cache theo hash ảnh
+    missing = [s for s in slides if not s["text"] and s["image_path"]]
+    if missing:
+        for s, ocr in zip(missing, ocr_slides([s["image_path"] for s in missing])):
+            s["text"] = process_math_text((ocr or "").strip())
     return slides
 
 
@@ -1,19 +1,12 @@
 import os
-import tempfile
-import subprocess
 from shutil import which
 import gradio as gr
 
 from pptx import Presentation
-from pdf2image import convert_from_path
-from PIL import Image
-
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None
 
 from src.utils.math_formula_processor import MathFormulaProcessor, process_math_text
+from src.utils.office_convert import convert_pptx_to_images, get_office_worker, SLIDE_WIDTH
+from src.utils.slide_ocr import ocr_slides
 
 # Đường dẫn LibreOffice theo môi trường của bạn
 LIBREOFFICE_APPIMAGE = "/home/dunghm/LibreOffice-still.basic-x86_64.AppImage"
@@ -30,22 +23,11 @@ def _save_edited_slides_text(text: str):
     return f"✅ Đã lưu nội dung ({len(text or '')} ký tự) vào: {path}"
 
 # ===== Helper trích xuất =====
-def _convert_pptx_to_images(pptx_path, dpi=220):
+def _convert_pptx_to_images(pptx_path, width=SLIDE_WIDTH):
+    """Dùng chung LibreOffice worker + cache ảnh slide với index.py (cache theo hash file PPTX)."""
     if which(LIBREOFFICE_APPIMAGE) is None:
         raise RuntimeError("Không tìm thấy LibreOffice AppImage. Kiểm tra đường dẫn.")
-    tmpdir = tempfile.mkdtemp(prefix="pptx2img_")
-    subprocess.run(
-        [LIBREOFFICE_APPIMAGE, "--headless", "--convert-to", "pdf", "--outdir", tmpdir, pptx_path],
-        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-    )
-    pdf_path = os.path.join(tmpdir, os.path.splitext(os.path.basename(pptx_path))[0] + ".pdf")
-    images = convert_from_path(pdf_path, dpi=dpi, output_folder=tmpdir, fmt='png')
-    out = []
-    for i, img in enumerate(images, 1):
-        p = os.path.join(tmpdir, f"slide-{i:02d}.png")
-        img.save(p)
-        out.append(p)
-    return out
+    return convert_pptx_to_images(pptx_path, LIBREOFFICE_APPIMAGE, width=width)
 
 def extract_slides_from_pptx(pptx_file_or_path):
     """Chấp nhận path string hoặc object có .name"""
@@ -53,7 +35,7 @@ def extract_slides_from_pptx(pptx_file_or_path):
     if not pptx_path or not os.path.exists(pptx_path):
         raise RuntimeError("Không tìm thấy file PowerPoint hợp lệ.")
 
-    imgs = _convert_pptx_to_images(pptx_path, dpi=220)
+    imgs = _convert_pptx_to_images(pptx_path)
     slides = []
 
     mp = MathFormulaProcessor()
@@ -80,18 +62,18 @@ def extract_slides_from_pptx(pptx_file_or_path):
                 except Exception:
                     pass
             text = process_math_text("\n".join(chunks).strip())
-            if not text and i < len(imgs) and pytesseract is not None:
-                try:
-                    ocr = pytesseract.image_to_string(Image.open(imgs[i]), lang="vie+eng")
-                    text = process_math_text((ocr or "").strip())
-                except Exception:
-                    text = ""
             slides.append({
                 "slide_number": i + 1,
                 "text": text,
                 "image_path": imgs[i] if i < len(imgs) else None,
                 "has_math_objects": False
             })
+
+    # Slide không có chữ (ảnh chụp/scan) → OCR song song trên pool dùng chung, cache theo hash ảnh
+    missing = [s for s in slides if not s["text"] and s["image_path"]]
+    if missing:
+        for s, ocr in zip(missing, ocr_slides([s["image_path"] for s in missing])):
+            s["text"] = process_math_text((ocr or "").strip())
     return slides
 
 def _format_slides_as_text(slides):
@@ -105,6 +87,9 @@ def _format_slides_as_text(slides):
 
 # ===== UI Editor =====
 def create_lecture_editor_interface(app_state: gr.State):
+    # khởi động LibreOffice (và báo rõ nếu phải dùng chế độ --convert-to chậm) ngay khi mở app
+    if which(LIBREOFFICE_APPIMAGE) is not None:
+        get_office_worker(LIBREOFFICE_APPIMAGE).warm_up()
     with gr.Row().style(equal_height=True):
         # ===== LEFT COLUMN =====
         with gr.Column(variant='panel', elem_id="editor_left"):
@@ -229,7 +214,9 @@ def create_lecture_editor_interface(app_state: gr.State):
                 gr.Markdown("### 📊 Thông tin Video")
                 info = gr.Textbox(label="Thông tin", lines=4, interactive=False)
 
-            generate_btn = gr.Button('🎬 Tạo Video Bài Giảng', variant='primary')
+            with gr.Row():
+                generate_btn = gr.Button('🎬 Tạo Video Bài Giảng', variant='primary')
+                cancel_btn = gr.Button('🛑 Hủy', variant='secondary')
 
     # ==== Handlers ====
     def _extract_and_fill(state):
@@ -253,6 +240,7 @@ def create_lecture_editor_interface(app_state: gr.State):
     return {
         "slides_text": slides_text,
         "generate_btn": generate_btn,
+        "cancel_btn": cancel_btn,
         "pose_style": pose_style,
         "size_of_image": size_of_image,
         "preprocess_type": preprocess_type,
@@ -9,11 +9,18 @@ import re
 import torch
 from datetime import datetime
 # MoviePy còn dùng cho fallback concat; không dùng cho overlay nữa
-from moviepy.editor import VideoFileClip, concatenate_videoclips, AudioFileClip
+from moviepy.editor import AudioFileClip
 from PIL import Image, ImageDraw, ImageFont
 from lecture_input import extract_slides_from_pptx
 from index import convert_text_to_audio  
-from src.utils.xtts_clone import XTTSInference
+from src.utils.xtts_clone import get_xtts_engine
+from src.utils.stage_pipeline import run_pipeline
+from src.utils.tts_cache import get_tts_cache
+from src.utils.lecture_manifest import LectureManifest
+from src.utils.file_hash import file_sha256
+from src.utils.render_planner import plan_pip_render, pip_target_width
+from src.utils.lecture_compositor import compose_lecture
+from src.utils.job_scheduler import JobCancelled
 
 # ffmpeg
 import subprocess
@@ -168,6 +175,13 @@ def _find_reference_wav_by_display_name(display_name: str, voices_root: str = '.
         return None
     return None
 
+def _remove_quietly(path):
+    try:
+        if path and os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
 def _ensure_even_image(path):
     from PIL import Image
     im = Image.open(path)
@@ -195,7 +209,7 @@ def pip_composite_ffmpeg(slide_png, teacher_mp4, out_mp4,
     # Đọc kích thước slide để tính tỷ lệ PIP
     with Image.open(slide_png) as im:
         slide_w, slide_h = im.size
-    teacher_target_w = max(1, int(slide_w * pip_ratio))
+    teacher_target_w = pip_target_width(slide_w, pip_ratio)
 
     vcodec = "h264_nvenc" if prefer_nvenc else "libx264"
     preset = "p5" if vcodec == "h264_nvenc" else "ultrafast"
@@ -240,12 +254,70 @@ def pip_composite_ffmpeg(slide_png, teacher_mp4, out_mp4,
         raise
 
 
+def synthesize_speech(text, language, voice_mode, cloned_voice_name, cloned_lang,
+                      gender=None, builtin_voice=None, speech_rate: float = 1.0):
+    """
+    TTS cho một đoạn text (giọng nhân bản XTTS, hoặc Edge TTS/gTTS) rồi áp dụng tốc độ đọc.
+    Audio sau adjust_audio_speed được cache theo (text, engine, giọng, ngôn ngữ, tốc độ),
+    nên slide không đổi sẽ không gọi lại TTS lẫn ffmpeg. Trả về file tạm (caller được phép xoá).
+    """
+    ref_wav = None
+    if voice_mode == 'Giọng nhân bản' and cloned_voice_name:
+        ref_wav = _find_reference_wav_by_display_name(cloned_voice_name)
+    if ref_wav:
+        engine, voice, lang, ext = 'xtts', os.path.basename(os.path.dirname(ref_wav)), cloned_lang or language, '.wav'
+    elif voice_mode == 'Giọng nhân bản' and cloned_voice_name:
+        # không tìm thấy giọng mẫu -> convert_text_to_audio với giọng mặc định
+        engine, voice, lang, ext = 'builtin', "|Nữ", language, '.mp3'
+    else:
+        engine, voice, lang, ext = 'builtin', f"{builtin_voice or ''}|{gender or ''}", language, '.mp3'
+
+    cache = get_tts_cache()
+    cache_key = None
+    if abs(speech_rate - 1.0) >= 1e-3:
+        cache_key = cache.key(text, engine, voice, lang, speech_rate)
+        cached = cache.fetch(cache_key, ext)
+        if cached:
+            return cached
+
+    audio_path = None
+    fallback = False
+    if ref_wav:
+        try:
+            audio_path = get_xtts_engine().synthesize(text, lang, ref_wav)
+        except Exception as e:
+            print(f"XTTS synthesis failed, fallback to gTTS: {e}")
+        if audio_path is None:
+            fallback = True
+            audio_path = convert_text_to_audio(text, language)
+    elif voice_mode == 'Giọng nhân bản' and cloned_voice_name:
+        audio_path = convert_text_to_audio(text, language)
+    else:
+        audio_path = convert_text_to_audio(
+            text=text,
+            language=language,
+            gender=gender,
+            preferred_voice=builtin_voice or None
+        )
+    if not audio_path or cache_key is None:
+        return audio_path
+
+    adjusted = adjust_audio_speed(audio_path, speech_rate)
+    if adjusted != audio_path:
+        _remove_quietly(audio_path)
+        if not fallback:
+            cache.store(cache_key, adjusted, ext)
+    return adjusted
+
+
 def generate_video_for_text(
     sad_talker, source_image, text, language, voice_mode, cloned_voice_name, cloned_lang,
     preprocess_type, is_still_mode, enhancer, batch_size, size_of_image, pose_style,
     gender=None, builtin_voice=None,
     pre_synth_audio_path: str = None,  # NEW
-    speech_rate: float = 1.0          # NEW
+    speech_rate: float = 1.0,         # NEW
+    output_width: int = None,         # chiều rộng ghi video teacher (theo kích thước PIP)
+    result_dir: str = './results/'    # SadTalker tạo thư mục <uuid> cho mỗi clip trong đây
 ):
     max_retries = 3
     retry_count = 0
@@ -259,24 +331,8 @@ def generate_video_for_text(
             # === TTS (hoặc dùng audio có sẵn) ===
             audio_path = pre_synth_audio_path
             if not audio_path:
-                if voice_mode == 'Giọng nhân bản' and cloned_voice_name:
-                    ref_wav = _find_reference_wav_by_display_name(cloned_voice_name)
-                    if ref_wav:
-                        try:
-                            xtts = XTTSInference()
-                            lang_code = cloned_lang if cloned_lang else language
-                            audio_path = xtts.synthesize(text, lang_code, ref_wav)
-                        except Exception as e:
-                            print(f"XTTS synthesis failed, fallback to gTTS: {e}")
-                    if audio_path is None:
-                        audio_path = convert_text_to_audio(text, language)
-                else:
-                    audio_path = convert_text_to_audio(
-                        text=text,
-                        language=language,
-                        gender=gender,
-                        preferred_voice=builtin_voice or None
-                    )
+                audio_path = synthesize_speech(text, language, voice_mode, cloned_voice_name, cloned_lang,
+                                               gender=gender, builtin_voice=builtin_voice)
             if not audio_path:
                 print("Failed to convert text to audio")
                 return None
@@ -291,7 +347,8 @@ def generate_video_for_text(
             # SadTalker
             video_path = sad_talker.test(
                 source_image, audio_path, preprocess_type, is_still_mode,
-                enhancer, batch_size, size_of_image, pose_style
+                enhancer, batch_size, size_of_image, pose_style,
+                result_dir=result_dir, output_width=output_width
             )
 
             # Xoá audio tạm (nếu audio được synth trong hàm này)
@@ -322,76 +379,121 @@ def generate_video_for_text(
             return None
     return None
 
+def _image_size(path):
+    try:
+        with Image.open(path) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def _max_slide_size(slides_data, default=(1280, 720)):
+    """Kích thước slide lớn nhất (chỉ đọc header ảnh); slide chỉ có chữ được vẽ ở 1280x720."""
+    sizes = [_image_size(s['image_path']) for s in slides_data if s.get('image_path') and os.path.exists(s['image_path'])]
+    sizes = [s for s in sizes if s]
+    return max(sizes) if sizes else default
+
+
+def lecture_project_name(pptx, img):
+    """
+    Tên thư mục dự án results/lecture_projects/<tên>: cùng file PowerPoint + cùng ảnh giáo viên -> cùng dự án
+    (dùng lại slide cũ); không có PowerPoint thì dùng chung dự án của ảnh giáo viên. Cũng là khóa để
+    JobScheduler không chạy song song hai job ghi vào cùng một thư mục.
+    """
+    if not img or not os.path.exists(img):
+        return None
+    avatar = file_sha256(img)[:12]
+    if not pptx:
+        return f"avatar_{avatar}"
+    pptx_path = pptx if isinstance(pptx, str) else getattr(pptx, 'name', str(pptx))
+    project_name = re.sub(r'[^\w.-]+', '_', os.path.splitext(os.path.basename(pptx_path))[0])
+    return f"{project_name}_{avatar}"
+
+
 def create_lecture_video(sad_talker, slides_data, source_image, language, voice_mode, cloned_voice_name, cloned_lang,
-                         preprocess_type, is_still_mode, enhancer, batch_size, size_of_image, pose_style, gender=None, builtin_voice=None,speech_rate: float = 1.0):
+                         preprocess_type, is_still_mode, enhancer, batch_size, size_of_image, pose_style, gender=None, builtin_voice=None,speech_rate: float = 1.0,
+                         project_name=None, job=None):
+    """
+    project_name: thư mục dự án cố định results/lecture_projects/<project_name>. manifest.json trong đó ghi
+    hash đầu vào của từng slide -> video giáo viên slide_XXX_<hash>.mp4 (đã có audio); lần chạy sau chỉ render
+    lại slide có hash đổi. Video cuối được ghép từ ảnh slide + video giáo viên trong một lần encode duy nhất.
+    job: Job của JobScheduler (nếu chạy qua hàng đợi) để báo tiến độ; hủy job thì dừng ở slide kế tiếp.
+    """
+    def report(progress, message):
+        if job is not None:
+            job.report(progress, message)
+
     try:
         if not slides_data:
             return None, "❌ Không có slide nào để xử lý!"
+        if not source_image or not os.path.exists(source_image):
+            return None, "❌ Không tìm thấy ảnh nguồn!"
 
-        output_dir = os.path.join("results", f"lecture_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        avatar_sha = file_sha256(source_image)
+        project_dir = os.path.join("results", "lecture_projects", project_name or f"avatar_{avatar_sha[:12]}")
+        output_dir = os.path.join(project_dir, f"work_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
         os.makedirs(output_dir, exist_ok=True)
-        print(f"Creating lecture video in: {output_dir}")
+        print(f"Creating lecture video in: {project_dir}")
 
         if check_system_memory() < 2.0:
             print("⚠️ Warning: Low system memory detected.")
 
         # Ảnh giáo viên an toàn
         safe_image_path = os.path.join(output_dir, "source_image.png")
-        if not source_image or not os.path.exists(source_image):
-            return None, "❌ Không tìm thấy ảnh nguồn!"
         shutil.copy2(source_image, safe_image_path)
         print(f"✅ Source image copied: {safe_image_path}")
 
-        total_duration = 0.0
-        temp_teacher_videos = []     # SadTalker outputs
-        final_piece_files = []       # slide_i.mp4 sau khi overlay PIP
+        n_slides = len(slides_data)
+
+        # ---- Kế hoạch render: giáo viên chỉ hiện ở pip_ratio bề rộng slide, không render chi tiết bị scale bỏ ----
+        pip_ratio, margin = 0.10, 50
+        plan = plan_pip_render(_max_slide_size(slides_data), pip_ratio, preprocess_type, size_of_image, enhancer,
+                               source_size=_image_size(source_image))
+        print(f"🧮 {plan} (yêu cầu: size={size_of_image}, enhancer={enhancer})")
+        size_of_image, enhancer = plan.size, plan.enhancer
+        render_seconds = [0.0]
+
+        # ---- Manifest: slide nào có hash đầu vào không đổi thì dùng lại mp4 cũ ----
+        manifest = LectureManifest(project_dir)
+        voice = {'mode': voice_mode, 'cloned_voice': cloned_voice_name, 'cloned_lang': cloned_lang,
+                 'language': language, 'gender': gender, 'builtin_voice': builtin_voice,
+                 'speech_rate': round(float(speech_rate), 3)}
+        render_params = {'preprocess': preprocess_type, 'still': bool(is_still_mode), 'enhancer': enhancer,
+                         'size': size_of_image, 'pose_style': pose_style, 'output_width': plan.output_width,
+                         'piece': 'teacher'}
+        slide_hashes = [manifest.slide_hash(s, avatar_sha, voice, render_params) for s in slides_data]
+        cached_entries = [manifest.cached(h) for h in slide_hashes]
+        todo = [None if cached else slide for slide, cached in zip(slides_data, cached_entries)]
+        n_cached = sum(1 for c in cached_entries if c)
+        if n_cached:
+            print(f"♻️ Reusing {n_cached}/{n_slides} unchanged slides from {project_dir}")
+        n_todo = n_slides - n_cached
+        n_rendered = [0]
+        report(0.0, f"Bắt đầu: render {n_todo}/{n_slides} slide")
+
+        # ---- Ảnh slide cho mọi slide (kể cả slide dùng lại): ảnh gốc dùng trực tiếp, slide chỉ có chữ thì vẽ ra ----
+        def slide_image(i, slide_data):
+            original_image = slide_data.get('image_path')
+            if original_image and os.path.exists(original_image):
+                return original_image
+            path = os.path.join(output_dir, f"slide_{i+1:02d}.png")
+            if create_slide_image_with_text(slide_data['text'], path):
+                return path
+            print(f"❌ Failed to create slide image for slide {i+1}")
+            return None
 
-        for i, slide_data in enumerate(slides_data):
-            print(f"\n--- Processing slide {i+1}/{len(slides_data)} ---")
+        slide_images = [slide_image(i, s) for i, s in enumerate(slides_data)]
+        todo = [None if image is None else slide for slide, image in zip(todo, slide_images)]
 
-            if not os.path.exists(safe_image_path):
-                if os.path.exists(source_image):
-                    shutil.copy2(source_image, safe_image_path)
-                else:
-                    print("❌ Source image missing, abort.")
-                    break
+        # ---- Stage 1 (CPU/mạng): TTS + tốc độ đọc ----
+        def prepare_slide(i, slide_data):
+            if job is not None and job.cancelled:
+                return None
+            print(f"\n--- [TTS] slide {i+1}/{n_slides} ---")
 
-            # Tạo ảnh slide (hoặc copy ảnh gốc)
-            slide_image_path = os.path.join(output_dir, f"slide_{i+1:02d}.png")
-            original_image = slide_data.get('image_path')
-            if original_image and os.path.exists(original_image):
-                try:
-                    shutil.copy2(original_image, slide_image_path)
-                except Exception as e:
-                    print(f"⚠️ Copy original slide failed: {e}")
-                    if not create_slide_image_with_text(slide_data['text'], slide_image_path):
-                        print(f"❌ Failed to create slide image for slide {i+1}")
-                        continue
-            else:
-                if not create_slide_image_with_text(slide_data['text'], slide_image_path):
-                    print(f"❌ Failed to create slide image for slide {i+1}")
-                    continue
-
-            # === Âm thanh slide (tạo 1 lần, có áp dụng speech_rate) ===
-            if voice_mode == 'Giọng nhân bản' and cloned_voice_name:
-                ref_wav = _find_reference_wav_by_display_name(cloned_voice_name)
-                if ref_wav:
-                    try:
-                        xtts = XTTSInference()
-                        lang_code = cloned_lang if cloned_lang else language
-                        audio_path = xtts.synthesize(slide_data['text'], lang_code, ref_wav)
-                    except Exception as e:
-                        print(f"XTTS failed for slide {i+1}, fallback gTTS: {e}")
-                        audio_path = convert_text_to_audio(slide_data['text'], language)
-                else:
-                    audio_path = convert_text_to_audio(slide_data['text'], language)
-            else:
-                audio_path = convert_text_to_audio(
-                    text=slide_data['text'],
-                    language=language,
-                    gender=gender,
-                    preferred_voice=builtin_voice or None
-                )
+            # === Âm thanh slide (tạo 1 lần, có áp dụng speech_rate; lấy từ cache nếu slide không đổi) ===
+            audio_path = synthesize_speech(slide_data['text'], language, voice_mode, cloned_voice_name, cloned_lang,
+                                           gender=gender, builtin_voice=builtin_voice, speech_rate=speech_rate)
 
             if not audio_path:
                 print(f"❌ Failed TTS for slide {i+1}, create silent 3s")
@@ -399,148 +501,115 @@ def create_lecture_video(sad_talker, slides_data, source_image, language, voice_
                     from pydub import AudioSegment
                     silent_wav = os.path.join(output_dir, f"silent_{i+1:02d}.wav")
                     AudioSegment.silent(duration=3000).export(silent_wav, format="wav")
-                    audio_path = silent_wav
+                    # Áp dụng tốc độ đọc
+                    audio_path = adjust_audio_speed(silent_wav, speech_rate)
                 except Exception as e:
                     print(f"❌ Cannot create silent audio: {e}")
-                    continue
-            # Áp dụng tốc độ đọc
-            audio_path = adjust_audio_speed(audio_path, speech_rate)
+                    return None
             audio_duration = get_audio_duration(audio_path)
             if audio_duration <= 0.1:
                 audio_duration = 3.0
             print(f"Audio duration for slide {i+1}: {audio_duration:.2f}s")
 
+            return {'text': slide_data['text'], 'hash': slide_hashes[i],
+                    'audio_path': audio_path, 'audio_duration': audio_duration}
+
+        # ---- Stage 2 (GPU): SadTalker → video giáo viên (có audio) lưu thẳng vào thư mục dự án ----
+        def render_slide(i, piece_job):
+            if job is not None and job.cancelled:
+                _remove_quietly(piece_job['audio_path'])
+                return None
+            print(f"\n--- [Render] slide {i+1}/{n_slides} ---")
+            if not os.path.exists(safe_image_path):
+                if os.path.exists(source_image):
+                    shutil.copy2(source_image, safe_image_path)
+                else:
+                    print("❌ Source image missing, abort.")
+                    _remove_quietly(piece_job['audio_path'])
+                    return None
+
             # === Sinh video teacher từ AUDIO ĐÃ ĐIỀU CHỈNH ===
             print("🎬 Generating teacher video…")
+            t0 = time.time()
             teacher_video_path = generate_video_for_text(
-                sad_talker, safe_image_path, slide_data['text'], language, voice_mode,
+                sad_talker, safe_image_path, piece_job['text'], language, voice_mode,
                 cloned_voice_name, cloned_lang, preprocess_type, is_still_mode,
                 enhancer, batch_size, size_of_image, pose_style,
                 gender=gender, builtin_voice=builtin_voice,
-                pre_synth_audio_path=audio_path,    # NEW
-                speech_rate=speech_rate             # NEW (cho đồng bộ)
+                pre_synth_audio_path=piece_job['audio_path'],    # NEW
+                speech_rate=speech_rate,            # NEW (cho đồng bộ)
+                output_width=plan.output_width,
+                # thư mục riêng của job: các worker khác đang render trong results/ không bị ảnh hưởng
+                result_dir=os.path.join(output_dir, 'sadtalker')
             )
             cleanup_cuda_memory()
+            render_seconds[0] += time.time() - t0
+            _remove_quietly(piece_job['audio_path'])
+            n_rendered[0] += 1
+            report(0.9 * n_rendered[0] / max(1, n_todo), f"Đã render {n_rendered[0]}/{n_todo} slide")
 
             if not teacher_video_path or not os.path.exists(teacher_video_path):
                 print(f"❌ Teacher video failed for slide {i+1}")
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-                continue
-
-            # Overlay bằng ffmpeg → file mp4 cho slide i
-            slide_mp4 = os.path.abspath(os.path.join(output_dir, f"slide_{i+1:03d}.mp4"))
-            try:
-                pip_composite_ffmpeg(
-                    slide_png=slide_image_path,
-                    teacher_mp4=teacher_video_path,
-                    out_mp4=slide_mp4,
-                    pip_ratio=0.10,   # 10% rộng slide
-                    margin=50,
-                    prefer_nvenc=True,
-                    fps=25
-                )
-            except Exception as e:
-                print(f"❌ ffmpeg overlay failed on slide {i+1}: {e}")
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
+                return None
+            piece_job['teacher_mp4'] = manifest.piece_path(i, piece_job['hash'])
+            shutil.move(teacher_video_path, piece_job['teacher_mp4'])
+            print(f"✅ Slide {i+1} done → {os.path.basename(piece_job['teacher_mp4'])}")
+            return piece_job
+
+        # 2 công đoạn chạy gối nhau: TTS slide sau trong lúc slide hiện tại đang render.
+        # Hàng đợi giới hạn 2 phần tử; thứ tự slide trong kết quả luôn giữ nguyên.
+        # Slide lấy từ manifest là None trong todo nên không đi qua pipeline.
+        finished = run_pipeline(todo, [('tts', prepare_slide),
+                                       ('render', render_slide)], queue_size=2)
+
+        pieces = []
+        items = []
+        for slide_hash, cached, done, image in zip(slide_hashes, cached_entries, finished, slide_images):
+            if cached:
+                piece = dict(cached, video=os.path.join(project_dir, cached['video']))
+            elif done is not None:
+                piece = {'hash': slide_hash, 'video': done['teacher_mp4'], 'duration': done['audio_duration']}
+            else:
                 continue
-
-            final_piece_files.append(slide_mp4)
-            temp_teacher_videos.append(teacher_video_path)
-            total_duration += audio_duration
-
-            # cleanup audio tạm
-            time.sleep(0.3)
-            if os.path.exists(audio_path):
-                try:
-                    os.remove(audio_path)
-                except Exception:
-                    pass
-
-            # có thể xóa ảnh slide để tiết kiệm dung lượng (tuỳ chọn)
-            try:
-                if os.path.exists(slide_image_path):
-                    os.remove(slide_image_path)
-            except Exception:
-                pass
-
-            print(f"✅ Slide {i+1} done → {os.path.basename(slide_mp4)}")
-
-        if not final_piece_files:
+            pieces.append(piece)
+            if image is not None:
+                items.append((image, piece['video'], None))
+        # slide đã render xong vẫn được ghi vào manifest để lần chạy sau dùng lại, kể cả khi job bị hủy
+        manifest.save(pieces)
+        if job is not None:
+            job.raise_if_cancelled()
+        total_duration = sum(p['duration'] for p in pieces)
+
+        if not items:
             return None, "❌ Không thể tạo video cho bất kỳ slide nào!"
 
-        print(f"\n--- Creating final lecture video (concat) ---")
-        print(f"Total slides: {len(final_piece_files)}")
+        print(f"\n--- Creating final lecture video (single pass) ---")
+        print(f"Total slides: {len(items)}")
         print(f"Total duration (audio-based): {total_duration:.2f}s")
 
-        final_video_path = os.path.join(output_dir, "lecture_final.mp4")
-
-        # ffmpeg concat demuxer (siêu nhanh, không tái mã hoá)
-        concat_list = os.path.join(output_dir, "concat_list.txt")
-        with open(concat_list, "w", encoding="utf-8") as f:
-            for p in final_piece_files:
-                ap = os.path.abspath(p)
-                # escape dấu nháy đơn nếu có (phòng hờ)
-                ap = ap.replace("'", r"'\''")
-                f.write(f"file '{ap}'\n")
-        cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0",
-               "-i", concat_list, "-c", "copy", final_video_path]
+        # Ghép ảnh slide + video giáo viên (PIP) của mọi slide trong một lần encode CPU, không qua mp4 từng slide
+        final_video_path = os.path.join(project_dir, "lecture_final.mp4")
+        report(0.9, "Đang ghép video bài giảng")
         try:
-            subprocess.run(cmd, check=True)
+            compose_lecture(items, final_video_path, pip_ratio=pip_ratio, margin=margin, fps=25)
         except Exception as e:
-            print(f"❌ ffmpeg concat failed: {e} → fallback MoviePy (sẽ chậm hơn)")
-            try:
-                reopened = [VideoFileClip(p) for p in final_piece_files]
-                final_clip = concatenate_videoclips(reopened, method="chain")
-                final_clip.write_videofile(
-                    final_video_path,
-                    codec="libx264",
-                    audio_codec="aac",
-                    verbose=False,
-                    logger=None,
-                    preset="ultrafast",
-                    ffmpeg_params=["-crf", "23"]
-                )
-                for rc in reopened:
-                    try:
-                        rc.close()
-                    except Exception:
-                        pass
-            except Exception as concat_fallback_error:
-                return None, f"❌ Failed to concatenate video clips: {concat_fallback_error}"
-
-        # dọn concat list
-        try:
-            os.remove(concat_list)
-        except Exception:
-            pass
+            print(f"❌ ffmpeg compose failed: {e}")
+            return None, f"❌ Failed to compose lecture video: {e}"
 
-        # xoá teacher videos tạm
-        for v in temp_teacher_videos:
-            if os.path.exists(v):
-                try:
-                    os.remove(v)
-                except Exception:
-                    pass
-
-        # dọn temp SadTalker dirs (uuid-like)
-        temp_dirs_deleted = 0
-        results_dir = "results"
-        if os.path.exists(results_dir):
-            for item in os.listdir(results_dir):
-                p = os.path.join(results_dir, item)
-                if os.path.isdir(p) and len(item) == 36 and '-' in item:
-                    try:
-                        shutil.rmtree(p)
-                        temp_dirs_deleted += 1
-                    except Exception:
-                        pass
+        # thư mục làm việc của lần chạy này (ảnh slide, audio tạm, thư mục tạm của SadTalker);
+        # các mp4 đã xong nằm ở project_dir
+        shutil.rmtree(output_dir, ignore_errors=True)
         cleanup_cuda_memory()
         print(f"✅ Lecture video created: {final_video_path}")
-        status_text = f"✅ Hoàn thành! Đã tạo video bài giảng với {len(slides_data)} slide, tổng thời gian (ước tính): {total_duration:.1f}s"
+        status_text = f"✅ Hoàn thành! Đã tạo video bài giảng với {len(slides_data)} slide (render lại {n_slides - n_cached}, dùng lại {n_cached}), tổng thời gian (ước tính): {total_duration:.1f}s"
+        saved = plan.seconds_saved(render_seconds[0])
+        if saved >= 1.0:
+            status_text += f"; render theo kích thước PIP {plan.target_width}px (size={plan.size}, enhancer={'bật' if plan.enhancer else 'tắt'}) tiết kiệm ~{saved:.0f}s"
         return final_video_path, status_text        
 
+    except JobCancelled:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
     except Exception as e:
         print(f"Error in create_lecture_video: {str(e)}")
         return None, f"❌ Lỗi tạo video bài giảng: {str(e)}"
@@ -588,7 +657,8 @@ def generate_lecture_video_handler(
     sad_talker, pptx, img, lang, voice_mode, cloned_voice, gender, builtin_voice,
     cloned_lang, preprocess, still, enh, batch, size, pose,
     speech_rate,
-    user_slides_text=None
+    user_slides_text=None,
+    job=None
 ):
     # Parse text người dùng (nếu có)
     user_slides = []
@@ -621,7 +691,9 @@ def generate_lecture_video_handler(
         preprocess, still, enh, batch, size, pose,
         gender=gender or 'Nữ',
         builtin_voice=builtin_voice,
-        speech_rate=speech_rate
+        speech_rate=speech_rate,
+        project_name=lecture_project_name(pptx, img),
+        job=job
     )
 
 
@@ -0,0 +1,87 @@
+"""
+DenseMotionNetwork forward: repeated-volume reference (feature repeated num_kp+1 times before
+grid_sample) versus the stacked-grid warp, at the facerender config shapes and a few micro-batches.
+
+Weights are randomly initialised, so no checkpoint is needed. Peak memory is measured on CUDA;
+on CPU the size of the repeated volume the reference allocates is printed instead.
+
+    python scripts/bench_dense_motion.py --batches 1 2 4 8 --iters 5
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import yaml
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.facerender.modules.dense_motion import DenseMotionNetwork
+from test_dense_motion import LegacyDenseMotionNetwork, random_kp
+
+
+def build(cls, config, device):
+    common = config['model_params']['common_params']
+    generator = config['model_params']['generator_params']
+    torch.manual_seed(0)
+    return cls(num_kp=common['num_kp'], feature_channel=common['feature_channel'],
+               estimate_occlusion_map=generator['estimate_occlusion_map'],
+               **generator['dense_motion_params']).to(device).eval()
+
+
+def measure(model, feature, kp_source, kp_driving, iters, device):
+    with torch.no_grad():
+        source = model.encode_source(feature, kp_source)
+        model(feature, kp_driving, kp_source, source=source)     # warm-up
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+        start = time.time()
+        for _ in range(iters):
+            out = model(feature, kp_driving, kp_source, source=source)
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+        elapsed = (time.time() - start) / iters
+    peak = torch.cuda.max_memory_allocated(device) / 2**20 if device.type == 'cuda' else None
+    return elapsed, peak, out
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config', default='./src/config/facerender.yaml')
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--batches', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--iters', type=int, default=5)
+    parser.add_argument('--cpu', action='store_true')
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() and not args.cpu else 'cpu')
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    new = build(DenseMotionNetwork, config, device)
+    old = build(LegacyDenseMotionNetwork, config, device)
+    old.load_state_dict(new.state_dict())
+
+    num_kp = new.num_kp
+    depth = config['model_params']['generator_params']['dense_motion_params']['reshape_depth']
+    channels = config['model_params']['common_params']['feature_channel']
+    hw = args.size // 4                      # feature_3d resolution of the generator
+    feature = torch.randn(1, channels, depth, hw, hw, device=device)
+    jacobian = config['model_params']['common_params']['estimate_jacobian']
+    kp_source = {k: v.to(device) for k, v in random_kp(1, num_kp, jacobian).items() if v is not None}
+
+    for bs in args.batches:
+        kp_driving = {k: v.to(device) for k, v in random_kp(bs, num_kp, jacobian).items() if v is not None}
+        kp_source_b = {k: v.expand(bs, *v.shape[1:]) for k, v in kp_source.items()}
+        t_old, m_old, out_old = measure(old, feature, kp_source_b, kp_driving, args.iters, device)
+        t_new, m_new, out_new = measure(new, feature, kp_source_b, kp_driving, args.iters, device)
+        err = (out_new['deformation'] - out_old['deformation']).abs().max().item()
+        line = 'batch %2d: repeat %7.1f ms  stacked %7.1f ms  (x%.2f)  max|diff| %.1e' \
+               % (bs, t_old * 1e3, t_new * 1e3, t_old / max(t_new, 1e-9), err)
+        if m_old is not None:
+            line += '  peak %7.1f MB -> %7.1f MB' % (m_old, m_new)
+        else:
+            compress = config['model_params']['generator_params']['dense_motion_params']['compress']
+            line += '  repeated volume avoided: %.1f MB' % (bs * (num_kp + 1) * compress * depth * hw * hw * 4 / 2**20)
+        print(line)
@@ -0,0 +1,73 @@
+"""
+Face renderer throughput for different numbers of consecutive frames per generator forward.
+
+Weights are randomly initialised, so no checkpoint is needed; only the timing is meaningful.
+
+    python scripts/bench_facerender.py --frames 32 --batches 1 2 4 8
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import yaml
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.facerender.modules.keypoint_detector import KPDetector
+from src.facerender.modules.mapping import MappingNet
+from src.facerender.modules.generator import OcclusionAwareSPADEGenerator
+from src.facerender.modules.make_animation import render_frames
+
+
+def build_models(config_path, device):
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    generator = OcclusionAwareSPADEGenerator(**config['model_params']['generator_params'],
+                                             **config['model_params']['common_params'])
+    kp_extractor = KPDetector(**config['model_params']['kp_detector_params'],
+                              **config['model_params']['common_params'])
+    mapping = MappingNet(**config['model_params']['mapping_params'])
+    return [m.to(device).eval() for m in (generator, kp_extractor, mapping)]
+
+
+def run(models, frames, size, micro_batch, device):
+    generator, kp_extractor, mapping = models
+    source_image = torch.rand(1, 3, size, size, device=device)
+    source_semantics = torch.rand(1, 70, 27, device=device)
+    target_semantics = torch.rand(frames, 70, 27, device=device)
+
+    start = time.time()
+    for _ in render_frames(source_image, source_semantics, target_semantics,
+                           generator, kp_extractor, mapping, micro_batch=micro_batch):
+        pass
+    if device.type == 'cuda':
+        torch.cuda.synchronize(device)
+    return time.time() - start
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config', default='./src/config/facerender.yaml')
+    parser.add_argument('--frames', type=int, default=32)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--batches', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--cpu', action='store_true')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = torch.device('cuda' if torch.cuda.is_available() and not args.cpu else 'cpu')
+    models = build_models(args.config, device)
+
+    # warm-up so that the first measured configuration does not pay for allocator/kernel setup
+    run(models, 2, args.size, 2, device)
+
+    baseline = None
+    for micro_batch in args.batches:
+        elapsed = run(models, args.frames, args.size, micro_batch, device)
+        fps = args.frames / elapsed
+        baseline = baseline or fps
+        print('batch %3d: %6.2f frames/s  (x%.2f)' % (micro_batch, fps, fps / baseline))
@@ -0,0 +1,86 @@
+"""
+CPU speed of the inference build (BatchNorm folded, spectral norm baked) against the eval-mode
+models: face renderer generator, keypoint detector, audio2exp encoder and the 3DMM recon net.
+
+Weights are random unless --checkpoint points at SadTalker_V0.0.2_<size>.safetensors; BatchNorm
+statistics are randomized so that the parity column is meaningful either way.
+
+    python scripts/bench_inference_build.py --iters 5 --threads 4
+"""
+import os
+import sys
+import copy
+import time
+from argparse import ArgumentParser
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.inference_build import default_models, bake_for_inference
+from src.utils.safetensor_helper import open_safetensor
+
+
+def sample_inputs(name, size):
+    if name == 'generator':
+        kp = {'value': torch.rand(2, 15, 3) - 0.5, 'jacobian': None}
+        kp_source = {'value': torch.rand(2, 15, 3) - 0.5, 'jacobian': None}
+        return (torch.rand(2, 3, size, size), kp, kp_source)
+    if name == 'kp_extractor':
+        return (torch.rand(2, 3, size, size),)
+    if name == 'audio2exp':
+        return (torch.randn(32, 1, 80, 16), torch.randn(1, 32, 64), torch.ones(1, 32, 1))
+    if name == 'face_3drecon':
+        return (torch.rand(2, 3, 224, 224),)
+    return None
+
+
+def timed(model, inputs, iters):
+    with torch.no_grad():
+        out = model(*inputs)
+        start = time.time()
+        for _ in range(iters):
+            model(*inputs)
+    return (time.time() - start) / iters, out
+
+
+def max_diff(a, b):
+    if isinstance(a, dict):
+        return max(max_diff(a[k], b[k]) for k in a if torch.is_tensor(a[k]))
+    return (a - b).abs().max().item()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config_dir', default='./src/config')
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--iters', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    models = default_models(args.config_dir)
+    checkpoint = open_safetensor(args.checkpoint) if args.checkpoint else None
+
+    for name, model in models.items():
+        inputs = sample_inputs(name, args.size)
+        if inputs is None:
+            continue
+        if checkpoint is not None:
+            model.load_state_dict(checkpoint.state_dict(name))
+        for m in model.modules():
+            if isinstance(m, torch.nn.modules.batchnorm._BatchNorm):
+                m.running_mean.uniform_(-0.1, 0.1)
+                m.running_var.uniform_(0.8, 1.2)
+        model.eval()
+        baked = copy.deepcopy(model)
+        counts = bake_for_inference(baked)
+
+        t_ref, out_ref = timed(model, inputs, args.iters)
+        t_new, out_new = timed(baked, inputs, args.iters)
+        print('%-13s %7.1f ms -> %7.1f ms (x%.2f)  folded %3d BN, baked %2d SN  max|diff| %.1e'
+              % (name, t_ref * 1e3, t_new * 1e3, t_ref / max(t_new, 1e-9),
+                 counts['batchnorm'], counts['spectral_norm'], max_diff(out_ref, out_new)))
@@ -0,0 +1,87 @@
+"""
+Per-slide pip_composite_ffmpeg + concat demuxer versus the single-pass compose_lecture, CPU only,
+on a synthetic deck (1920x1080 slides, 256px teacher clips with audio).
+
+    python scripts/bench_lecture_compositor.py --slides 20 --seconds 8
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.lecture_compositor import compose_lecture, probe_duration
+
+
+def ffmpeg(*args):
+    subprocess.run(['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error'] + list(args), check=True)
+
+
+def make_deck(root, slides, seconds, slide_size, teacher_size):
+    items = []
+    for i in range(slides):
+        slide = os.path.join(root, f'slide_{i:03d}.png')
+        teacher = os.path.join(root, f'teacher_{i:03d}.mp4')
+        ffmpeg('-f', 'lavfi', '-i', f'testsrc2=size={slide_size}:rate=1', '-frames:v', '1', slide)
+        duration = seconds * (0.75 + 0.5 * (i % 3) / 2)
+        ffmpeg('-f', 'lavfi', '-i', f'testsrc=size={teacher_size}x{teacher_size}:rate=25:duration={duration}',
+               '-f', 'lavfi', '-i', f'sine=frequency={300 + 20 * i}:duration={duration}',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', teacher)
+        items.append((slide, teacher, None))
+    return items
+
+
+def legacy(items, root, out_path):
+    from lecture_output import pip_composite_ffmpeg
+
+    pieces = []
+    for i, (slide, teacher, _) in enumerate(items):
+        piece = os.path.join(root, f'piece_{i:03d}.mp4')
+        pip_composite_ffmpeg(slide, teacher, piece, pip_ratio=0.10, margin=50, prefer_nvenc=False, fps=25)
+        pieces.append(piece)
+    concat_list = os.path.join(root, 'concat_list.txt')
+    with open(concat_list, 'w', encoding='utf-8') as f:
+        f.writelines(f"file '{p}'\n" for p in pieces)
+    ffmpeg('-f', 'concat', '-safe', '0', '-i', concat_list, '-c', 'copy', out_path)
+    return sum(os.path.getsize(p) for p in pieces)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--slides', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=8.0, help='mean teacher clip length')
+    parser.add_argument('--slide_size', default='1920x1080')
+    parser.add_argument('--teacher_size', type=int, default=256)
+    parser.add_argument('--keep', action='store_true', help='keep the work directory')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_compositor_')
+    try:
+        items = make_deck(root, args.slides, args.seconds, args.slide_size, args.teacher_size)
+        expected = sum(probe_duration(t) for _, t, _ in items)
+
+        start = time.time()
+        legacy_out = os.path.join(root, 'legacy.mp4')
+        piece_bytes = legacy(items, root, legacy_out)
+        legacy_time = time.time() - start
+
+        start = time.time()
+        single_out = os.path.join(root, 'single.mp4')
+        compose_lecture(items, single_out)
+        single_time = time.time() - start
+
+        print('%d slides, %.1fs of lecture' % (args.slides, expected))
+        print('per-slide overlay + concat: %7.2fs  %6.1f MB  (+%.1f MB intermediate pieces)  duration %.2fs'
+              % (legacy_time, os.path.getsize(legacy_out) / 2**20, piece_bytes / 2**20, probe_duration(legacy_out)))
+        print('single pass               : %7.2fs  %6.1f MB  duration %.2fs  (x%.2f)'
+              % (single_time, os.path.getsize(single_out) / 2**20, probe_duration(single_out),
+                 legacy_time / max(single_time, 1e-9)))
+    finally:
+        if args.keep:
+            print('work directory:', root)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,109 @@
+"""
+Per-slide cost of MathFormulaProcessor.process_special_characters: the previous sequential
+re.sub / str.replace / unicodedata.name pipeline versus the compiled translate-table version.
+
+    python scripts/bench_math_verbalizer.py --slides 200 --repeat 5
+"""
+import os
+import re
+import sys
+import time
+import random
+import unicodedata
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.math_formula_processor import MathFormulaProcessor, _ASCII_FALLBACKS
+
+
+LINES = [
+    "Phương trình bậc hai: ax² + bx + c = 0, với a ≠ 0.",
+    "Diện tích hình tròn S = πr², chu vi C = 2πr.",
+    "∀ε > 0, ∃δ > 0: |x − a| < δ ⇒ |f(x) − L| < ε",
+    "A ∪ B ∩ C, x ∉ ℕ, y ∈ ℤ ∪ ℚ ∪ ℂ",
+    "Hôm nay chúng ta học về đạo hàm, một khái niệm quan trọng trong giải tích.",
+    "E = mc², F = ma, v = s/t, ∫f(x)dx, √x + 3√y, x₁ + x₂ = x₃",
+    "Ví dụ 3: tính 12 x 7 và 3 * 4 / 2; nhiệt độ 25°C",
+    "Mục tiêu bài học: hiểu khái niệm, biết vận dụng vào bài tập thực tế.",
+    "Các em hãy đọc kỹ đề bài trước khi làm.",
+]
+
+
+def legacy_unicode(text):
+    out = []
+    for char in text:
+        if ord(char) <= 127:
+            out.append(char)
+            continue
+        try:
+            name = unicodedata.name(char)
+        except ValueError:
+            out.append(char)
+            continue
+        if 'SUPERSCRIPT' in name:
+            out.append({'TWO': ' mũ hai', 'THREE': ' mũ ba', 'ONE': ' mũ một'}.get(name.split()[-1], f' mũ {name.split()[-1]}'))
+        elif 'SUBSCRIPT' in name:
+            out.append({'TWO': ' chỉ số hai', 'THREE': ' chỉ số ba', 'ONE': ' chỉ số một'}.get(name.split()[-1], f' chỉ số {name.split()[-1]}'))
+        elif 'GREEK' in name or 'MATHEMATICAL' in name:
+            out.append(f' {name.split()[-1].lower()}')
+        else:
+            out.append(char)
+    return ''.join(out)
+
+
+def legacy_multiplication(p, s):
+    if not p._is_math_line(s):
+        return s
+    s = re.sub(r'(?<!\w)(\d+)\s*x\b', r'\1 nhân x', s, flags=re.IGNORECASE)
+    s = re.sub(r'(?<![A-Za-z0-9_])([A-Za-z])\s*x\b', r'\1 nhân x', s)
+    s = re.sub(r'(?<![A-Za-z0-9_])([A-Za-z])x\b', r'\1 nhân x', s)
+    s = re.sub(r'π\s*([A-Za-z])\b', r'π nhân \1', s)
+    return re.sub(r'(?<!\w)([A-Za-z]|\d+)\s*x\s*\^\s*(\d+)\b', r'\1 nhân x^\2', s)
+
+
+def legacy_process(p, s):
+    """process_special_characters as it was before the translate table (same output)."""
+    s = s.replace("²", "^2").replace("³", "^3").translate(str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹", "0123456789"))
+    for pattern, replacement in p.math_patterns:
+        s = re.sub(pattern, replacement, s)
+    s = legacy_multiplication(p, s)
+    s = re.sub(rf"\b({p._MATH_LET})\s*\^\s*(\d+)\b", r"\1 mũ \2", s)
+    if p._is_math_line(s):
+        for rx, repl in p.math_ascii_patterns:
+            s = rx.sub(repl, s)
+    merged_map = dict(_ASCII_FALLBACKS)
+    merged_map.update(p.special_char_map)
+    for ch, rep in merged_map.items():
+        s = s.replace(ch, rep)
+    s = legacy_unicode(s)
+    return p._clean_text(s)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--slides', type=int, default=200)
+    parser.add_argument('--lines_per_slide', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    slides = ['\n'.join(rng.choice(LINES) for _ in range(args.lines_per_slide)) for _ in range(args.slides)]
+    processor = MathFormulaProcessor()
+
+    for slide in slides:
+        assert legacy_process(processor, slide) == processor.process_special_characters(slide)
+
+    def best(fn):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for slide in slides:
+                fn(slide)
+            times.append(time.perf_counter() - start)
+        return min(times) / len(slides)
+
+    legacy = best(lambda s: legacy_process(processor, s))
+    compiled = best(processor.process_special_characters)
+    print('%d slides x %d lines: legacy %7.1f us/slide  compiled %7.1f us/slide  (x%.1f)'
+          % (args.slides, args.lines_per_slide, legacy * 1e6, compiled * 1e6, legacy / max(compiled, 1e-12)))
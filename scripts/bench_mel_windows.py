@@ -0,0 +1,51 @@
+"""
+Per-frame mel window loop of get_data versus the single-gather mel_windows, for 1 to 60 minutes of audio.
+
+    python scripts/bench_mel_windows.py --minutes 1 10 30 60
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.generate_batch import mel_windows
+
+
+def loop_mel_windows(spec, num_frames, fps=25, syncnet_mel_step_size=16):
+    indiv_mels = []
+    for i in range(num_frames):
+        start_frame_num = i-2
+        start_idx = int(80. * (start_frame_num / float(fps)))
+        end_idx = start_idx + syncnet_mel_step_size
+        seq = list(range(start_idx, end_idx))
+        seq = [ min(max(item, 0), spec.shape[0]-1) for item in seq ]
+        m = spec[seq, :]
+        indiv_mels.append(m.T)
+    return np.asarray(indiv_mels)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--minutes', nargs='+', type=float, default=[1, 10, 30, 60])
+    args = parser.parse_args()
+
+    for minutes in args.minutes:
+        seconds = minutes * 60
+        num_frames = int(seconds * 25)
+        spec = np.random.rand(int(seconds * 80) + 1, 80).astype(np.float32)
+
+        start = time.time()
+        expected = loop_mel_windows(spec, num_frames)
+        loop_time = time.time() - start
+
+        start = time.time()
+        result = mel_windows(spec, np.arange(num_frames))
+        gather_time = time.time() - start
+
+        assert np.array_equal(result, expected)
+        print('%5.1f min (%6d frames): loop %7.3fs  gather %7.3fs  (x%.1f)'
+              % (minutes, num_frames, loop_time, gather_time, loop_time / max(gather_time, 1e-9)))
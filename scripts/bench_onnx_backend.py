@@ -0,0 +1,110 @@
+"""
+Face renderer on CPU: eager PyTorch against the onnxruntime backend (src/facerender/onnx_backend.py).
+
+The mapping net and the per-frame decoder are timed at several micro-batch sizes and onnxruntime
+intra-op thread counts; the source encoding is timed once. Weights are random unless --checkpoint
+points at SadTalker_V0.0.2_<size>.safetensors, --mapping at the mapping checkpoint. Graphs are
+exported to a temporary directory unless --onnx_dir is given.
+
+    python scripts/bench_onnx_backend.py --size 256 --batch 1 4 8 --threads 1 4
+"""
+import os
+import sys
+import time
+import tempfile
+from argparse import ArgumentParser
+
+import torch
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.facerender.modules.generator import OcclusionAwareSPADEGenerator
+from src.facerender.modules.mapping import MappingNet
+from src.facerender.onnx_backend import OnnxFaceRenderer
+from src.utils.safetensor_helper import open_safetensor
+
+
+def timed(fn, iters):
+    with torch.no_grad():
+        out = fn()
+        start = time.time()
+        for _ in range(iters):
+            fn()
+    return (time.time() - start) / iters, out
+
+
+def max_diff(a, b):
+    if isinstance(a, dict):
+        return max(max_diff(a[k], b[k]) for k in a if torch.is_tensor(a[k]))
+    return (a - b).abs().max().item()
+
+
+def row(name, t_ref, t_new, diff):
+    print('%-26s %8.1f ms -> %8.1f ms (x%.2f)  max|diff| %.1e' % (name, t_ref * 1e3, t_new * 1e3,
+                                                                 t_ref / max(t_new, 1e-9), diff))
+
+
+def bench(args, generator, mapping, onnx_dir):
+    num_kp = generator.dense_motion_network.num_kp
+    source_image = torch.rand(1, 3, args.size, args.size)
+    kp_source = {'value': torch.rand(1, num_kp, 3) * 1.6 - 0.8}
+    source = generator.encode_source(source_image, kp_source=kp_source)
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        renderer = OnnxFaceRenderer(generator, mapping, onnx_dir, intra_op_threads=threads,
+                                    optimization=args.optimization)
+        print('--- %d threads (torch and onnxruntime) ---' % threads)
+        t_ref, ref = timed(lambda: generator.encode_source(source_image, kp_source=kp_source), args.iters)
+        t_new, new = timed(lambda: renderer.generator.encode_source(source_image, kp_source=kp_source), args.iters)
+        row('source encoding', t_ref, t_new, max(max_diff(ref['feature_2d'], new['feature_2d']),
+                                                 max_diff(ref['feature_3d'], new['feature_3d'])))
+        onnx_source = new
+
+        for bs in args.batch:
+            semantics = torch.randn(bs, mapping.first[0].in_channels, 27)
+            t_ref, ref = timed(lambda: mapping(semantics), args.iters)
+            t_new, new = timed(lambda: renderer.mapping(semantics), args.iters)
+            row('mapping, %d frames' % bs, t_ref, t_new, max_diff(ref, new))
+
+            kp_driving = {'value': torch.rand(bs, num_kp, 3) * 1.6 - 0.8}
+            kp_batch = {'value': kp_source['value'].expand(bs, -1, -1)}
+            t_ref, ref = timed(lambda: generator.decode(source, kp_driving=kp_driving, kp_source=kp_batch), args.iters)
+            t_new, new = timed(lambda: renderer.generator.decode(onnx_source, kp_driving=kp_driving,
+                                                                 kp_source=kp_source), args.iters)
+            row('decode, %d frames' % bs, t_ref / bs, t_new / bs, max_diff(ref, new))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config_dir', default='./src/config')
+    parser.add_argument('--checkpoint', default=None)
+    parser.add_argument('--mapping', default=None)
+    parser.add_argument('--onnx_dir', default=None)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()])
+    parser.add_argument('--optimization', default='all', choices=['all', 'extended', 'basic', 'disable'])
+    parser.add_argument('--iters', type=int, default=3)
+    args = parser.parse_args()
+
+    with open(os.path.join(args.config_dir, 'facerender.yaml')) as f:
+        config = yaml.safe_load(f)
+    torch.manual_seed(0)
+    generator = OcclusionAwareSPADEGenerator(**config['model_params']['generator_params'],
+                                             **config['model_params']['common_params'])
+    mapping = MappingNet(**config['model_params']['mapping_params'])
+    if args.checkpoint:
+        generator.load_state_dict(open_safetensor(args.checkpoint).state_dict('generator'))
+    if args.mapping:
+        mapping.load_state_dict(torch.load(args.mapping, map_location='cpu')['mapping'])
+    generator.eval()
+    mapping.eval()
+    print('decode times are per frame')
+
+    if args.onnx_dir:
+        bench(args, generator, mapping, args.onnx_dir)
+    else:
+        with tempfile.TemporaryDirectory() as onnx_dir:
+            bench(args, generator, mapping, onnx_dir)
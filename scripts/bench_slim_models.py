@@ -0,0 +1,90 @@
+"""
+Full versus inference-only model construction: build time and weight bytes per component.
+
+Without --checkpoint_dir only the affected modules are built (random weights): Audio2Pose with
+and without its discriminator / CVAE encoder, and HEEstimator. With --checkpoint_dir the whole
+SadTalkerModels bundle is loaded both ways, each in a fresh process, and its resident memory
+is reported as well.
+
+    python scripts/bench_slim_models.py
+    python scripts/bench_slim_models.py --checkpoint_dir ./checkpoints --size 256
+"""
+import os
+import sys
+import time
+import multiprocessing
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        return float('nan')
+
+
+def build_modules(config_dir, inference_only):
+    import yaml
+    from yacs.config import CfgNode as CN
+    from src.audio2pose_models.audio2pose import Audio2Pose
+    from src.facerender.modules.keypoint_detector import HEEstimator
+    from src.utils.model_registry import module_report
+
+    with open(os.path.join(config_dir, 'auido2pose.yaml')) as f:
+        cfg_pose = CN.load_cfg(f)
+    with open(os.path.join(config_dir, 'facerender.yaml')) as f:
+        config = yaml.safe_load(f)
+
+    start = time.time()
+    report = module_report('audio2pose', Audio2Pose(cfg_pose, None, device='cpu', inference_only=inference_only), 1)
+    if not inference_only:
+        report += module_report('he_estimator', HEEstimator(**config['model_params']['he_estimator_params'],
+                                                            **config['model_params']['common_params']))
+    return time.time() - start, report
+
+
+def load_bundle(args, inference_only, queue):
+    from src.utils.init_path import init_path
+    from src.utils.model_registry import SadTalkerModels
+
+    base = rss_mb()
+    start = time.time()
+    paths = init_path(args.checkpoint_dir, args.config_dir, args.size, False, 'crop')
+    models = SadTalkerModels(paths, args.device, inference_only=inference_only)
+    queue.put((time.time() - start, rss_mb() - base, models.memory_report(depth=1)))
+
+
+def print_report(title, seconds, report, rss=None):
+    total = sum(nbytes for name, nbytes in report if '.' not in name)
+    line = '%s: %.2f s, %.1f MB of weights' % (title, seconds, total / 2**20)
+    if rss is not None:
+        line += ', RSS +%.1f MB' % rss
+    print(line)
+    for name, nbytes in report:
+        print('    %-32s %8.1f MB' % (name, nbytes / 2**20))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config_dir', default='./src/config')
+    parser.add_argument('--checkpoint_dir', default=None)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    for inference_only in (False, True):
+        title = 'inference_only' if inference_only else 'full'
+        if args.checkpoint_dir is None:
+            seconds, report = build_modules(args.config_dir, inference_only)
+            print_report(title, seconds, report)
+            continue
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        proc = ctx.Process(target=load_bundle, args=(args, inference_only, queue))
+        proc.start()
+        seconds, rss, report = queue.get()
+        proc.join()
+        print_report(title, seconds, report, rss)
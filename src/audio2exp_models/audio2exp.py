@@ -4,27 +4,32 @@ from torch import nn
 
 
 class Audio2Exp(nn.Module):
-    def __init__(self, netG, cfg, device, prepare_training_loss=False):
+    def __init__(self, netG, cfg, device, prepare_training_loss=False, max_batch=1024):
         super(Audio2Exp, self).__init__()
         self.cfg = cfg
         self.device = device
         self.netG = netG.to(device)
+        self.max_batch = max_batch
 
-    def test(self, batch):
+    def test(self, batch, max_batch=None):
+        """
+        Every frame is independent, so frames are run in chunks of max_batch (bs*frames) per forward.
+        """
 
         mel_input = batch['indiv_mels']                         # bs T 1 80 16
         bs = mel_input.shape[0]
         T = mel_input.shape[1]
+        step = max(1, (max_batch or self.max_batch) // bs)
 
         exp_coeff_pred = []
 
-        for i in tqdm(range(0, T, 10),'audio2exp:'): # every 10 frames
+        for i in tqdm(range(0, T, step),'audio2exp:'):
             
-            current_mel_input = mel_input[:,i:i+10]
+            current_mel_input = mel_input[:,i:i+step]
 
             #ref = batch['ref'][:, :, :64].repeat((1,current_mel_input.shape[1],1))           #bs T 64
-            ref = batch['ref'][:, :, :64][:, i:i+10]
-            ratio = batch['ratio_gt'][:, i:i+10]                               #bs T
+            ref = batch['ref'][:, :, :64][:, i:i+step]
+            ratio = batch['ratio_gt'][:, i:i+step]                               #bs T
 
             audiox = current_mel_input.view(-1, 1, 80, 16)                  # bs*T 1 80 16
 
@@ -5,20 +5,25 @@ from src.audio2pose_models.discriminator import PoseSequenceDiscriminator
 from src.audio2pose_models.audio_encoder import AudioEncoder
 
 class Audio2Pose(nn.Module):
-    def __init__(self, cfg, wav2lip_checkpoint, device='cuda'):
+    # checkpoint entries of the modules an inference_only model does not build
+    TRAINING_ONLY_PREFIXES = ('netD_motion.', 'netG.encoder.')
+
+    def __init__(self, cfg, wav2lip_checkpoint, device='cuda', max_batch=1024, inference_only=False):
         super().__init__()
         self.cfg = cfg
+        self.inference_only = inference_only
         self.seq_len = cfg.MODEL.CVAE.SEQ_LEN
         self.latent_dim = cfg.MODEL.CVAE.LATENT_SIZE
         self.device = device
+        self.max_batch = max_batch
 
         self.audio_encoder = AudioEncoder(wav2lip_checkpoint, device)
         self.audio_encoder.eval()
         for param in self.audio_encoder.parameters():
             param.requires_grad = False
 
-        self.netG = CVAE(cfg)
-        self.netD_motion = PoseSequenceDiscriminator(cfg)
+        self.netG = CVAE(cfg, inference_only=inference_only)
+        self.netD_motion = None if inference_only else PoseSequenceDiscriminator(cfg)
         
         
     def forward(self, x):
@@ -45,7 +50,12 @@ class Audio2Pose(nn.Module):
 
         return batch
 
-    def test(self, x):
+    def test(self, x, max_batch=None):
+        """
+        The seq_len windows are independent: every frame is embedded once, then all windows
+        (plus the remainder window) go through the CVAE decoder in batches of at most max_batch.
+        """
+        max_batch = max_batch or self.max_batch
 
         batch = {}
         ref = x['ref']                            #bs 1 70
@@ -61,29 +71,38 @@ class Audio2Pose(nn.Module):
         #  
         div = num_frames//self.seq_len
         re = num_frames%self.seq_len
-        audio_emb_list = []
         pose_motion_pred_list = [torch.zeros(batch['ref'].unsqueeze(1).shape, dtype=batch['ref'].dtype, 
                                                 device=batch['ref'].device)]
 
-        for i in range(div):
-            z = torch.randn(bs, self.latent_dim).to(ref.device)
-            batch['z'] = z
-            audio_emb = self.audio_encoder(indiv_mels_use[:, i*self.seq_len:(i+1)*self.seq_len,:,:,:]) #bs seq_len 512
-            batch['audio_emb'] = audio_emb
-            batch = self.netG.test(batch)
-            pose_motion_pred_list.append(batch['pose_motion_pred'])  #list of bs seq_len 6
-        
+        mels = indiv_mels_use[:, :num_frames]
+        audio_emb = self.audio_encoder.embed_frames(mels.reshape((-1,)+mels.shape[2:]), max_batch)
+        audio_emb = audio_emb.reshape(bs, num_frames, -1)           #bs T-1 512
+
+        windows = [audio_emb[:, i*self.seq_len:(i+1)*self.seq_len] for i in range(div)]
+        if re != 0:
+            last = audio_emb[:, -1*self.seq_len:]                   #bs seq_len 512
+            if last.shape[1] != self.seq_len:
+                pad_dim = self.seq_len-last.shape[1]
+                last = torch.cat([last[:, :1].repeat(1, pad_dim, 1), last], 1) 
+            windows.append(last)
+
+        # one z per window, drawn in the same order as the former per-window loop
+        z = [torch.randn(bs, self.latent_dim).to(ref.device) for _ in windows]
+
+        step = max(1, max_batch // bs)
+        preds = []
+        for i in range(0, len(windows), step):
+            n = len(windows[i:i+step])
+            window_batch = {'ref': batch['ref'].repeat(n, 1),
+                            'class': batch['class'].repeat(n),
+                            'z': torch.cat(z[i:i+step], 0),
+                            'audio_emb': torch.cat(windows[i:i+step], 0)}          #n*bs seq_len 512
+            window_batch = self.netG.test(window_batch)
+            preds += list(window_batch['pose_motion_pred'].split(bs, dim=0))     #list of bs seq_len 6
+
+        pose_motion_pred_list += preds[:div]
         if re != 0:
-            z = torch.randn(bs, self.latent_dim).to(ref.device)
-            batch['z'] = z
-            audio_emb = self.audio_encoder(indiv_mels_use[:, -1*self.seq_len:,:,:,:]) #bs seq_len  512
-            if audio_emb.shape[1] != self.seq_len:
-                pad_dim = self.seq_len-audio_emb.shape[1]
-                pad_audio_emb = audio_emb[:, :1].repeat(1, pad_dim, 1) 
-                audio_emb = torch.cat([pad_audio_emb, audio_emb], 1) 
-            batch['audio_emb'] = audio_emb
-            batch = self.netG.test(batch)
-            pose_motion_pred_list.append(batch['pose_motion_pred'][:,-1*re:,:])   
+            pose_motion_pred_list.append(preds[-1][:,-1*re:,:])   
         
         pose_motion_pred = torch.cat(pose_motion_pred_list, dim = 1)
         batch['pose_motion_pred'] = pose_motion_pred
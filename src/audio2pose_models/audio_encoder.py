@@ -51,6 +51,13 @@ class AudioEncoder(nn.Module):
         # self.audio_encoder.load_state_dict(state_dict)
 
 
+    def embed_frames(self, mels, max_batch=1024):
+        """(N, 1, 80, 16) mel windows -> (N, 512); frames are independent, so run them max_batch at a time."""
+        if mels.shape[0] == 0:
+            return mels.new_zeros((0, 512))
+        embeddings = [self.audio_encoder(mels[i:i+max_batch]) for i in range(0, mels.shape[0], max_batch)]
+        return torch.cat(embeddings, dim=0).flatten(1)
+
     def forward(self, audio_sequences):
         # audio_sequences = (B, T, 1, 80, 16)
         B = audio_sequences.size(0)
@@ -11,7 +11,7 @@ def class2onehot(idx, class_num):
     return onehot
 
 class CVAE(nn.Module):
-    def __init__(self, cfg):
+    def __init__(self, cfg, inference_only=False):
         super().__init__()
         encoder_layer_sizes = cfg.MODEL.CVAE.ENCODER_LAYER_SIZES
         decoder_layer_sizes = cfg.MODEL.CVAE.DECODER_LAYER_SIZES
@@ -23,8 +23,9 @@ class CVAE(nn.Module):
 
         self.latent_size = latent_size
 
-        self.encoder = ENCODER(encoder_layer_sizes, latent_size, num_classes,
-                                audio_emb_in_size, audio_emb_out_size, seq_len)
+        # test() only runs the decoder: the encoder (and its ResUnet) is needed for training only
+        self.encoder = None if inference_only else ENCODER(encoder_layer_sizes, latent_size, num_classes,
+                                                           audio_emb_in_size, audio_emb_out_size, seq_len)
         self.decoder = DECODER(decoder_layer_sizes, latent_size, num_classes,
                                 audio_emb_in_size, audio_emb_out_size, seq_len)
     def reparameterize(self, mu, logvar):
@@ -4,8 +4,6 @@ import yaml
 import numpy as np
 import warnings
 from skimage import img_as_ubyte
-import safetensors
-import safetensors.torch 
 warnings.filterwarnings('ignore')
 
 
@@ -17,12 +15,15 @@ import torchvision
 from src.facerender.modules.keypoint_detector import HEEstimator, KPDetector
 from src.facerender.modules.mapping import MappingNet
 from src.facerender.modules.generator import OcclusionAwareGenerator, OcclusionAwareSPADEGenerator
-from src.facerender.modules.make_animation import make_animation 
+from src.facerender.modules.make_animation import render_frames, flatten_frames, prepare_source_keypoints
+from src.generate_facerender_batch import get_source_data
 
 from pydub import AudioSegment 
 from src.utils.face_enhancer import enhancer_generator_with_len, enhancer_list
-from src.utils.paste_pic import paste_pic
-from src.utils.videoio import save_video_with_watermark
+from src.utils.paste_pic import paste_pic, PicPaster
+from src.utils.videoio import save_video_with_watermark, FFmpegVideoWriter
+from src.utils.safetensor_helper import open_safetensor
+from src.utils.inference_build import load_checkpoint_module
 
 try:
     import webui  # in webui
@@ -30,9 +31,20 @@ try:
 except:
     in_webui = False
 
+def prediction_to_uint8(prediction):
+    """(n, 3, H, W) float predictions in [0, 1] -> (n, H, W, 3) uint8 RGB, rounded like img_as_ubyte."""
+    prediction = (prediction.clamp(0, 1) * 255).round().to(torch.uint8)
+    return prediction.permute(0, 2, 3, 1).cpu().numpy()
+
 class AnimateFromCoeff():
 
-    def __init__(self, sadtalker_path, device):
+    def __init__(self, sadtalker_path, device, inference_only=True, backend=None, onnx_dir=None, onnx_threads=None):
+        """
+        inference_only -- skip HEEstimator: render_frames never calls it and the safetensors checkpoint has no weights for it
+        backend        -- 'torch' or 'onnx' (onnxruntime on CPU, see src/facerender/onnx_backend.py); default $FACERENDER_BACKEND or 'torch'
+        onnx_dir       -- exported graphs, default checkpoints/onnx/<checkpoint>__<mapping>
+        onnx_threads   -- onnxruntime intra-op threads, default $ONNX_INTRA_OP_THREADS or all cores
+        """
 
         with open(sadtalker_path['facerender_yaml']) as f:
             config = yaml.safe_load(f)
@@ -41,20 +53,24 @@ class AnimateFromCoeff():
                                                     **config['model_params']['common_params'])
         kp_extractor = KPDetector(**config['model_params']['kp_detector_params'],
                                     **config['model_params']['common_params'])
-        he_estimator = HEEstimator(**config['model_params']['he_estimator_params'],
-                               **config['model_params']['common_params'])
+        he_estimator = None
+        if not inference_only:
+            he_estimator = HEEstimator(**config['model_params']['he_estimator_params'],
+                                   **config['model_params']['common_params'])
         mapping = MappingNet(**config['model_params']['mapping_params'])
 
         generator.to(device)
         kp_extractor.to(device)
-        he_estimator.to(device)
+        if he_estimator is not None:
+            he_estimator.to(device)
         mapping.to(device)
         for param in generator.parameters():
             param.requires_grad = False
         for param in kp_extractor.parameters():
             param.requires_grad = False 
-        for param in he_estimator.parameters():
-            param.requires_grad = False
+        if he_estimator is not None:
+            for param in he_estimator.parameters():
+                param.requires_grad = False
         for param in mapping.parameters():
             param.requires_grad = False
 
@@ -78,35 +94,35 @@ class AnimateFromCoeff():
 
         self.kp_extractor.eval()
         self.generator.eval()
-        self.he_estimator.eval()
+        if self.he_estimator is not None:
+            self.he_estimator.eval()
         self.mapping.eval()
          
         self.device = device
+
+        backend = backend or os.environ.get('FACERENDER_BACKEND', 'torch')
+        self.renderer = None
+        if backend == 'onnx' and torch.device(device).type != 'cpu':
+            print('Face Renderer: the onnx backend runs on CPU only, keeping torch on %s' % device)
+        elif backend == 'onnx':
+            from src.facerender.onnx_backend import OnnxFaceRenderer, default_onnx_dir
+            self.renderer = OnnxFaceRenderer(generator, mapping, onnx_dir or default_onnx_dir(sadtalker_path),
+                                             intra_op_threads=onnx_threads or os.environ.get('ONNX_INTRA_OP_THREADS'))
+        elif backend != 'torch':
+            raise ValueError('unknown face renderer backend: %s' % backend)
     
     def load_cpk_facevid2vid_safetensor(self, checkpoint_path, generator=None, 
                         kp_detector=None, he_estimator=None,  
                         device="cpu"):
 
-        checkpoint = safetensors.torch.load_file(checkpoint_path)
+        checkpoint = open_safetensor(checkpoint_path)
 
         if generator is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'generator' in k:
-                    x_generator[k.replace('generator.', '')] = v
-            generator.load_state_dict(x_generator)
+            load_checkpoint_module(generator, checkpoint, 'generator')
         if kp_detector is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'kp_extractor' in k:
-                    x_generator[k.replace('kp_extractor.', '')] = v
-            kp_detector.load_state_dict(x_generator)
+            load_checkpoint_module(kp_detector, checkpoint, 'kp_extractor')
         if he_estimator is not None:
-            x_generator = {}
-            for k,v in checkpoint.items():
-                if 'he_estimator' in k:
-                    x_generator[k.replace('he_estimator.', '')] = v
-            he_estimator.load_state_dict(x_generator)
+            load_checkpoint_module(he_estimator, checkpoint, 'he_estimator')
         
         return None
 
@@ -154,7 +170,64 @@ class AnimateFromCoeff():
 
         return checkpoint['epoch']
 
-    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256):
+    def prepare_source(self, avatar, crop_pic_path, first_coeff_path, preprocess='crop', img_size=256):
+        """Compute kp_canonical / kp_source of a cropped avatar and store them in its bundle."""
+        source_cache = avatar.load_source_keypoints(self.device)
+        if source_cache is not None:
+            return source_cache
+        source_image, source_semantics, _ = get_source_data(crop_pic_path, first_coeff_path, preprocess, img_size)
+        source_cache = prepare_source_keypoints(source_image.to(self.device), source_semantics.to(self.device),
+                                                self.kp_extractor, self.mapping)
+        avatar.save_source_keypoints(source_cache)
+        return source_cache
+
+    def stream_video(self, chunks, save_path, audio_path, pic_path, crop_info, preprocess='crop', img_size=256, output_width=None):
+        """
+        Convert each rendered chunk to uint8, resize / paste it back and pipe it to one ffmpeg process
+        that also muxes the audio. Only one chunk of frames is held in memory at a time.
+        output_width caps the written width (e.g. the on-screen size of a picture-in-picture overlay).
+        """
+        original_size = crop_info[0]
+        paster = None
+        if 'full' in preprocess.lower():
+            paster = PicPaster(pic_path, crop_info, extended_crop= True if 'ext' in preprocess.lower() else False, output_width=output_width)
+            if paster.region is None:
+                print("you didn't crop the image")
+                paster = None
+        elif output_width:
+            img_size = min(img_size, output_width)
+
+        with FFmpegVideoWriter(save_path, audio_path, fps=25, pix_fmt='bgr24' if paster is not None else 'rgb24') as writer:
+            for _, prediction in chunks:
+                chunk = prediction_to_uint8(prediction)
+                for image in chunk:
+                    if original_size:
+                        image = cv2.resize(image, (img_size, int(img_size * original_size[1]/original_size[0])))
+                    if paster is not None:
+                        image = paster.paste(cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+                    writer.write(image)
+        return save_path
+
+    def write_temp_video(self, chunks, path, crop_info, img_size=256):
+        """Non-streaming path: collect every frame, then write the face-only video without audio."""
+        predictions_video = torch.cat([prediction for _, prediction in chunks], dim=0)
+
+        video = []
+        for idx in range(predictions_video.shape[0]):
+            image = predictions_video[idx]
+            image = np.transpose(image.data.cpu().numpy(), [1, 2, 0]).astype(np.float32)
+            video.append(image)
+        result = img_as_ubyte(video)
+
+        ### the generated video is 256x256, so we keep the aspect ratio, 
+        original_size = crop_info[0]
+        if original_size:
+            result = [ cv2.resize(result_i,(img_size, int(img_size * original_size[1]/original_size[0]) )) for result_i in result ]
+        
+        imageio.mimsave(path, result,  fps=float(25))
+
+    def generate(self, x, video_save_dir, pic_path, crop_info, enhancer=None, background_enhancer=None, preprocess='crop', img_size=256, avatar=None,
+                 micro_batch=None, memory_budget_mb=None, stream=True, output_width=None):
 
         source_image=x['source_image'].type(torch.FloatTensor)
         source_semantics=x['source_semantics'].type(torch.FloatTensor)
@@ -180,30 +253,10 @@ class AnimateFromCoeff():
 
         frame_num = x['frame_num']
 
-        predictions_video = make_animation(source_image, source_semantics, target_semantics,
-                                        self.generator, self.kp_extractor, self.he_estimator, self.mapping, 
-                                        yaw_c_seq, pitch_c_seq, roll_c_seq, use_exp = True)
-
-        predictions_video = predictions_video.reshape((-1,)+predictions_video.shape[2:])
-        predictions_video = predictions_video[:frame_num]
-
-        video = []
-        for idx in range(predictions_video.shape[0]):
-            image = predictions_video[idx]
-            image = np.transpose(image.data.cpu().numpy(), [1, 2, 0]).astype(np.float32)
-            video.append(image)
-        result = img_as_ubyte(video)
-
-        ### the generated video is 256x256, so we keep the aspect ratio, 
-        original_size = crop_info[0]
-        if original_size:
-            result = [ cv2.resize(result_i,(img_size, int(img_size * original_size[1]/original_size[0]) )) for result_i in result ]
-        
-        # Tạo file tạm cho video chỉ có mặt
-        video_name = x['video_name']  + '.mp4'
-        path = os.path.join(video_save_dir, 'temp_'+video_name)
-        
-        imageio.mimsave(path, result,  fps=float(25))
+        source_cache = avatar.load_source_keypoints(self.device) if avatar is not None else None
+        cached_keypoints = source_cache is not None
+        if source_cache is None:
+            source_cache = {}
 
         # Xử lý audio
         audio_path =  x['audio_path'] 
@@ -218,20 +271,41 @@ class AnimateFromCoeff():
         word = word1[start_time:end_time]
         word.export(new_audio_path, format="wav")
 
-        if 'full' in preprocess.lower():
-            # Chỉ tạo file full, không tạo file chỉ có mặt
-            video_name_full = x['video_name']  + '.mp4'  # Đổi tên thành .mp4 thay vì _full.mp4
-            full_video_path = os.path.join(video_save_dir, video_name_full)
-            return_path = full_video_path
-            paste_pic(path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop= True if 'ext' in preprocess.lower() else False)
-            print(f'The generated video is named {video_save_dir}/{video_name_full}') 
+        generator, mapping = self.generator, self.mapping
+        if self.renderer is not None:
+            # the memory probe of auto_micro_batch needs the torch generator
+            generator, mapping = self.renderer.generator, self.renderer.mapping
+            micro_batch = micro_batch or self.renderer.micro_batch
+
+        # consecutive frames are rendered together; the padding frames of the batch layout are skipped
+        chunks = render_frames(source_image, source_semantics, flatten_frames(target_semantics, frame_num),
+                               generator, self.kp_extractor, mapping,
+                               flatten_frames(yaw_c_seq, frame_num), flatten_frames(pitch_c_seq, frame_num), flatten_frames(roll_c_seq, frame_num),
+                               micro_batch=micro_batch, memory_budget_mb=memory_budget_mb, source_cache=source_cache)
+
+        video_name = x['video_name']  + '.mp4'
+        full_video_path = os.path.join(video_save_dir, video_name)
+        return_path = full_video_path
+        path = None
+
+        if stream:
+            # Ghi thẳng từng lô khung hình vào ffmpeg (kèm audio), không qua file temp_*.mp4
+            self.stream_video(chunks, full_video_path, new_audio_path, pic_path, crop_info, preprocess, img_size,
+                              output_width=None if enhancer else output_width)
         else:
-            # Cho các preprocess khác, tạo file chỉ có mặt như bình thường
-            av_path = os.path.join(video_save_dir, video_name)
-            return_path = av_path
-            save_video_with_watermark(path, new_audio_path, av_path, watermark= False)
-            print(f'The generated video is named {video_save_dir}/{video_name}') 
-            full_video_path = av_path 
+            # Tạo file tạm cho video chỉ có mặt
+            path = os.path.join(video_save_dir, 'temp_'+video_name)
+            self.write_temp_video(chunks, path, crop_info, img_size)
+            if 'full' in preprocess.lower():
+                # Chỉ tạo file full, không tạo file chỉ có mặt
+                paste_pic(path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop= True if 'ext' in preprocess.lower() else False)
+            else:
+                # Cho các preprocess khác, tạo file chỉ có mặt như bình thường
+                save_video_with_watermark(path, new_audio_path, full_video_path, watermark= False)
+        print(f'The generated video is named {video_save_dir}/{video_name}') 
+
+        if avatar is not None and not cached_keypoints:
+            avatar.save_source_keypoints(source_cache)
 
         #### paste back then enhancers
         if enhancer:
@@ -251,7 +325,8 @@ class AnimateFromCoeff():
             print(f'The generated video is named {video_save_dir}/{video_name_enhancer}')
             os.remove(enhanced_path)
 
-        os.remove(path)
+        if path is not None:
+            os.remove(path)
         os.remove(new_audio_path)
 
         return return_path
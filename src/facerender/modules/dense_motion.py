@@ -1,7 +1,7 @@
 from torch import nn
 import torch.nn.functional as F
 import torch
-from src.facerender.modules.util import Hourglass, make_coordinate_grid, kp2gaussian
+from src.facerender.modules.util import Hourglass, make_coordinate_grid, kp2gaussian, expand_batch, cached_constant, grid_sample
 
 from src.facerender.sync_batchnorm import SynchronizedBatchNorm3d as BatchNorm3d
 
@@ -33,23 +33,21 @@ class DenseMotionNetwork(nn.Module):
 
     def create_sparse_motions(self, feature, kp_driving, kp_source):
         bs, _, d, h, w = feature.shape
-        identity_grid = make_coordinate_grid((d, h, w), type=kp_source['value'].type())
+        identity_grid = make_coordinate_grid((d, h, w), type=kp_source['value'].type(), device=kp_source['value'].device)
         identity_grid = identity_grid.view(1, 1, d, h, w, 3)
         coordinate_grid = identity_grid - kp_driving['value'].view(bs, self.num_kp, 1, 1, 1, 3)
         
         # if 'jacobian' in kp_driving:
         if 'jacobian' in kp_driving and kp_driving['jacobian'] is not None:
             jacobian = torch.matmul(kp_source['jacobian'], torch.inverse(kp_driving['jacobian']))
-            jacobian = jacobian.unsqueeze(-3).unsqueeze(-3).unsqueeze(-3)
-            jacobian = jacobian.repeat(1, 1, d, h, w, 1, 1)
-            coordinate_grid = torch.matmul(jacobian, coordinate_grid.unsqueeze(-1))
-            coordinate_grid = coordinate_grid.squeeze(-1)                  
+            # one 3x3 matrix per keypoint applied to all d*h*w offsets, instead of repeating it per voxel
+            coordinate_grid = torch.einsum('bkij,bkdhwj->bkdhwi', jacobian, coordinate_grid)
 
 
         driving_to_source = coordinate_grid + kp_source['value'].view(bs, self.num_kp, 1, 1, 1, 3)    # (bs, num_kp, d, h, w, 3)
 
         #adding background feature
-        identity_grid = identity_grid.repeat(bs, 1, 1, 1, 1, 1)
+        identity_grid = identity_grid.expand(bs, 1, d, h, w, 3)
         sparse_motions = torch.cat([identity_grid, driving_to_source], dim=1)                #bs num_kp+1 d h w 3
         
         # sparse_motions = driving_to_source
@@ -57,38 +55,62 @@ class DenseMotionNetwork(nn.Module):
         return sparse_motions
 
     def create_deformed_feature(self, feature, sparse_motions):
-        bs, _, d, h, w = feature.shape
-        feature_repeat = feature.unsqueeze(1).unsqueeze(1).repeat(1, self.num_kp+1, 1, 1, 1, 1, 1)      # (bs, num_kp+1, 1, c, d, h, w)
-        feature_repeat = feature_repeat.view(bs * (self.num_kp+1), -1, d, h, w)                         # (bs*(num_kp+1), c, d, h, w)
-        sparse_motions = sparse_motions.view((bs * (self.num_kp+1), d, h, w, -1))                       # (bs*(num_kp+1), d, h, w, 3) !!!!
-        sparse_deformed = F.grid_sample(feature_repeat, sparse_motions)
-        sparse_deformed = sparse_deformed.view((bs, self.num_kp+1, -1, d, h, w))                        # (bs, num_kp+1, c, d, h, w)
+        """
+        Warp the feature volume once per keypoint motion. The num_kp+1 sampling grids are stacked
+        along the output depth, so a single grid_sample reads the one (bs, c, d, h, w) volume
+        instead of num_kp+1 repeated copies of it; every output voxel is sampled exactly as before.
+        """
+        bs, c, d, h, w = feature.shape
+        if bs > 1 and feature.stride(0) == 0:
+            # one source volume broadcast over the batch (expand_batch): stack the frames along depth too
+            grid = sparse_motions.reshape(1, bs * (self.num_kp+1) * d, h, w, 3)
+            sparse_deformed = grid_sample(feature[:1], grid)                                         # (1, c, bs*(num_kp+1)*d, h, w)
+            return sparse_deformed.view(c, bs, self.num_kp+1, d, h, w).permute(1, 2, 0, 3, 4, 5)
+        grid = sparse_motions.reshape(bs, (self.num_kp+1) * d, h, w, 3)                                # (bs, (num_kp+1)*d, h, w, 3)
+        sparse_deformed = grid_sample(feature, grid)                                                 # (bs, c, (num_kp+1)*d, h, w)
+        sparse_deformed = sparse_deformed.view(bs, c, self.num_kp+1, d, h, w).transpose(1, 2)        # (bs, num_kp+1, c, d, h, w)
         return sparse_deformed
 
-    def create_heatmap_representations(self, feature, kp_driving, kp_source):
+    def create_heatmap_representations(self, feature, kp_driving, kp_source, gaussian_source=None):
         spatial_size = feature.shape[3:]
         gaussian_driving = kp2gaussian(kp_driving, spatial_size=spatial_size, kp_variance=0.01)
-        gaussian_source = kp2gaussian(kp_source, spatial_size=spatial_size, kp_variance=0.01)
+        if gaussian_source is None:
+            gaussian_source = kp2gaussian(kp_source, spatial_size=spatial_size, kp_variance=0.01)
         heatmap = gaussian_driving - gaussian_source
 
-        # adding background feature
-        zeros = torch.zeros(heatmap.shape[0], 1, spatial_size[0], spatial_size[1], spatial_size[2]).type(heatmap.type())
+        # adding background feature (one shared zero plane, broadcast over the batch)
+        zeros = cached_constant('background', spatial_size, heatmap.type(),
+                                lambda size, type: torch.zeros(1, 1, *size).type(type), heatmap.device)
+        zeros = zeros.expand(heatmap.shape[0], 1, *spatial_size)
         heatmap = torch.cat([zeros, heatmap], dim=1)
         heatmap = heatmap.unsqueeze(2)         # (bs, num_kp+1, 1, d, h, w)
         return heatmap
 
-    def forward(self, feature, kp_driving, kp_source):
-        bs, _, d, h, w = feature.shape
-
+    def encode_source(self, feature, kp_source):
+        """
+        Source-only part of forward(): the compressed feature volume and the source keypoint
+        heatmap. Both are constant within a video and can be computed once.
+        """
         feature = self.compress(feature)
         feature = self.norm(feature)
         feature = F.relu(feature)
 
+        gaussian_source = kp2gaussian(kp_source, spatial_size=feature.shape[2:], kp_variance=0.01)
+        return {'feature': feature, 'gaussian_source': gaussian_source}
+
+    def forward(self, feature, kp_driving, kp_source, source=None):
+        if source is None:
+            source = self.encode_source(feature, kp_source)
+        bs = kp_driving['value'].shape[0]
+        feature = expand_batch(source['feature'], bs)
+        _, _, d, h, w = feature.shape
+        gaussian_source = expand_batch(source['gaussian_source'], bs)
+
         out_dict = dict()
         sparse_motion = self.create_sparse_motions(feature, kp_driving, kp_source)
         deformed_feature = self.create_deformed_feature(feature, sparse_motion)
 
-        heatmap = self.create_heatmap_representations(deformed_feature, kp_driving, kp_source)
+        heatmap = self.create_heatmap_representations(deformed_feature, kp_driving, kp_source, gaussian_source)
 
         input_ = torch.cat([heatmap, deformed_feature], dim=2)
         input_ = input_.view(bs, -1, d, h, w)
@@ -106,9 +128,11 @@ class DenseMotionNetwork(nn.Module):
         zeros_mask = torch.zeros_like(mask)   
         mask = torch.where(mask < 1e-3, zeros_mask, mask) 
 
-        sparse_motion = sparse_motion.permute(0, 1, 5, 2, 3, 4)    # (bs, num_kp+1, 3, d, h, w)
-        deformation = (sparse_motion * mask).sum(dim=1)            # (bs, 3, d, h, w)
-        deformation = deformation.permute(0, 2, 3, 4, 1)           # (bs, d, h, w, 3)
+        # mask-weighted sum over the num_kp+1 motions, accumulated in place instead of materializing
+        # the (bs, num_kp+1, 3, d, h, w) product
+        deformation = sparse_motion[:, 0] * mask[:, 0, 0, ..., None]             # (bs, d, h, w, 3)
+        for k in range(1, self.num_kp + 1):
+            deformation.addcmul_(sparse_motion[:, k], mask[:, k, 0, ..., None])
 
         out_dict['deformation'] = deformation
 
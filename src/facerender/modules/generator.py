@@ -1,7 +1,7 @@
 import torch
 from torch import nn
 import torch.nn.functional as F
-from src.facerender.modules.util import ResBlock2d, SameBlock2d, UpBlock2d, DownBlock2d, ResBlock3d, SPADEResnetBlock
+from src.facerender.modules.util import ResBlock2d, SameBlock2d, UpBlock2d, DownBlock2d, ResBlock3d, SPADEResnetBlock, expand_batch, grid_sample
 from src.facerender.modules.dense_motion import DenseMotionNetwork
 
 
@@ -65,7 +65,7 @@ class OcclusionAwareGenerator(nn.Module):
             deformation = deformation.permute(0, 4, 1, 2, 3)
             deformation = F.interpolate(deformation, size=(d, h, w), mode='trilinear')
             deformation = deformation.permute(0, 2, 3, 4, 1)
-        return F.grid_sample(inp, deformation)
+        return grid_sample(inp, deformation)
 
     def forward(self, source_image, kp_driving, kp_source):
         # Encoding (downsampling) part
@@ -205,9 +205,13 @@ class OcclusionAwareSPADEGenerator(nn.Module):
             deformation = deformation.permute(0, 4, 1, 2, 3)
             deformation = F.interpolate(deformation, size=(d, h, w), mode='trilinear')
             deformation = deformation.permute(0, 2, 3, 4, 1)
-        return F.grid_sample(inp, deformation)
+        return grid_sample(inp, deformation)
 
-    def forward(self, source_image, kp_driving, kp_source):
+    def encode_source(self, source_image, kp_source=None):
+        """
+        Source-image half of forward(). The result only depends on the source image (and kp_source),
+        so render_frames computes it once per video and calls decode() for every frame.
+        """
         # Encoding (downsampling) part
         out = self.first(source_image)
         for i in range(len(self.down_blocks)):
@@ -218,11 +222,25 @@ class OcclusionAwareSPADEGenerator(nn.Module):
         feature_3d = out.view(bs, self.reshape_channel, self.reshape_depth, h ,w) 
         feature_3d = self.resblocks_3d(feature_3d)
 
+        source = {'feature_2d': out, 'feature_3d': feature_3d}
+        if self.dense_motion_network is not None and kp_source is not None:
+            source['dense_motion'] = self.dense_motion_network.encode_source(feature_3d, kp_source)
+        return source
+
+    def forward(self, source_image, kp_driving, kp_source):
+        return self.decode(self.encode_source(source_image, kp_source), kp_driving, kp_source)
+
+    def decode(self, source, kp_driving, kp_source):
+        """Per-frame half of forward(); a batch-1 source encoding is broadcast to the driving batch."""
+        bs = kp_driving['value'].shape[0]
+        out = expand_batch(source['feature_2d'], bs)
+        feature_3d = expand_batch(source['feature_3d'], bs)
+
         # Transforming feature representation according to deformation and occlusion
         output_dict = {}
         if self.dense_motion_network is not None:
             dense_motion = self.dense_motion_network(feature=feature_3d, kp_driving=kp_driving,
-                                                     kp_source=kp_source)
+                                                     kp_source=kp_source, source=source.get('dense_motion'))
             output_dict['mask'] = dense_motion['mask']
 
             # import pdb; pdb.set_trace()
@@ -99,44 +99,158 @@ def keypoint_transformation(kp_canonical, he, wo_exp=False):
 
 
 
-def make_animation(source_image, source_semantics, target_semantics,
-                            generator, kp_detector, he_estimator, mapping, 
-                            yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
-                            use_exp=True, use_half=False):
+def prepare_source_keypoints(source_image, source_semantics, kp_detector, mapping, source_cache=None):
+    """
+    Fill source_cache with the batch-1 kp_canonical / kp_source of the source image.
+    Entries already present (e.g. loaded from an avatar bundle) are kept.
+    """
+    if source_cache is None:
+        source_cache = {}
     with torch.no_grad():
-        predictions = []
+        if 'kp_canonical' not in source_cache:
+            source_cache['kp_canonical'] = kp_detector(source_image[:1])
+        if 'kp_source' not in source_cache:
+            he_source = mapping(source_semantics[:1])
+            source_cache['kp_source'] = keypoint_transformation(source_cache['kp_canonical'], he_source)
+    return source_cache
 
-        kp_canonical = kp_detector(source_image)
-        he_source = mapping(source_semantics)
-        kp_source = keypoint_transformation(kp_canonical, he_source)
-    
-        for frame_idx in tqdm(range(target_semantics.shape[1]), 'Face Renderer:'):
-            # still check the dimension
-            # print(target_semantics.shape, source_semantics.shape)
-            target_semantics_frame = target_semantics[:, frame_idx]
-            he_driving = mapping(target_semantics_frame)
+def prepare_source_encoding(generator, source_image, source_cache):
+    """
+    Fill source_cache['source_encoding'] with the generator's source encoding (feature volumes and
+    the source keypoint heatmap). It only depends on the source image and kp_source, so it is
+    computed once per video and every decode() reuses it.
+    """
+    if 'source_encoding' not in source_cache:
+        with torch.no_grad():
+            source_cache['source_encoding'] = generator.encode_source(source_image[:1], kp_source=source_cache['kp_source'])
+    return source_cache['source_encoding']
+
+def expand_kp(kp, bs):
+    return {k: (v.expand(bs, *v.shape[1:]) if v is not None else None) for k, v in kp.items()}
+
+def flatten_frames(x, frame_num=None):
+    """
+    get_facerender_data lays frames out as (batch_size, frames_per_row, ...), row after row.
+    Return them as one time-ordered sequence (frame_num, ...) without the padding frames.
+    """
+    if x is None:
+        return None
+    x = x.reshape((-1,) + x.shape[2:])
+    if frame_num is not None:
+        x = x[:frame_num]
+    return x
+
+def available_memory_bytes(device):
+    """Free memory on device, or None if it cannot be measured."""
+    if device.type == 'cuda':
+        free, _ = torch.cuda.mem_get_info(device)
+        return free
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return None
+
+def measure_frame_nbytes(generator, source_encoding, kp_source, kp_driving):
+    """
+    Memory needed to decode one frame, measured with a probe forward of batch size 1.
+    On CUDA this is the allocator peak; on CPU there are no allocator statistics, so the
+    outputs of every generator submodule are summed instead (an upper bound on live activations).
+    """
+    device = kp_driving['value'].device
+    with torch.no_grad():
+        if device.type == 'cuda':
+            torch.cuda.synchronize(device)
+            base = torch.cuda.memory_allocated(device)
+            torch.cuda.reset_peak_memory_stats(device)
+            generator.decode(source_encoding, kp_driving=kp_driving, kp_source=kp_source)
+            torch.cuda.synchronize(device)
+            return max(torch.cuda.max_memory_allocated(device) - base, 1)
+
+        total = [0]
+        def hook(module, inputs, output):
+            outputs = output.values() if isinstance(output, dict) else [output]
+            for t in outputs:
+                if torch.is_tensor(t):
+                    total[0] += t.numel() * t.element_size()
+        handles = [m.register_forward_hook(hook) for m in generator.modules() if m is not generator]
+        try:
+            generator.decode(source_encoding, kp_driving=kp_driving, kp_source=kp_source)
+        finally:
+            for handle in handles:
+                handle.remove()
+        return max(total[0], 1)
+
+def auto_micro_batch(generator, source_encoding, kp_source, kp_driving, memory_budget_mb=None,
+                     memory_fraction=0.5, max_batch=64):
+    """
+    Number of consecutive frames to decode per generator forward.
+    memory_budget_mb -- explicit budget; by default memory_fraction of the free device memory
+    """
+    frame_nbytes = measure_frame_nbytes(generator, source_encoding, kp_source, kp_driving)
+    if memory_budget_mb is not None:
+        budget = memory_budget_mb * 1024 * 1024
+    else:
+        available = available_memory_bytes(kp_driving['value'].device)
+        if available is None:
+            return 1
+        budget = available * memory_fraction
+    return int(max(1, min(max_batch, budget // frame_nbytes)))
+
+def render_frames(source_image, source_semantics, target_semantics,
+                  generator, kp_detector, mapping,
+                  yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
+                  micro_batch=None, memory_budget_mb=None, source_cache=None):
+    """
+    Render a time-ordered sequence in chunks of consecutive frames.
+
+    target_semantics             -- (frame_num, coeff_nc, semantic_radius*2+1)
+    yaw/pitch/roll_c_seq         -- (frame_num,) or None
+    micro_batch                  -- frames per generator forward; chosen by auto_micro_batch if None
+    Yields (start_frame, prediction) with prediction of shape (n, 3, H, W).
+    """
+    with torch.no_grad():
+        source_cache = prepare_source_keypoints(source_image, source_semantics, kp_detector, mapping, source_cache)
+        # the source encoding (feature volume + source heatmap) is shared by every frame
+        source_encoding = prepare_source_encoding(generator, source_image, source_cache)
+
+        def driving_keypoints(start, end):
+            he_driving = mapping(target_semantics[start:end])
             if yaw_c_seq is not None:
-                he_driving['yaw_in'] = yaw_c_seq[:, frame_idx]
+                he_driving['yaw_in'] = yaw_c_seq[start:end]
             if pitch_c_seq is not None:
-                he_driving['pitch_in'] = pitch_c_seq[:, frame_idx] 
+                he_driving['pitch_in'] = pitch_c_seq[start:end]
             if roll_c_seq is not None:
-                he_driving['roll_in'] = roll_c_seq[:, frame_idx] 
-            
-            kp_driving = keypoint_transformation(kp_canonical, he_driving)
-                
-            kp_norm = kp_driving
-            out = generator(source_image, kp_source=kp_source, kp_driving=kp_norm)
-            '''
-            source_image_new = out['prediction'].squeeze(1)
-            kp_canonical_new =  kp_detector(source_image_new)
-            he_source_new = he_estimator(source_image_new) 
-            kp_source_new = keypoint_transformation(kp_canonical_new, he_source_new, wo_exp=True)
-            kp_driving_new = keypoint_transformation(kp_canonical_new, he_driving, wo_exp=True)
-            out = generator(source_image_new, kp_source=kp_source_new, kp_driving=kp_driving_new)
-            '''
-            predictions.append(out['prediction'])
-        predictions_ts = torch.stack(predictions, dim=1)
-    return predictions_ts
+                he_driving['roll_in'] = roll_c_seq[start:end]
+            return keypoint_transformation(expand_kp(source_cache['kp_canonical'], end - start), he_driving)
+
+        frame_num = target_semantics.shape[0]
+        if micro_batch is None:
+            micro_batch = auto_micro_batch(generator, source_encoding, source_cache['kp_source'],
+                                           driving_keypoints(0, 1), memory_budget_mb)
+            print('Face Renderer: %d frames per batch' % micro_batch)
+
+        for start in tqdm(range(0, frame_num, micro_batch), 'Face Renderer:'):
+            end = min(start + micro_batch, frame_num)
+            kp_driving = driving_keypoints(start, end)
+            kp_source = expand_kp(source_cache['kp_source'], end - start)
+            out = generator.decode(source_encoding, kp_source=kp_source, kp_driving=kp_driving)
+            yield start, out['prediction']
+
+def make_animation(source_image, source_semantics, target_semantics,
+                            generator, kp_detector, he_estimator, mapping, 
+                            yaw_c_seq=None, pitch_c_seq=None, roll_c_seq=None,
+                            use_exp=True, use_half=False, source_cache=None,
+                            micro_batch=None, memory_budget_mb=None):
+    """Render the (batch_size, frames_per_row, ...) layout of get_facerender_data and keep that layout."""
+    bs, frames_per_row = target_semantics.shape[:2]
+    predictions = [prediction for _, prediction in render_frames(
+                        source_image, source_semantics, flatten_frames(target_semantics),
+                        generator, kp_detector, mapping,
+                        flatten_frames(yaw_c_seq), flatten_frames(pitch_c_seq), flatten_frames(roll_c_seq),
+                        micro_batch=micro_batch, memory_budget_mb=memory_budget_mb, source_cache=source_cache)]
+    predictions_ts = torch.cat(predictions, dim=0)
+    return predictions_ts.reshape((bs, frames_per_row) + predictions_ts.shape[1:])
 
 class AnimateModel(torch.nn.Module):
     """
@@ -1,5 +1,8 @@
 from torch import nn
 
+import threading
+from collections import OrderedDict
+
 import torch.nn.functional as F
 import torch
 
@@ -15,12 +18,10 @@ def kp2gaussian(kp, spatial_size, kp_variance):
     """
     mean = kp['value']
 
-    coordinate_grid = make_coordinate_grid(spatial_size, mean.type())
+    coordinate_grid = make_coordinate_grid(spatial_size, mean.type(), mean.device)
     number_of_leading_dimensions = len(mean.shape) - 1
     shape = (1,) * number_of_leading_dimensions + coordinate_grid.shape
-    coordinate_grid = coordinate_grid.view(*shape)
-    repeats = mean.shape[:number_of_leading_dimensions] + (1, 1, 1, 1)
-    coordinate_grid = coordinate_grid.repeat(*repeats)
+    coordinate_grid = coordinate_grid.view(*shape)      # broadcast against the keypoints, not repeated
 
     # Preprocess kp shape
     shape = mean.shape[:number_of_leading_dimensions] + (1, 1, 1, 3)
@@ -32,10 +33,98 @@ def kp2gaussian(kp, spatial_size, kp_variance):
 
     return out
 
-def make_coordinate_grid_2d(spatial_size, type):
+def grid_sample(input, grid):
+    """
+    F.grid_sample with its defaults (bilinear, zero padding, align_corners=False). The ONNX exporter
+    has no volumetric GridSample below opset 20, so 5-D inputs are sampled with gathers while exporting.
+    """
+    if input.dim() == 5 and torch.onnx.is_in_onnx_export():
+        return grid_sample_3d(input, grid)
+    return F.grid_sample(input, grid)
+
+
+def grid_sample_3d(input, grid):
+    """
+    Trilinear grid_sample of (n, c, d, h, w) at grid (n, do, ho, wo, 3) built from gathers only;
+    matches F.grid_sample(input, grid, align_corners=False) with zero padding.
+    """
+    n, c, d, h, w = input.shape
+    out_shape = grid.shape[1:4]
+    grid = grid.reshape(n, -1, 3)
+    # unnormalize (align_corners=False): -1 / 1 are the outer edges of the border voxels
+    ix = ((grid[..., 0] + 1) * w - 1) / 2
+    iy = ((grid[..., 1] + 1) * h - 1) / 2
+    iz = ((grid[..., 2] + 1) * d - 1) / 2
+    x0, y0, z0 = torch.floor(ix), torch.floor(iy), torch.floor(iz)
+    fx, fy, fz = ix - x0, iy - y0, iz - z0
+
+    flat = input.reshape(n, c, d * h * w)
+    out = 0
+    for dz, wz in ((0, 1 - fz), (1, fz)):
+        for dy, wy in ((0, 1 - fy), (1, fy)):
+            for dx, wx in ((0, 1 - fx), (1, fx)):
+                x, y, z = x0 + dx, y0 + dy, z0 + dz
+                inside = (x >= 0) & (x <= w - 1) & (y >= 0) & (y <= h - 1) & (z >= 0) & (z <= d - 1)
+                index = (z.clamp(0, d - 1) * (h * w) + y.clamp(0, h - 1) * w + x.clamp(0, w - 1)).long()
+                values = torch.gather(flat, 2, index.unsqueeze(1).expand(n, c, index.shape[1]))
+                out = out + values * (wx * wy * wz * inside.to(input.dtype)).unsqueeze(1)
+    return out.reshape(n, c, *out_shape)
+
+
+def expand_batch(x, bs):
+    """
+    Broadcast a batch-1 tensor (e.g. a per-video source encoding) to batch size bs without copying.
+    """
+    if x.shape[0] == bs:
+        return x
+    return x.expand(bs, *x.shape[1:])
+
+_constant_cache = OrderedDict()
+_constant_cache_lock = threading.Lock()
+CONSTANT_CACHE_SIZE = 32
+
+
+def cached_constant(name, spatial_size, type, build, device=None):
+    """
+    Shape-only constant tensors (coordinate grids, background planes) are built once per
+    (name, spatial size, dtype, device) and shared by every frame instead of being re-allocated
+    on each forward. The returned tensor is shared: callers must not modify it in place.
+    device is the caller's tensor device: render threads do not set the current CUDA device,
+    so a CUDA `type` alone would allocate on cuda:0.
     """
-    Create a meshgrid [-1,1] x [-1,1] of given spatial_size.
+    if not type.startswith('torch.cuda'):
+        device = None
+    elif device is None or device.index is None:
+        device = torch.device('cuda', torch.cuda.current_device())
+    key = (name, tuple(int(s) for s in spatial_size), type, device)
+    with _constant_cache_lock:
+        tensor = _constant_cache.get(key)
+        if tensor is not None:
+            _constant_cache.move_to_end(key)
+            return tensor
+    with torch.no_grad(), torch.cuda.device(device):
+        tensor = build(spatial_size, type)
+    with _constant_cache_lock:
+        tensor = _constant_cache.setdefault(key, tensor)
+        _constant_cache.move_to_end(key)
+        while len(_constant_cache) > CONSTANT_CACHE_SIZE:
+            _constant_cache.popitem(last=False)
+    return tensor
+
+
+def clear_constant_cache():
+    with _constant_cache_lock:
+        _constant_cache.clear()
+
+
+def make_coordinate_grid_2d(spatial_size, type, device=None):
     """
+    Create a meshgrid [-1,1] x [-1,1] of given spatial_size (cached, read-only).
+    """
+    return cached_constant('grid_2d', spatial_size, type, _build_coordinate_grid_2d, device)
+
+
+def _build_coordinate_grid_2d(spatial_size, type):
     h, w = spatial_size
     x = torch.arange(w).type(type)
     y = torch.arange(h).type(type)
@@ -51,7 +140,14 @@ def make_coordinate_grid_2d(spatial_size, type):
     return meshed
 
 
-def make_coordinate_grid(spatial_size, type):
+def make_coordinate_grid(spatial_size, type, device=None):
+    """
+    Create a meshgrid [-1,1]^3 of given (d, h, w) spatial_size (cached, read-only).
+    """
+    return cached_constant('grid_3d', spatial_size, type, _build_coordinate_grid, device)
+
+
+def _build_coordinate_grid(spatial_size, type):
     d, h, w = spatial_size
     x = torch.arange(w).type(type)
     y = torch.arange(h).type(type)
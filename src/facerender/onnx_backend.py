@@ -0,0 +1,282 @@
+"""
+ONNX export of the face renderer and an onnxruntime CPU backend for render_frames.
+
+Three graphs are exported per checkpoint (the generator ones per image size):
+    mapping.onnx                 MappingNet, semantics -> yaw / pitch / roll / t / exp
+    source_encoder_<size>.onnx   generator.encode_source: once per video
+    frame_decoder_<size>.onnx    generator.decode: once per micro-batch of frames
+The kp detector (once per video) and keypoint_transformation (a few small matmuls) stay in PyTorch.
+
+    python -m src.facerender.onnx_backend --checkpoint_dir ./checkpoints --size 256
+
+AnimateFromCoeff(..., backend='onnx') (or FACERENDER_BACKEND=onnx) renders through OnnxFaceRenderer;
+missing graphs are exported from the loaded PyTorch models on first use.
+"""
+import os
+import copy
+import tempfile
+import threading
+import contextlib
+from argparse import ArgumentParser
+
+import torch
+from torch import nn
+
+from src.facerender.modules.util import expand_batch
+
+
+ONNX_OPSET = 16
+MAPPING_OUTPUTS = ['yaw', 'pitch', 'roll', 't', 'exp']
+SOURCE_OUTPUTS = ['feature_2d', 'feature_3d', 'dense_feature', 'gaussian_source']
+
+
+class _MappingGraph(nn.Module):
+    def __init__(self, mapping):
+        super(_MappingGraph, self).__init__()
+        self.mapping = mapping
+
+    def forward(self, semantics):
+        out = self.mapping(semantics)
+        return tuple(out[k] for k in MAPPING_OUTPUTS)
+
+
+class _SourceEncoderGraph(nn.Module):
+    def __init__(self, generator):
+        super(_SourceEncoderGraph, self).__init__()
+        self.generator = generator
+
+    def forward(self, source_image, kp_source):
+        source = self.generator.encode_source(source_image, kp_source={'value': kp_source})
+        dense = source['dense_motion']
+        return source['feature_2d'], source['feature_3d'], dense['feature'], dense['gaussian_source']
+
+
+class _FrameDecoderGraph(nn.Module):
+    """decode() of a batch of frames against the batch-1 source encoding."""
+
+    def __init__(self, generator):
+        super(_FrameDecoderGraph, self).__init__()
+        self.generator = generator
+
+    def forward(self, feature_2d, feature_3d, dense_feature, gaussian_source, kp_source, kp_driving):
+        source = {'feature_2d': feature_2d, 'feature_3d': feature_3d,
+                  'dense_motion': {'feature': dense_feature, 'gaussian_source': gaussian_source}}
+        bs = kp_driving.shape[0]
+        out = self.generator.decode(source, kp_driving={'value': kp_driving},
+                                    kp_source={'value': expand_batch(kp_source, bs)})
+        return out['prediction']
+
+
+@contextlib.contextmanager
+def export_lock(onnx_dir):
+    """
+    Exclusive lock on onnx_dir across threads and processes (every render worker builds its own
+    renderer on the same directory), so a graph is exported once. Callers re-check the file inside.
+    """
+    os.makedirs(onnx_dir, exist_ok=True)
+    with open(os.path.join(onnx_dir, '.export.lock'), 'a+') as f:
+        try:
+            import fcntl
+        except ImportError:     # Windows
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _export(module, args, path, input_names, output_names, dynamic_axes, opset):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.onnx')
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(module, args, tmp, input_names=input_names, output_names=output_names,
+                              dynamic_axes=dynamic_axes, opset_version=opset, do_constant_folding=True)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def _inference_copy(module):
+    """CPU copy with BatchNorm folded and spectral norm baked, so the graphs carry plain convolutions."""
+    from src.utils.inference_build import bake_for_inference
+    module = copy.deepcopy(module).cpu().float().eval()
+    bake_for_inference(module)
+    return module
+
+
+def export_mapping(mapping, onnx_dir, opset=ONNX_OPSET):
+    os.makedirs(onnx_dir, exist_ok=True)
+    coeff_nc = mapping.first[0].in_channels
+    semantics = torch.randn(2, coeff_nc, 27)
+    batch = {0: 'frames'}
+    return _export(_MappingGraph(_inference_copy(mapping)), (semantics,), os.path.join(onnx_dir, 'mapping.onnx'),
+                   ['semantics'], MAPPING_OUTPUTS, {name: batch for name in ['semantics'] + MAPPING_OUTPUTS}, opset)
+
+
+def export_generator(generator, onnx_dir, img_size=256, opset=ONNX_OPSET):
+    """Export source_encoder_<img_size>.onnx and frame_decoder_<img_size>.onnx; the spatial size is fixed."""
+    os.makedirs(onnx_dir, exist_ok=True)
+    generator = _inference_copy(generator)
+    num_kp = generator.dense_motion_network.num_kp
+    source_image = torch.rand(1, generator.image_channel, img_size, img_size)
+    kp_source = torch.rand(1, num_kp, 3) * 1.6 - 0.8
+    encoder_path = _export(_SourceEncoderGraph(generator), (source_image, kp_source),
+                           os.path.join(onnx_dir, 'source_encoder_%d.onnx' % img_size),
+                           ['source_image', 'kp_source'], SOURCE_OUTPUTS, None, opset)
+
+    with torch.no_grad():
+        source = _SourceEncoderGraph(generator)(source_image, kp_source)
+    # traced with 2 frames: the broadcast-source branches of decode() are the ones recorded
+    kp_driving = torch.rand(2, num_kp, 3) * 1.6 - 0.8
+    decoder_path = _export(_FrameDecoderGraph(generator), tuple(source) + (kp_source, kp_driving),
+                           os.path.join(onnx_dir, 'frame_decoder_%d.onnx' % img_size),
+                           SOURCE_OUTPUTS + ['kp_source', 'kp_driving'], ['prediction'],
+                           {'kp_driving': {0: 'frames'}, 'prediction': {0: 'frames'}}, opset)
+    return encoder_path, decoder_path
+
+
+def default_onnx_dir(sadtalker_path):
+    """checkpoints/onnx/<renderer checkpoint>__<mapping checkpoint>: the graphs depend on both."""
+    checkpoint = sadtalker_path.get('checkpoint') or sadtalker_path['free_view_checkpoint']
+    mapping = sadtalker_path['mappingnet_checkpoint']
+    names = [os.path.splitext(os.path.basename(path))[0] for path in (checkpoint, mapping)]
+    return os.path.join(os.path.dirname(checkpoint), 'onnx', '__'.join(names))
+
+
+def _numpy(t):
+    return t.detach().to('cpu', torch.float32).contiguous().numpy()
+
+
+class _Session():
+    """One onnxruntime session; inputs are fed by name, only those the graph kept."""
+
+    def __init__(self, path, options):
+        import onnxruntime
+        self.session = onnxruntime.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.inputs = set(i.name for i in self.session.get_inputs())
+        self.outputs = [o.name for o in self.session.get_outputs()]
+
+    def run(self, **feeds):
+        results = self.session.run(None, {k: _numpy(v) for k, v in feeds.items() if k in self.inputs})
+        return {name: torch.from_numpy(value) for name, value in zip(self.outputs, results)}
+
+
+class OnnxFaceRenderer():
+    """
+    onnxruntime replacement of the mapping net and generator for render_frames: `.mapping` is
+    called like MappingNet, `.generator` has encode_source() / decode() like the generator.
+
+    intra_op_threads -- threads of one graph run (default: onnxruntime's choice, all cores)
+    optimization     -- 'all' | 'extended' | 'basic' | 'disable' graph optimization level
+    micro_batch      -- frames per decoder run when the caller does not choose
+    """
+
+    def __init__(self, generator, mapping, onnx_dir, intra_op_threads=None, optimization='all', micro_batch=4):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError('backend="onnx" needs onnxruntime: pip install onnxruntime')
+        levels = {'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+                  'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+                  'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+                  'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL}
+        self.options = onnxruntime.SessionOptions()
+        self.options.graph_optimization_level = levels[optimization]
+        self.options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        self.options.inter_op_num_threads = 1
+        if intra_op_threads:
+            self.options.intra_op_num_threads = int(intra_op_threads)
+
+        self.torch_generator = generator
+        self.torch_mapping = mapping
+        self.onnx_dir = onnx_dir
+        self.micro_batch = micro_batch
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.mapping = _OnnxMapping(self)
+        self.generator = _OnnxGenerator(self)
+
+    def session(self, name, export):
+        """Session of onnx_dir/<name>.onnx, exporting the graphs first if the file is missing."""
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                path = os.path.join(self.onnx_dir, name + '.onnx')
+                if not os.path.isfile(path):
+                    with export_lock(self.onnx_dir):
+                        # another worker may have exported it while this one waited for the lock
+                        if not os.path.isfile(path):
+                            print('exporting face renderer graphs to', self.onnx_dir)
+                            export()
+                session = _Session(path, self.options)
+                self._sessions[name] = session
+            return session
+
+
+class _OnnxMapping():
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    def __call__(self, semantics):
+        r = self.renderer
+        out = r.session('mapping', lambda: export_mapping(r.torch_mapping, r.onnx_dir)).run(semantics=semantics)
+        return {k: v.to(semantics.device) for k, v in out.items()}
+
+
+class _OnnxGenerator():
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    @property
+    def micro_batch(self):
+        return self.renderer.micro_batch
+
+    def _session(self, kind, size):
+        r = self.renderer
+        return r.session('%s_%d' % (kind, size), lambda: export_generator(r.torch_generator, r.onnx_dir, size))
+
+    def encode_source(self, source_image, kp_source=None):
+        size = source_image.shape[-1]
+        out = self._session('source_encoder', size).run(source_image=source_image[:1], kp_source=kp_source['value'][:1])
+        source = {k: v.to(source_image.device) for k, v in out.items()}
+        source['size'] = size
+        return source
+
+    def decode(self, source, kp_driving, kp_source):
+        feeds = {name: source[name] for name in SOURCE_OUTPUTS}
+        out = self._session('frame_decoder', source['size']).run(kp_source=kp_source['value'][:1],
+                                                                 kp_driving=kp_driving['value'], **feeds)
+        return {'prediction': out['prediction'].to(kp_driving['value'].device)}
+
+
+if __name__ == '__main__':
+    from src.utils.init_path import init_path
+    from src.facerender.animate import AnimateFromCoeff
+
+    parser = ArgumentParser()
+    parser.add_argument('--checkpoint_dir', default='./checkpoints')
+    parser.add_argument('--config_dir', default='./src/config')
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--preprocess', default='crop')
+    parser.add_argument('--onnx_dir', default=None)
+    parser.add_argument('--opset', type=int, default=ONNX_OPSET)
+    args = parser.parse_args()
+
+    sadtalker_path = init_path(args.checkpoint_dir, args.config_dir, args.size, False, args.preprocess)
+    animate = AnimateFromCoeff(sadtalker_path, 'cpu')
+    onnx_dir = args.onnx_dir or default_onnx_dir(sadtalker_path)
+    with export_lock(onnx_dir):
+        print(export_mapping(animate.mapping, onnx_dir, args.opset))
+        print(*export_generator(animate.generator, onnx_dir, args.size, args.opset), sep='\n')
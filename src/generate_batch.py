@@ -22,6 +22,18 @@ def parse_audio_length(audio_length, sr, fps):
 
     return audio_length, num_frames
 
+def mel_windows(spec, frame_index, fps=25, mel_step_size=16):
+    """
+    Mel window of every video frame in frame_index, gathered in one go: (len(frame_index), 80, mel_step_size).
+    Frame i starts 2 frames early at int(80 * (i-2) / fps) and is clamped to the spectrogram, like the
+    original per-frame loop. Pass a slice of frame indices to build the windows one chunk at a time.
+    """
+    start_frame_num = np.asarray(frame_index) - 2
+    start_idx = np.trunc(80. * (start_frame_num / float(fps))).astype(np.int64)
+    index = start_idx[:, None] + np.arange(mel_step_size)[None, :]
+    index = np.clip(index, 0, spec.shape[0]-1)
+    return spec[index].transpose(0, 2, 1)
+
 def generate_blink_seq(num_frames):
     ratio = np.zeros((num_frames,1))
     frame_id = 0
@@ -66,17 +78,7 @@ def get_data(first_coeff_path, audio_path, device, ref_eyeblink_coeff_path, stil
         wav = crop_pad_audio(wav, wav_length)
         orig_mel = audio.melspectrogram(wav).T
         spec = orig_mel.copy()         # nframes 80
-        indiv_mels = []
-
-        for i in tqdm(range(num_frames), 'mel:'):
-            start_frame_num = i-2
-            start_idx = int(80. * (start_frame_num / float(fps)))
-            end_idx = start_idx + syncnet_mel_step_size
-            seq = list(range(start_idx, end_idx))
-            seq = [ min(max(item, 0), orig_mel.shape[0]-1) for item in seq ]
-            m = spec[seq, :]
-            indiv_mels.append(m.T)
-        indiv_mels = np.asarray(indiv_mels)         # T 80 16
+        indiv_mels = mel_windows(spec, np.arange(num_frames), fps, syncnet_mel_step_size)         # T 80 16
 
     ratio = generate_blink_seq_randomly(num_frames)      # T
     source_semantics_path = first_coeff_path
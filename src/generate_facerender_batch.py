@@ -7,7 +7,7 @@ import scipy.io as scio
 
 def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path, 
                         batch_size, input_yaw_list=None, input_pitch_list=None, input_roll_list=None, 
-                        expression_scale=1.0, still_mode = False, preprocess='crop', size = 256):
+                        expression_scale=1.0, still_mode = False, preprocess='crop', size = 256, dump_coeff_txt=False):
 
     semantic_radius = 13
     video_name = os.path.splitext(os.path.split(coeff_path)[-1])[0]
@@ -15,30 +15,12 @@ def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path,
 
     data={}
 
-    img1 = Image.open(pic_path)
-    source_image = np.array(img1)
-    source_image = img_as_float32(source_image)
-    source_image = transform.resize(source_image, (size, size, 3))
-    source_image = source_image.transpose((2, 0, 1))
-    source_image_ts = torch.FloatTensor(source_image).unsqueeze(0)
-    source_image_ts = source_image_ts.repeat(batch_size, 1, 1, 1)
-    data['source_image'] = source_image_ts
- 
-    source_semantics_dict = scio.loadmat(first_coeff_path)
-    generated_dict = scio.loadmat(coeff_path)
-
-    if 'full' not in preprocess.lower():
-        source_semantics = source_semantics_dict['coeff_3dmm'][:1,:70]         #1 70
-        generated_3dmm = generated_dict['coeff_3dmm'][:,:70]
-
-    else:
-        source_semantics = source_semantics_dict['coeff_3dmm'][:1,:73]         #1 70
-        generated_3dmm = generated_dict['coeff_3dmm'][:,:70]
+    source_image_ts, source_semantics_ts, source_semantics = get_source_data(pic_path, first_coeff_path, preprocess, size)
+    data['source_image'] = source_image_ts.repeat(batch_size, 1, 1, 1)
+    data['source_semantics'] = source_semantics_ts.repeat(batch_size, 1, 1)
 
-    source_semantics_new = transform_semantic_1(source_semantics, semantic_radius)
-    source_semantics_ts = torch.FloatTensor(source_semantics_new).unsqueeze(0)
-    source_semantics_ts = source_semantics_ts.repeat(batch_size, 1, 1)
-    data['source_semantics'] = source_semantics_ts
+    generated_dict = scio.loadmat(coeff_path)
+    generated_3dmm = generated_dict['coeff_3dmm'][:,:70]
 
     # target 
     generated_3dmm[:, :64] = generated_3dmm[:, :64] * expression_scale
@@ -49,25 +31,20 @@ def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path,
     if still_mode:
         generated_3dmm[:, 64:] = np.repeat(source_semantics[:, 64:], generated_3dmm.shape[0], axis=0)
 
-    with open(txt_path+'.txt', 'w') as f:
-        for coeff in generated_3dmm:
-            for i in coeff:
-                f.write(str(i)[:7]   + '  '+'\t')
-            f.write('\n')
+    if dump_coeff_txt:
+        with open(txt_path+'.txt', 'w') as f:
+            for coeff in generated_3dmm:
+                f.write(''.join(str(i)[:7] + '  '+'\t' for i in coeff))
+                f.write('\n')
 
-    target_semantics_list = [] 
     frame_num = generated_3dmm.shape[0]
     data['frame_num'] = frame_num
-    for frame_idx in range(frame_num):
-        target_semantics = transform_semantic_target(generated_3dmm, frame_idx, semantic_radius)
-        target_semantics_list.append(target_semantics)
 
+    # the padding frames up to a multiple of batch_size repeat the window of the last frame
     remainder = frame_num%batch_size
-    if remainder!=0:
-        for _ in range(batch_size-remainder):
-            target_semantics_list.append(target_semantics)
-
-    target_semantics_np = np.array(target_semantics_list)             #frame_num 70 semantic_radius*2+1
+    padding = batch_size-remainder if remainder!=0 else 0
+    frame_index = np.concatenate([np.arange(frame_num), np.full(padding, frame_num-1)])
+    target_semantics_np = transform_semantic_windows(generated_3dmm, frame_index, semantic_radius)   #frame_num 70 semantic_radius*2+1
     target_semantics_np = target_semantics_np.reshape(batch_size, -1, target_semantics_np.shape[-2], target_semantics_np.shape[-1])
     data['target_semantics_list'] = torch.FloatTensor(target_semantics_np)
     data['video_name'] = video_name
@@ -85,6 +62,30 @@ def get_facerender_data(coeff_path, pic_path, first_coeff_path, audio_path,
  
     return data
 
+def get_source_data(pic_path, first_coeff_path, preprocess='crop', size=256, semantic_radius=13):
+    """
+    Source-side renderer inputs with batch size 1:
+        source_image_ts      -- (1, 3, size, size)
+        source_semantics_ts  -- (1, 70 or 73, semantic_radius*2+1)
+        source_semantics     -- raw first-frame coefficients, (1, 70 or 73)
+    """
+    img1 = Image.open(pic_path)
+    source_image = np.array(img1)
+    source_image = img_as_float32(source_image)
+    source_image = transform.resize(source_image, (size, size, 3))
+    source_image = source_image.transpose((2, 0, 1))
+    source_image_ts = torch.FloatTensor(source_image).unsqueeze(0)
+
+    source_semantics_dict = scio.loadmat(first_coeff_path)
+    if 'full' not in preprocess.lower():
+        source_semantics = source_semantics_dict['coeff_3dmm'][:1,:70]         #1 70
+    else:
+        source_semantics = source_semantics_dict['coeff_3dmm'][:1,:73]         #1 70
+
+    source_semantics_new = transform_semantic_1(source_semantics, semantic_radius)
+    source_semantics_ts = torch.FloatTensor(source_semantics_new).unsqueeze(0)
+    return source_image_ts, source_semantics_ts, source_semantics
+
 def transform_semantic_1(semantic, semantic_radius):
     semantic_list =  [semantic for i in range(0, semantic_radius*2+1)]
     coeff_3dmm = np.concatenate(semantic_list, 0)
@@ -97,6 +98,15 @@ def transform_semantic_target(coeff_3dmm, frame_index, semantic_radius):
     coeff_3dmm_g = coeff_3dmm[index, :]
     return coeff_3dmm_g.transpose(1,0)
 
+def transform_semantic_windows(coeff_3dmm, frame_index, semantic_radius):
+    """
+    transform_semantic_target for many frames in one gather: (len(frame_index), coeff_nc, semantic_radius*2+1).
+    """
+    num_frames = coeff_3dmm.shape[0]
+    offsets = np.arange(-semantic_radius, semantic_radius+1)
+    index = np.clip(np.asarray(frame_index)[:, None] + offsets[None, :], 0, num_frames-1)
+    return coeff_3dmm[index].transpose(0, 2, 1)
+
 def gen_camera_pose(camera_degree_list, frame_num, batch_size):
 
     new_degree_list = [] 
@@ -1,12 +1,10 @@
 import torch, uuid
-import os, sys, shutil
-from src.utils.preprocess import CropAndExtract
-from src.test_audio2coeff import Audio2Coeff  
-from src.facerender.animate import AnimateFromCoeff
+import os, sys, shutil, tempfile
 from src.generate_batch import get_data
 from src.generate_facerender_batch import get_facerender_data
 
-from src.utils.init_path import init_path
+from src.utils.model_registry import get_model_registry
+from src.utils.avatar_store import AvatarStore
 
 from pydub import AudioSegment
 
@@ -18,12 +16,12 @@ def mp3_to_wav(mp3_filename,wav_filename,frame_rate):
 
 class SadTalker():
 
-    def __init__(self, checkpoint_path='checkpoints', config_path='src/config', lazy_load=False):
+    def __init__(self, checkpoint_path='checkpoints', config_path='src/config', lazy_load=False,
+                 max_cached_models=None, memory_budget_mb=None, avatar_root='./avatars',
+                 device=None, model_registry=None):
 
-        if torch.cuda.is_available() :
-            device = "cuda"
-        else:
-            device = "cpu"
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
         
         self.device = device
 
@@ -31,6 +29,11 @@ class SadTalker():
 
         self.checkpoint_path = checkpoint_path
         self.config_path = config_path
+
+        # a render worker passes its own registry so that it owns its models
+        self.model_registry = model_registry or get_model_registry()
+        self.model_registry.configure(max_entries=max_cached_models, memory_budget_mb=memory_budget_mb)
+        self.avatar_store = AvatarStore(avatar_root) if avatar_root else None
       
 
     def test(self, source_image, driven_audio, preprocess='crop', 
@@ -41,115 +44,128 @@ class SadTalker():
         ref_info = None,
         use_idle_mode = False,
         length_of_audio = 0, use_blink=True,
-        result_dir='./results/'):
-
-        self.sadtalker_paths = init_path(self.checkpoint_path, self.config_path, size, False, preprocess)
-        print(self.sadtalker_paths)
-            
-        self.audio_to_coeff = Audio2Coeff(self.sadtalker_paths, self.device)
-        self.preprocess_model = CropAndExtract(self.sadtalker_paths, self.device)
-        self.animate_from_coeff = AnimateFromCoeff(self.sadtalker_paths, self.device)
-
-        time_tag = str(uuid.uuid4())
-        save_dir = os.path.join(result_dir, time_tag)
-        os.makedirs(save_dir, exist_ok=True)
-
-        input_dir = os.path.join(save_dir, 'input')
-        os.makedirs(input_dir, exist_ok=True)
-
-        print(source_image)
-        pic_path = os.path.join(input_dir, os.path.basename(source_image)) 
-        shutil.move(source_image, input_dir)
-
-        if driven_audio is not None and os.path.isfile(driven_audio):
-            audio_path = os.path.join(input_dir, os.path.basename(driven_audio))  
-
-            #### mp3 to wav
-            if '.mp3' in audio_path:
-                mp3_to_wav(driven_audio, audio_path.replace('.mp3', '.wav'), 16000)
-                audio_path = audio_path.replace('.mp3', '.wav')
+        result_dir='./results/', output_width=None):
+
+        # models stay warm in the process-wide registry, so only the first slide pays the loading cost
+        with self.model_registry.borrow(self.checkpoint_path, self.config_path, size, preprocess, False, self.device) as models:
+            self.sadtalker_paths = models.sadtalker_paths
+
+            time_tag = str(uuid.uuid4())
+            save_dir = os.path.join(result_dir, time_tag)
+            os.makedirs(save_dir, exist_ok=True)
+
+            input_dir = os.path.join(save_dir, 'input')
+            os.makedirs(input_dir, exist_ok=True)
+
+            print(source_image)
+            pic_path = os.path.join(input_dir, os.path.basename(source_image)) 
+            shutil.move(source_image, input_dir)
+
+            if driven_audio is not None and os.path.isfile(driven_audio):
+                audio_path = os.path.join(input_dir, os.path.basename(driven_audio))  
+
+                #### mp3 to wav
+                if '.mp3' in audio_path:
+                    mp3_to_wav(driven_audio, audio_path.replace('.mp3', '.wav'), 16000)
+                    audio_path = audio_path.replace('.mp3', '.wav')
+                else:
+                    shutil.move(driven_audio, input_dir)
+
+            elif use_idle_mode:
+                audio_path = os.path.join(input_dir, 'idlemode_'+str(length_of_audio)+'.wav') ## generate audio from this new audio_path
+                from pydub import AudioSegment
+                one_sec_segment = AudioSegment.silent(duration=1000*length_of_audio)  #duration in milliseconds
+                one_sec_segment.export(audio_path, format="wav")
             else:
-                shutil.move(driven_audio, input_dir)
-
-        elif use_idle_mode:
-            audio_path = os.path.join(input_dir, 'idlemode_'+str(length_of_audio)+'.wav') ## generate audio from this new audio_path
-            from pydub import AudioSegment
-            one_sec_segment = AudioSegment.silent(duration=1000*length_of_audio)  #duration in milliseconds
-            one_sec_segment.export(audio_path, format="wav")
-        else:
-            print(use_ref_video, ref_info)
-            assert use_ref_video == True and ref_info == 'all'
-
-        if use_ref_video and ref_info == 'all': # full ref mode
-            ref_video_videoname = os.path.basename(ref_video)
-            audio_path = os.path.join(save_dir, ref_video_videoname+'.wav')
-            print('new audiopath:',audio_path)
-            # if ref_video contains audio, set the audio from ref_video.
-            cmd = r"ffmpeg -y -hide_banner -loglevel error -i %s %s"%(ref_video, audio_path)
-            os.system(cmd)        
-
-        os.makedirs(save_dir, exist_ok=True)
+                print(use_ref_video, ref_info)
+                assert use_ref_video == True and ref_info == 'all'
+
+            if use_ref_video and ref_info == 'all': # full ref mode
+                ref_video_videoname = os.path.basename(ref_video)
+                audio_path = os.path.join(save_dir, ref_video_videoname+'.wav')
+                print('new audiopath:',audio_path)
+                # if ref_video contains audio, set the audio from ref_video.
+                cmd = r"ffmpeg -y -hide_banner -loglevel error -i %s %s"%(ref_video, audio_path)
+                os.system(cmd)        
+
+            os.makedirs(save_dir, exist_ok=True)
         
-        #crop image and extract 3dmm from image
-        first_frame_dir = os.path.join(save_dir, 'first_frame_dir')
-        os.makedirs(first_frame_dir, exist_ok=True)
-        first_coeff_path, crop_pic_path, crop_info = self.preprocess_model.generate(pic_path, first_frame_dir, preprocess, True, size)
+            #crop image and extract 3dmm from image
+            first_frame_dir = os.path.join(save_dir, 'first_frame_dir')
+            os.makedirs(first_frame_dir, exist_ok=True)
+            avatar = self.avatar_store.bundle(pic_path, preprocess, size) if self.avatar_store is not None else None
+            first_coeff_path, crop_pic_path, crop_info = models.preprocess_model.generate(pic_path, first_frame_dir, preprocess, True, size, avatar=avatar)
         
-        if first_coeff_path is None:
-            raise AttributeError("No face is detected")
-
-        if use_ref_video:
-            print('using ref video for genreation')
-            ref_video_videoname = os.path.splitext(os.path.split(ref_video)[-1])[0]
-            ref_video_frame_dir = os.path.join(save_dir, ref_video_videoname)
-            os.makedirs(ref_video_frame_dir, exist_ok=True)
-            print('3DMM Extraction for the reference video providing pose')
-            ref_video_coeff_path, _, _ =  self.preprocess_model.generate(ref_video, ref_video_frame_dir, preprocess, source_image_flag=False)
-        else:
-            ref_video_coeff_path = None
-
-        if use_ref_video:
-            if ref_info == 'pose':
-                ref_pose_coeff_path = ref_video_coeff_path
-                ref_eyeblink_coeff_path = None
-            elif ref_info == 'blink':
-                ref_pose_coeff_path = None
-                ref_eyeblink_coeff_path = ref_video_coeff_path
-            elif ref_info == 'pose+blink':
-                ref_pose_coeff_path = ref_video_coeff_path
-                ref_eyeblink_coeff_path = ref_video_coeff_path
-            elif ref_info == 'all':            
+            if first_coeff_path is None:
+                raise AttributeError("No face is detected")
+
+            if use_ref_video:
+                print('using ref video for genreation')
+                ref_video_videoname = os.path.splitext(os.path.split(ref_video)[-1])[0]
+                ref_video_frame_dir = os.path.join(save_dir, ref_video_videoname)
+                os.makedirs(ref_video_frame_dir, exist_ok=True)
+                print('3DMM Extraction for the reference video providing pose')
+                ref_video_coeff_path, _, _ =  models.preprocess_model.generate(ref_video, ref_video_frame_dir, preprocess, source_image_flag=False)
+            else:
+                ref_video_coeff_path = None
+
+            if use_ref_video:
+                if ref_info == 'pose':
+                    ref_pose_coeff_path = ref_video_coeff_path
+                    ref_eyeblink_coeff_path = None
+                elif ref_info == 'blink':
+                    ref_pose_coeff_path = None
+                    ref_eyeblink_coeff_path = ref_video_coeff_path
+                elif ref_info == 'pose+blink':
+                    ref_pose_coeff_path = ref_video_coeff_path
+                    ref_eyeblink_coeff_path = ref_video_coeff_path
+                elif ref_info == 'all':            
+                    ref_pose_coeff_path = None
+                    ref_eyeblink_coeff_path = None
+                else:
+                    raise('error in refinfo')
+            else:
                 ref_pose_coeff_path = None
                 ref_eyeblink_coeff_path = None
+
+            #audio2ceoff
+            if use_ref_video and ref_info == 'all':
+                coeff_path = ref_video_coeff_path # models.audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
             else:
-                raise('error in refinfo')
-        else:
-            ref_pose_coeff_path = None
-            ref_eyeblink_coeff_path = None
-
-        #audio2ceoff
-        if use_ref_video and ref_info == 'all':
-            coeff_path = ref_video_coeff_path # self.audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
-        else:
-            batch = get_data(first_coeff_path, audio_path, self.device, ref_eyeblink_coeff_path=ref_eyeblink_coeff_path, still=still_mode, idlemode=use_idle_mode, length_of_audio=length_of_audio, use_blink=use_blink) # longer audio?
-            coeff_path = self.audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
-
-        #coeff2video
-        data = get_facerender_data(coeff_path, crop_pic_path, first_coeff_path, audio_path, batch_size, still_mode=still_mode, preprocess=preprocess, size=size, expression_scale = exp_scale)
-        return_path = self.animate_from_coeff.generate(data, save_dir,  pic_path, crop_info, enhancer='gfpgan' if use_enhancer else None, preprocess=preprocess, img_size=size)
-        video_name = data['video_name']
-        print(f'The generated video is named {video_name} in {save_dir}')
-
-        del self.preprocess_model
-        del self.audio_to_coeff
-        del self.animate_from_coeff
+                batch = get_data(first_coeff_path, audio_path, self.device, ref_eyeblink_coeff_path=ref_eyeblink_coeff_path, still=still_mode, idlemode=use_idle_mode, length_of_audio=length_of_audio, use_blink=use_blink) # longer audio?
+                coeff_path = models.audio_to_coeff.generate(batch, save_dir, pose_style, ref_pose_coeff_path)
+
+            #coeff2video
+            data = get_facerender_data(coeff_path, crop_pic_path, first_coeff_path, audio_path, batch_size, still_mode=still_mode, preprocess=preprocess, size=size, expression_scale = exp_scale)
+            return_path = models.animate_from_coeff.generate(data, save_dir,  pic_path, crop_info, enhancer='gfpgan' if use_enhancer else None, preprocess=preprocess, img_size=size, avatar=avatar,
+                                                          output_width=output_width)
+            video_name = data['video_name']
+            print(f'The generated video is named {video_name} in {save_dir}')
 
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
-            torch.cuda.synchronize()
-            
-        import gc; gc.collect()
-        
+
         return return_path
 
+    def register_avatar(self, source_image, preprocess='crop', size=256):
+        """
+        Run face detection, landmarks, 3DMM extraction and source keypoints once for a teacher
+        image, so that every later test() call with the same image skips preprocessing.
+        Returns the content hash the avatar is stored under.
+        """
+        if self.avatar_store is None:
+            raise AttributeError("SadTalker was created without an avatar store")
+
+        with self.model_registry.borrow(self.checkpoint_path, self.config_path, size, preprocess, False, self.device) as models:
+            avatar = self.avatar_store.bundle(source_image, preprocess, size)
+            work_dir = tempfile.mkdtemp(prefix='avatar_')
+            try:
+                first_coeff_path, crop_pic_path, crop_info = models.preprocess_model.generate(source_image, work_dir, preprocess, True, size, avatar=avatar)
+                if first_coeff_path is None:
+                    raise AttributeError("No face is detected")
+                models.animate_from_coeff.prepare_source(avatar, crop_pic_path, first_coeff_path, preprocess, size)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        return avatar.key
+
     
\ No newline at end of file
@@ -5,18 +5,19 @@ from scipy.io import savemat, loadmat
 from yacs.config import CfgNode as CN
 from scipy.signal import savgol_filter
 
-import safetensors
-import safetensors.torch 
-
 from src.audio2pose_models.audio2pose import Audio2Pose
 from src.audio2exp_models.networks import SimpleWrapperV2 
 from src.audio2exp_models.audio2exp import Audio2Exp
-from src.utils.safetensor_helper import load_x_from_safetensor  
+from src.utils.safetensor_helper import open_safetensor
+from src.utils.inference_build import load_checkpoint_module
 
-def load_cpk(checkpoint_path, model=None, optimizer=None, device="cpu"):
+def load_cpk(checkpoint_path, model=None, optimizer=None, device="cpu", drop_prefixes=()):
     checkpoint = torch.load(checkpoint_path, map_location=torch.device(device))
     if model is not None:
-        model.load_state_dict(checkpoint['model'])
+        state_dict = checkpoint['model']
+        if drop_prefixes:
+            state_dict = {k: v for k, v in state_dict.items() if not k.startswith(tuple(drop_prefixes))}
+        model.load_state_dict(state_dict)
     if optimizer is not None:
         optimizer.load_state_dict(checkpoint['optimizer'])
 
@@ -24,7 +25,8 @@ def load_cpk(checkpoint_path, model=None, optimizer=None, device="cpu"):
 
 class Audio2Coeff():
 
-    def __init__(self, sadtalker_path, device):
+    def __init__(self, sadtalker_path, device, inference_only=True):
+        """inference_only -- build Audio2Pose without its training-only discriminator and CVAE encoder"""
         #load config
         fcfg_pose = open(sadtalker_path['audio2pose_yaml_path'])
         cfg_pose = CN.load_cfg(fcfg_pose)
@@ -34,7 +36,8 @@ class Audio2Coeff():
         cfg_exp.freeze()
 
         # load audio2pose_model
-        self.audio2pose_model = Audio2Pose(cfg_pose, None, device=device)
+        self.audio2pose_model = Audio2Pose(cfg_pose, None, device=device, inference_only=inference_only)
+        drop_prefixes = Audio2Pose.TRAINING_ONLY_PREFIXES if inference_only else ()
         self.audio2pose_model = self.audio2pose_model.to(device)
         self.audio2pose_model.eval()
         for param in self.audio2pose_model.parameters():
@@ -42,10 +45,11 @@ class Audio2Coeff():
         
         try:
             if sadtalker_path['use_safetensor']:
-                checkpoints = safetensors.torch.load_file(sadtalker_path['checkpoint'])
-                self.audio2pose_model.load_state_dict(load_x_from_safetensor(checkpoints, 'audio2pose'))
+                checkpoints = open_safetensor(sadtalker_path['checkpoint'])
+                load_checkpoint_module(self.audio2pose_model, checkpoints, 'audio2pose', drop_prefixes)
             else:
-                load_cpk(sadtalker_path['audio2pose_checkpoint'], model=self.audio2pose_model, device=device)
+                load_cpk(sadtalker_path['audio2pose_checkpoint'], model=self.audio2pose_model, device=device,
+                         drop_prefixes=drop_prefixes)
         except:
             raise Exception("Failed in loading audio2pose_checkpoint")
 
@@ -57,8 +61,8 @@ class Audio2Coeff():
         netG.eval()
         try:
             if sadtalker_path['use_safetensor']:
-                checkpoints = safetensors.torch.load_file(sadtalker_path['checkpoint'])
-                netG.load_state_dict(load_x_from_safetensor(checkpoints, 'audio2exp'))
+                checkpoints = open_safetensor(sadtalker_path['checkpoint'])
+                load_checkpoint_module(netG, checkpoints, 'audio2exp')
             else:
                 load_cpk(sadtalker_path['audio2exp_checkpoint'], model=netG, device=device)
         except:
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import tempfile
+
+import torch
+
+from src.utils.file_hash import file_sha256
+
+
+def _to_builtin(x):
+    if x is None:
+        return None
+    if isinstance(x, (list, tuple)):
+        return [_to_builtin(v) for v in x]
+    if hasattr(x, 'item'):
+        return x.item()
+    return x
+
+
+def _crop_info_to_json(crop_info):
+    size, crop, quad = crop_info
+    return {'size': _to_builtin(size), 'crop': _to_builtin(crop), 'quad': _to_builtin(quad)}
+
+
+def _crop_info_from_json(data):
+    crop = tuple(data['crop']) if data['crop'] is not None else None
+    quad = data['quad']
+    return (tuple(data['size']), crop, quad)
+
+
+def _atomic_copy(src, dst):
+    tmp = '%s.tmp.%d' % (dst, os.getpid())
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class AvatarBundle():
+    """
+    Cached preprocessing of one teacher image for one (preprocess, size) combination.
+
+    Files in the bundle directory:
+        source.png         -- cropped and resized face used by the renderer
+        source.mat         -- first-frame 3DMM coefficients ('coeff_3dmm', 'full_3dmm')
+        landmarks.txt      -- FAN landmarks of the crop
+        crop_info.json     -- crop/quad used to paste the face back
+        source_kp.pt       -- kp_canonical and kp_source of the face renderer
+    Every file is written to a temporary name and renamed into place, so several worker
+    processes can fill and read the same bundle concurrently.
+    """
+
+    def __init__(self, bundle_dir, key):
+        self.bundle_dir = bundle_dir
+        self.key = key
+        self.png_path = os.path.join(bundle_dir, 'source.png')
+        self.coeff_path = os.path.join(bundle_dir, 'source.mat')
+        self.landmarks_path = os.path.join(bundle_dir, 'landmarks.txt')
+        self.crop_info_path = os.path.join(bundle_dir, 'crop_info.json')
+        self.keypoints_path = os.path.join(bundle_dir, 'source_kp.pt')
+
+    def has_preprocess(self):
+        # crop_info.json is written last, so its presence means the bundle is complete
+        return os.path.isfile(self.crop_info_path)
+
+    def restore_preprocess(self, coeff_path, png_path, landmarks_path):
+        """Copy the cached crop, landmarks and coefficients to the paths CropAndExtract would write."""
+        if not self.has_preprocess():
+            return None
+        with open(self.crop_info_path, 'r', encoding='utf-8') as f:
+            crop_info = _crop_info_from_json(json.load(f))
+        shutil.copyfile(self.coeff_path, coeff_path)
+        shutil.copyfile(self.png_path, png_path)
+        if os.path.isfile(self.landmarks_path):
+            shutil.copyfile(self.landmarks_path, landmarks_path)
+        return crop_info
+
+    def save_preprocess(self, coeff_path, png_path, landmarks_path, crop_info):
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        _atomic_copy(coeff_path, self.coeff_path)
+        _atomic_copy(png_path, self.png_path)
+        if os.path.isfile(landmarks_path):
+            _atomic_copy(landmarks_path, self.landmarks_path)
+
+        fd, tmp = tempfile.mkstemp(dir=self.bundle_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(_crop_info_to_json(crop_info), f)
+        os.replace(tmp, self.crop_info_path)
+
+    def load_source_keypoints(self, device):
+        """Return {'kp_canonical': ..., 'kp_source': ...} with batch size 1, or None."""
+        if not os.path.isfile(self.keypoints_path):
+            return None
+        data = torch.load(self.keypoints_path, map_location=torch.device(device))
+        return {'kp_canonical': data['kp_canonical'], 'kp_source': data['kp_source']}
+
+    def save_source_keypoints(self, source_cache):
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        data = {}
+        for name in ('kp_canonical', 'kp_source'):
+            data[name] = {k: (v.detach().cpu() if v is not None else None) for k, v in source_cache[name].items()}
+        fd, tmp = tempfile.mkstemp(dir=self.bundle_dir, suffix='.pt')
+        os.close(fd)
+        torch.save(data, tmp)
+        os.replace(tmp, self.keypoints_path)
+
+
+class AvatarStore():
+    """On-disk store of AvatarBundles keyed by the sha256 of the teacher image content."""
+
+    def __init__(self, root='./avatars'):
+        self.root = root
+
+    def bundle(self, image_path, preprocess='crop', size=256):
+        key = file_sha256(image_path)
+        bundle_dir = os.path.join(self.root, key, '%s_%d' % (preprocess, int(size)))
+        return AvatarBundle(bundle_dir, key)
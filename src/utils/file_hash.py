@@ -0,0 +1,13 @@
+import hashlib
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hex sha256 of a file's content, read in chunks. Kept free of heavy imports (OCR / LibreOffice workers use it)."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
@@ -0,0 +1,220 @@
+"""
+Inference build of a SadTalker safetensors checkpoint: BatchNorm folded into the preceding
+convolution and spectral-normalized weights baked, saved as a new artifact next to the original.
+
+    python -m src.utils.inference_build --checkpoint_dir ./checkpoints --size 256
+
+init_path() picks SadTalker_V0.0.2_<size>_inference.safetensors when it exists. Loaders rebuild
+the baked module structure with bake_for_inference() before loading such a checkpoint.
+"""
+import os
+import functools
+from argparse import ArgumentParser
+
+import torch
+from torch import nn
+from torch.nn.modules.batchnorm import _BatchNorm
+from torch.nn.modules.conv import _ConvNd
+from torch.nn.utils.spectral_norm import SpectralNorm
+
+from src.utils.safetensor_helper import open_safetensor, load_state_dict_shared
+
+
+INFERENCE_BUILD_KEY = 'sadtalker_inference_build'
+INFERENCE_BUILD_VERSION = '1'
+
+
+def inference_checkpoint_name(size):
+    return 'SadTalker_V0.0.2_%d_inference.safetensors' % int(size)
+
+
+@functools.lru_cache(maxsize=None)
+def _fold_table():
+    """
+    class -> (conv, norm) attribute pairs whose forward() feeds the conv output straight into the
+    norm. Norms applied to a block input (pre-activation ResBlocks) are not foldable and stay.
+    nn.Sequential children are handled separately.
+    """
+    from src.facerender.modules import util
+    from src.facerender.modules.dense_motion import DenseMotionNetwork
+    from src.facerender.modules.keypoint_detector import HEEstimator
+    from src.face3d.models import networks
+
+    conv_norm = [('conv', 'norm')]
+    return {
+        util.SameBlock2d: conv_norm,
+        util.DownBlock2d: conv_norm,
+        util.DownBlock3d: conv_norm,
+        util.UpBlock2d: conv_norm,
+        util.UpBlock3d: conv_norm,
+        util.Decoder: conv_norm,
+        util.ResBlock2d: [('conv1', 'norm2')],
+        util.ResBlock3d: [('conv1', 'norm2')],
+        util.ResBottleneck: [('conv1', 'norm1'), ('conv2', 'norm2'), ('conv3', 'norm3'), ('skip', 'norm4')],
+        DenseMotionNetwork: [('compress', 'norm')],
+        HEEstimator: [('conv%d' % i, 'norm%d' % i) for i in range(1, 6)],
+        networks.ResNet: [('conv1', 'bn1')],
+        networks.BasicBlock: [('conv1', 'bn1'), ('conv2', 'bn2')],
+        networks.Bottleneck: [('conv1', 'bn1'), ('conv2', 'bn2'), ('conv3', 'bn3')],
+    }
+
+
+def _foldable(conv, norm):
+    return (isinstance(conv, _ConvNd) and not conv.transposed and isinstance(norm, _BatchNorm)
+            and norm.running_mean is not None and norm.num_features == conv.out_channels)
+
+
+def fold_conv_bn(conv, norm):
+    """
+    Replace conv's weight and bias by those of conv followed by the eval-mode norm. New tensors are
+    created: the old ones may be views on a shared mapped checkpoint and must not be written to.
+    """
+    with torch.no_grad():
+        scale = torch.rsqrt(norm.running_var + norm.eps)
+        shift = -norm.running_mean * scale
+        if norm.affine:
+            scale = scale * norm.weight
+            shift = shift * norm.weight + norm.bias
+        weight = conv.weight * scale.view((-1,) + (1,) * (conv.weight.dim() - 1))
+        bias = shift if conv.bias is None else conv.bias * scale + shift
+    conv.weight = nn.Parameter(weight.to(conv.weight.dtype), requires_grad=False)
+    conv.bias = nn.Parameter(bias.to(conv.weight.dtype), requires_grad=False)
+
+
+def bake_spectral_norm(model):
+    """Replace every spectral-norm hook by the weight it computes in eval mode. Returns the count."""
+    count = 0
+    for module in list(model.modules()):
+        for hook in list(module._forward_pre_hooks.values()):
+            if isinstance(hook, SpectralNorm):
+                # computed without power iteration (as in eval), into a new tensor
+                nn.utils.remove_spectral_norm(module, hook.name)
+                count += 1
+    return count
+
+
+def fold_batchnorm(model):
+    """Fold every foldable (conv, BatchNorm) pair and replace the norm by nn.Identity. Returns the count."""
+    table = _fold_table()
+    count = 0
+    for module in list(model.modules()):
+        pairs = []
+        if isinstance(module, nn.Sequential):
+            names = list(module._modules.keys())
+            pairs = list(zip(names[:-1], names[1:]))
+        else:
+            for cls, cls_pairs in table.items():
+                if type(module) is cls:
+                    pairs = cls_pairs
+                    break
+        for conv_name, norm_name in pairs:
+            conv, norm = getattr(module, conv_name, None), getattr(module, norm_name, None)
+            if _foldable(conv, norm):
+                fold_conv_bn(conv, norm)
+                setattr(module, norm_name, nn.Identity())
+                count += 1
+    return count
+
+
+def bake_for_inference(model):
+    """
+    Turn an eval-mode model into its inference build in place (spectral norm baked, BatchNorm folded).
+    Only valid for inference: the folded model has no running statistics left to train.
+    """
+    model.eval()
+    counts = {'spectral_norm': bake_spectral_norm(model), 'batchnorm': fold_batchnorm(model)}
+    for param in model.parameters():
+        param.requires_grad = False
+    return counts
+
+
+def is_inference_build(checkpoint):
+    return checkpoint.metadata.get(INFERENCE_BUILD_KEY) is not None
+
+
+def load_checkpoint_module(module, checkpoint, prefix, drop_prefixes=()):
+    """
+    load_state_dict_shared(module, checkpoint.state_dict(prefix)), baking the module first for an
+    inference build. Entries starting with one of drop_prefixes (training-only submodules a slim
+    model does not build) are skipped; everything else is still loaded strictly.
+    """
+    if is_inference_build(checkpoint):
+        bake_for_inference(module)
+    state_dict = checkpoint.state_dict(prefix)
+    if drop_prefixes:
+        state_dict = {k: v for k, v in state_dict.items() if not k.startswith(tuple(drop_prefixes))}
+    return load_state_dict_shared(module, state_dict)
+
+
+def default_models(config_dir):
+    """Modules of every sub-model stored in SadTalker_V0.0.2_<size>.safetensors, keyed by prefix."""
+    import yaml
+    from yacs.config import CfgNode as CN
+    from src.face3d.models import networks
+    from src.facerender.modules.keypoint_detector import KPDetector
+    from src.facerender.modules.generator import OcclusionAwareSPADEGenerator
+    from src.audio2pose_models.audio2pose import Audio2Pose
+    from src.audio2exp_models.networks import SimpleWrapperV2
+
+    with open(os.path.join(config_dir, 'facerender.yaml')) as f:
+        config = yaml.safe_load(f)
+    with open(os.path.join(config_dir, 'auido2pose.yaml')) as f:
+        cfg_pose = CN.load_cfg(f)
+    cfg_pose.freeze()
+    return {
+        'generator': OcclusionAwareSPADEGenerator(**config['model_params']['generator_params'],
+                                                  **config['model_params']['common_params']),
+        'kp_extractor': KPDetector(**config['model_params']['kp_detector_params'],
+                                   **config['model_params']['common_params']),
+        'audio2pose': Audio2Pose(cfg_pose, None, device='cpu'),
+        'audio2exp': SimpleWrapperV2(),
+        'face_3drecon': networks.define_net_recon(net_recon='resnet50', use_last_fc=False, init_path=''),
+    }
+
+
+def build_inference_checkpoint(src_path, dst_path, models):
+    """
+    Bake every sub-model of the checkpoint at src_path for which `models` has a module and save the
+    result to dst_path; tensors of other prefixes are copied unchanged. Returns {prefix: counts}.
+    """
+    from safetensors.torch import save_file
+
+    checkpoint = open_safetensor(src_path)
+    if is_inference_build(checkpoint):
+        raise ValueError('%s is already an inference build' % src_path)
+    tensors, report = {}, {}
+    for prefix in checkpoint.prefixes():
+        module = models.get(prefix)
+        if module is None:
+            state_dict = checkpoint.state_dict(prefix)
+        else:
+            module.load_state_dict(checkpoint.state_dict(prefix))
+            report[prefix] = bake_for_inference(module)
+            state_dict = module.state_dict()
+        for name, tensor in state_dict.items():
+            tensors[prefix + '.' + name] = tensor.detach().cpu().contiguous()
+
+    metadata = {INFERENCE_BUILD_KEY: INFERENCE_BUILD_VERSION, 'source': os.path.basename(src_path)}
+    tmp = dst_path + '.tmp'
+    save_file(tensors, tmp, metadata=metadata)
+    os.replace(tmp, dst_path)
+    return report
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--checkpoint_dir', default='./checkpoints')
+    parser.add_argument('--config_dir', default='./src/config')
+    parser.add_argument('--size', type=int, nargs='+', default=[256, 512])
+    args = parser.parse_args()
+
+    for size in args.size:
+        src_path = os.path.join(args.checkpoint_dir, 'SadTalker_V0.0.2_%d.safetensors' % size)
+        if not os.path.isfile(src_path):
+            print('skip: %s not found' % src_path)
+            continue
+        dst_path = os.path.join(args.checkpoint_dir, inference_checkpoint_name(size))
+        report = build_inference_checkpoint(src_path, dst_path, default_models(args.config_dir))
+        for prefix, counts in report.items():
+            print('%-14s folded %3d BatchNorm, baked %2d spectral norm' % (prefix, counts['batchnorm'], counts['spectral_norm']))
+        print('saved', dst_path)
@@ -1,7 +1,7 @@
 import os
 import glob
 
-def init_path(checkpoint_dir, config_dir, size=512, old_version=False, preprocess='crop'):
+def init_path(checkpoint_dir, config_dir, size=512, old_version=False, preprocess='crop', inference_build=True):
 
     if old_version:
         #### load all the checkpoint of `pth`
@@ -19,6 +19,11 @@ def init_path(checkpoint_dir, config_dir, size=512, old_version=False, preproces
         sadtalker_paths = {
             "checkpoint":os.path.join(checkpoint_dir, 'SadTalker_V0.0.2_'+str(size)+'.safetensors'),
             }
+        # BatchNorm-folded / spectral-norm-baked build made by src/utils/inference_build.py
+        baked = os.path.join(checkpoint_dir, 'SadTalker_V0.0.2_'+str(size)+'_inference.safetensors')
+        if inference_build and os.path.isfile(baked):
+            print('using the inference build', baked)
+            sadtalker_paths['checkpoint'] = baked
         use_safetensor = True
     else:
         print("WARNING: The new version of the model will be updated by safetensor, you may need to download it mannully. We run the old version of the checkpoint this time!")
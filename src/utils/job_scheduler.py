@@ -0,0 +1,250 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job():
+    """
+    One submitted unit of work. The job function receives the worker's context and the Job,
+    reports progress with job.report() and checks job.cancelled between steps (cancellation is
+    cooperative: a running job stops at its next check).
+    """
+
+    def __init__(self, fn, name='', priority=0.0, est_mem_gb=0.0, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.fn = fn
+        self.name = name
+        self.key = key
+        self.priority = float(priority)
+        self.est_mem_gb = float(est_mem_gb)
+        self.status = 'queued'          # queued -> running -> done | failed | cancelled
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.worker = None
+        self.device = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def raise_if_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+
+    def report(self, progress=None, message=None):
+        if progress is not None:
+            self.progress = min(1.0, max(0.0, float(progress)))
+        if message is not None:
+            self.message = message
+
+    def snapshot(self):
+        now = time.time()
+        return {
+            'id': self.id, 'name': self.name, 'key': self.key, 'status': self.status,
+            'progress': self.progress, 'message': self.message, 'error': self.error,
+            'priority': self.priority, 'est_mem_gb': self.est_mem_gb, 'worker': self.worker, 'device': self.device,
+            'waited': (self.started or now) - self.created,
+            'elapsed': (self.finished or now) - self.started if self.started else 0.0,
+        }
+
+
+class JobScheduler():
+    """
+    Fixed pool of worker threads, each owning the context built by worker_factory(index)
+    (e.g. its own SadTalker with its own models), fed from a priority queue.
+
+    Lower priority values run first; a queued job gains one priority unit per `aging_seconds`
+    of waiting, so large jobs are not starved by a stream of small ones.
+
+    devices names the device each worker runs on (default: all on one device). memory_budget_gb
+    is either one budget per device or a {device: budget} dict; a job starts on a worker only when
+    its est_mem_gb fits next to the jobs already running on that worker's device (a job larger
+    than the whole budget still runs, alone on its device). The queue is strict per device: if
+    the best job does not fit on a device yet, nothing behind it is started there, which keeps
+    the wait of every job bounded.
+
+    Jobs submitted with the same key (e.g. the lecture project directory they write to) never
+    run at the same time; a job whose key is busy is passed over until that job finishes.
+    """
+
+    def __init__(self, worker_factory, n_workers=1, memory_budget_gb=None, aging_seconds=60.0, keep_finished=100,
+                 devices=None):
+        n_workers = len(devices) if devices else max(1, int(n_workers))
+        self.worker_factory = worker_factory
+        self.devices = list(devices) if devices else [None] * n_workers
+        self.memory_budget_gb = memory_budget_gb
+        self.aging_seconds = aging_seconds
+        self.keep_finished = keep_finished
+        self._jobs = OrderedDict()
+        self._queue = []
+        self._running_mem = {}
+        self._running = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._worker, args=(i,), name=f'render-worker-{i}', daemon=True)
+                         for i in range(n_workers)]
+        for t in self._threads:
+            t.start()
+
+    # ---------- public API ----------
+    def submit(self, fn, name='', priority=0.0, est_mem_gb=0.0, key=None):
+        """fn(context, job) -> result. Returns the job id."""
+        job = Job(fn, name, priority, est_mem_gb, key)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._cond.notify_all()
+        return job.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        """Snapshot dict of the job (plus its queue position while queued), None if unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            info = job.snapshot()
+            if job.status == 'queued':
+                order = sorted(self._queue, key=self._rank)
+                info['position'] = order.index(job) + 1
+            return info
+
+    def cancel(self, job_id):
+        """Queued jobs are dropped at once; running jobs stop at their next cancellation check."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return False
+            job._cancel.set()
+            if job.status == 'queued':
+                self._queue.remove(job)
+                self._finish(job, 'cancelled')
+            self._cond.notify_all()
+            return True
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            for job in list(self._queue):
+                job._cancel.set()
+                self._finish(job, 'cancelled')
+            self._queue.clear()
+            self._cond.notify_all()
+
+    # ---------- scheduling ----------
+    def _rank(self, job):
+        waited = time.time() - job.created
+        return (job.priority - waited / self.aging_seconds, job.created)
+
+    def _budget(self, device):
+        if isinstance(self.memory_budget_gb, dict):
+            return self.memory_budget_gb.get(device)
+        return self.memory_budget_gb
+
+    def _fits(self, job, device):
+        budget = self._budget(device)
+        if budget is None or self._running.get(device, 0) == 0:
+            return True
+        return self._running_mem.get(device, 0.0) + job.est_mem_gb <= budget
+
+    def _next_job(self, device):
+        busy = set(j.key for j in self._jobs.values() if j.status == 'running' and j.key is not None)
+        ready = [j for j in self._queue if j.key is None or j.key not in busy]
+        if not ready:
+            return None
+        job = min(ready, key=self._rank)
+        return job if self._fits(job, device) else None
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        finished = [j for j in self._jobs.values() if j.status in ('done', 'failed', 'cancelled')]
+        for old in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[old.id]
+
+    def _worker(self, index):
+        device = self.devices[index]
+        try:
+            context = self.worker_factory(index)
+        except Exception:
+            print(f"❌ render worker {index} failed to start")
+            traceback.print_exc()
+            return
+        while True:
+            with self._cond:
+                job = self._next_job(device)
+                while job is None and not self._stopping:
+                    # wake up periodically as well: aging changes the order while nothing else happens
+                    self._cond.wait(timeout=1.0)
+                    job = self._next_job(device)
+                if self._stopping:
+                    return
+                self._queue.remove(job)
+                job.status, job.worker, job.device, job.started = 'running', index, device, time.time()
+                self._running[device] = self._running.get(device, 0) + 1
+                self._running_mem[device] = self._running_mem.get(device, 0.0) + job.est_mem_gb
+
+            status, result, error = 'done', None, None
+            try:
+                job.raise_if_cancelled()
+                result = job.fn(context, job)
+                if job.cancelled:
+                    status = 'cancelled'
+            except JobCancelled:
+                status = 'cancelled'
+            except Exception as e:
+                traceback.print_exc()
+                status, error = 'failed', str(e)
+
+            with self._cond:
+                self._running[device] -= 1
+                self._running_mem[device] -= job.est_mem_gb
+                if status == 'done':
+                    job.progress = 1.0
+                self._finish(job, status, result, error)
+                self._cond.notify_all()
+
+
+def render_devices():
+    """One render worker per CUDA device ('cuda:i'), or a single CPU worker; RENDER_WORKERS overrides the count."""
+    try:
+        import torch
+        n_gpu = torch.cuda.device_count() if torch.cuda.is_available() else 0
+    except ImportError:
+        n_gpu = 0
+    devices = [f'cuda:{i}' for i in range(n_gpu)] or ['cpu']
+    n = int(os.environ.get('RENDER_WORKERS', len(devices)))
+    return [devices[i % len(devices)] for i in range(max(1, n))]
+
+
+def device_memory_gb(devices):
+    """{device: memory in GB} for the devices the workers run on (GPU total memory, or available RAM for CPU)."""
+    memory = {}
+    for device in sorted(set(devices)):
+        if device.startswith('cuda'):
+            import torch
+            memory[device] = torch.cuda.get_device_properties(torch.device(device)).total_memory / 2**30
+        else:
+            try:
+                import psutil
+                memory[device] = psutil.virtual_memory().available / 2**30
+            except ImportError:
+                memory[device] = 8.0
+    return memory
@@ -0,0 +1,118 @@
+import shutil
+import subprocess
+
+from src.utils.render_planner import pip_target_width
+
+
+def probe_duration(path):
+    """Container duration in seconds (ffprobe), 0.0 if it cannot be read."""
+    try:
+        out = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                              '-of', 'default=noprint_wrappers=1:nokey=1', path],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+        return float(out.decode().strip() or 0.0)
+    except (subprocess.CalledProcessError, ValueError, OSError):
+        return 0.0
+
+
+def has_audio(path):
+    try:
+        out = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index',
+                              '-of', 'csv=p=0', path],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+        return bool(out.strip())
+    except (subprocess.CalledProcessError, OSError):
+        return False
+
+
+def _image_size(path):
+    from PIL import Image
+    with Image.open(path) as im:
+        return im.size
+
+
+def lecture_filter_graph(segments, canvas_size, pip_ratio=0.10, margin=50, fps=25, sample_rate=48000):
+    """
+    filter_complex for compose_lecture.
+
+    segments -- list of dicts with 'slide', 'teacher', 'audio' input indices (audio may be None for
+                silence), 'duration' in seconds and 'size' of the slide image
+
+    Every segment is cut to exactly its duration (video trimmed, audio padded / trimmed), so
+    slide changes stay on the teacher's audio timeline however many slides are joined.
+    """
+    cw, ch = canvas_size
+    face_w = pip_target_width(cw, pip_ratio)
+    parts = []
+    labels = []
+    for i, seg in enumerate(segments):
+        d = f"{seg['duration']:.3f}"
+        fit = '' if tuple(seg['size']) == (cw, ch) else \
+            f"scale={cw}:{ch}:force_original_aspect_ratio=decrease,pad={cw}:{ch}:(ow-iw)/2:(oh-ih)/2:color=white,"
+        parts.append(f"[{seg['slide']}:v]{fit}setsar=1,format=yuv420p[bg{i}]")
+        parts.append(f"[{seg['teacher']}:v]fps={fps},scale={face_w}:-2:flags=lanczos[face{i}]")
+        parts.append(f"[bg{i}][face{i}]overlay=W-w-{margin}:{margin}:eof_action=repeat,"
+                     f"trim=duration={d},setpts=PTS-STARTPTS[v{i}]")
+        audio = f"[{seg['audio']}:a]" if seg['audio'] is not None else f"anullsrc=r={sample_rate}:cl=stereo,"
+        parts.append(f"{audio}aresample={sample_rate},aformat=sample_fmts=fltp:channel_layouts=stereo,"
+                     f"apad,atrim=duration={d},asetpts=PTS-STARTPTS[a{i}]")
+        labels.append(f"[v{i}][a{i}]")
+    parts.append(f"{''.join(labels)}concat=n={len(segments)}:v=1:a=1[vout][aout]")
+    return ';'.join(parts)
+
+
+def compose_lecture(items, out_path, pip_ratio=0.10, margin=50, fps=25, crf=20, preset='veryfast',
+                    audio_bitrate='160k', canvas_size=None):
+    """
+    Write the whole lecture in one CPU encoder session.
+
+    items -- ordered list of (slide_image, teacher_clip, audio_path); audio_path None takes the
+             teacher clip's own audio track (silence if it has none)
+
+    Each slide image is looped at the output frame rate for its segment; the teacher clip is
+    scaled to pip_ratio of the slide width and overlaid in the top-right corner. The segments are
+    joined by the concat filter, so no per-slide mp4 is written. x264 runs with -tune stillimage,
+    since apart from the small teacher overlay the picture only changes at slide transitions.
+    Returns out_path.
+    """
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError("ffmpeg not found in PATH")
+    if not items:
+        raise ValueError("compose_lecture needs at least one slide")
+
+    sizes = [_image_size(slide) for slide, _, _ in items]
+    if canvas_size is None:
+        canvas_size = max(sizes)
+    canvas_size = (canvas_size[0] + (canvas_size[0] & 1), canvas_size[1] + (canvas_size[1] & 1))
+
+    inputs = []
+    segments = []
+
+    def add_input(*args):
+        inputs.append(list(args))
+        return len(inputs) - 1
+
+    for (slide, teacher, audio), size in zip(items, sizes):
+        duration = probe_duration(audio) if audio else 0.0
+        if duration <= 0:
+            duration = probe_duration(teacher)
+        seg = {'size': size, 'duration': duration, 'audio': None}
+        seg['slide'] = add_input('-loop', '1', '-framerate', str(fps), '-t', f'{duration:.3f}', '-i', slide)
+        seg['teacher'] = add_input('-i', teacher)
+        if audio:
+            seg['audio'] = add_input('-i', audio)
+        elif has_audio(teacher):
+            seg['audio'] = seg['teacher']
+        segments.append(seg)
+
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error'] + [a for args in inputs for a in args] + [
+        '-filter_complex', lecture_filter_graph(segments, canvas_size, pip_ratio, margin, fps),
+        '-map', '[vout]', '-map', '[aout]',
+        '-c:v', 'libx264', '-preset', preset, '-tune', 'stillimage', '-crf', str(crf),
+        '-g', str(fps * 10), '-pix_fmt', 'yuv420p', '-r', str(fps),
+        '-c:a', 'aac', '-b:a', audio_bitrate,
+        '-movflags', '+faststart', out_path]
+    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg lecture compose failed: {p.stderr.decode('utf-8', errors='ignore')}")
+    return out_path
@@ -0,0 +1,70 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from src.utils.file_hash import file_sha256
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+class LectureManifest():
+    """
+    Per-slide artifact manifest of one lecture project directory.
+
+    Every slide is identified by the hash of everything that affects its rendered teacher clip
+    (text, slide image, avatar, voice and render params). manifest.json maps those hashes to the
+    slide_XXX_<hash>.mp4 clips (with audio), so a re-run only renders slides whose hash changed,
+    even if slides were inserted or reordered.
+    """
+
+    def __init__(self, project_dir):
+        self.project_dir = project_dir
+        self.path = os.path.join(project_dir, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.entries = {s['hash']: s for s in data.get('slides', [])}
+            except Exception as e:
+                print(f"⚠️ Cannot read {self.path}, rendering every slide: {e}")
+
+    def slide_hash(self, slide, avatar_sha, voice, render_params):
+        image_path = slide.get('image_path')
+        image_sha = file_sha256(image_path) if image_path and os.path.isfile(image_path) else None
+        payload = json.dumps({'text': slide.get('text', ''), 'image': image_sha, 'avatar': avatar_sha,
+                              'voice': voice, 'render': render_params}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def piece_path(self, index, slide_hash):
+        return os.path.abspath(os.path.join(self.project_dir, f"slide_{index+1:03d}_{slide_hash[:12]}.mp4"))
+
+    def cached(self, slide_hash):
+        """The finished entry for this hash if its mp4 is still on disk, else None."""
+        entry = self.entries.get(slide_hash)
+        if entry and os.path.isfile(os.path.join(self.project_dir, entry['video'])):
+            return entry
+        return None
+
+    def save(self, slides):
+        """
+        slides -- list of {'hash', 'video', 'duration'} in lecture order.
+        Pieces no longer referenced are deleted.
+        """
+        slides = [dict(s, video=os.path.basename(s['video'])) for s in slides]
+        keep = {s['video'] for s in slides}
+        for entry in self.entries.values():
+            if entry['video'] not in keep:
+                try:
+                    os.remove(os.path.join(self.project_dir, entry['video']))
+                except OSError:
+                    pass
+
+        os.makedirs(self.project_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.project_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'slides': slides}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self.entries = {s['hash']: s for s in slides}
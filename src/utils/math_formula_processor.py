@@ -1,16 +1,126 @@
+import os
 import re
+import json
+import hashlib
+import tempfile
 import unicodedata
-import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Tuple, Optional
 import logging
 
+from src.utils.pptx_reader import PptxPackage, parse_slide, omml_text
+from src.utils.file_hash import file_sha256
+
 # Thiết lập logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
-try:
-    from pptx.enum.shapes import MSO_SHAPE_TYPE
-except Exception:
-    MSO_SHAPE_TYPE = None
+
+# Deck từ ngần này slide trở lên mới chia cho process pool (dưới mức này khởi động pool tốn hơn)
+PPTX_POOL_MIN_SLIDES = 48
+PPTX_SLIDES_PER_WORKER = 16
+# Tăng khi đổi cách trích xuất để bỏ qua cache cũ
+PPTX_TEXT_CACHE_VERSION = 1
+
+
+# Fallback đọc toán tử ASCII còn sót sau các bước regex
+_ASCII_FALLBACKS = {
+    '+': ' cộng', '-': ' trừ', '=': ' bằng',
+    '/': ' chia', '*': ' nhân', '^': ' mũ ',
+}
+
+# ⁰¹²³⁴⁵⁶⁷⁸⁹ -> ^n (² ³ kèm dấu ^, các số mũ khác chỉ đổi thành chữ số như trước)
+_SUPERSCRIPT_TABLE = str.maketrans({'⁰': '0', '¹': '1', '²': '^2', '³': '^3', '⁴': '4',
+                                    '⁵': '5', '⁶': '6', '⁷': '7', '⁸': '8', '⁹': '9'})
+
+_RX_MATH_OPS = re.compile(r"[+\-*/=^×÷⋅·]|∑|∏|√|∫|≈|≠|≤|≥|⊂|⊃|∈|∉")
+_RX_MATH_FUNCS = re.compile(r"\b(sin|cos|tan|log|ln|lim|exp)\b", re.IGNORECASE)
+_RX_SUPSUB = re.compile(r"[⁰¹²³⁴⁵⁶⁷⁸⁹₀₁₂₃₄₅₆₇₈₉]")
+_RX_STRONG_MATH = re.compile(r"[∑∏√∫^]")
+
+_RX_NUM_X = re.compile(r'(?<!\w)(\d+)\s*x\b', re.IGNORECASE)
+_RX_VAR_SPACE_X = re.compile(r'(?<![A-Za-z0-9_])([A-Za-z])\s*x\b')
+_RX_VAR_X = re.compile(r'(?<![A-Za-z0-9_])([A-Za-z])x\b')
+_RX_PI_VAR = re.compile(r'π\s*([A-Za-z])\b')
+_RX_COEF_X_POW = re.compile(r'(?<!\w)([A-Za-z]|\d+)\s*x\s*\^\s*(\d+)\b')
+
+# Ký tự literal mà mẫu bắt buộc phải có: thiếu ký tự đó thì bỏ qua lượt sub (kết quả không đổi)
+_PATTERN_TRIGGERS = {
+    r'(\d+)/(\d+)': '/', r'√(\w+)': '√', r'(\d+)√(\w+)': '√', r'(\w+)\^(\d+)': '^',
+    r'∫([^d]+)d([a-z])': '∫', r'd/(d[a-z])': 'd/', r'Σ([^=]+)=([^=]+)': 'Σ', r'Π([^=]+)=([^=]+)': 'Π',
+    r'(\b\d+)\s*:\s*(\d+\b)': ':',
+    r'(\b[\w\)\]])\s*\+\s*([\w\(\[]\b)': '+', r'(\b[\w\)\]])\s*-\s*([\w\(\[]\b)': '-',
+    r'(\b[\w\)\]])\s*\*\s*([\w\(\[]\b)': '*', r'(\b[\w\)\]])\s*/\s*([\w\(\[]\b)': '/',
+    r'(\b[\w\)\]])\s*=\s*([\w\(\[]\b)': '=', r'(?<![\w\.])-([0-9]+)\b': '-',
+    r'([A-Za-z0-9])\s*\^\s*([0-9]+)': '^', r'([A-Za-z0-9])\s*\^\s*([A-Za-z]+)': '^',
+    r'(?<=\b[\da-wyzA-WYZ])\s+x\s+(?=[\da-wyzA-WYZ]\b)': 'x',
+}
+
+_RX_SPACES = re.compile(r'\s+')
+_RX_SPACE_PUNCT = re.compile(r'\s+([.,;:!?])')
+_RX_OPEN_PAREN = re.compile(r'\(\s+')
+_RX_CLOSE_PAREN = re.compile(r'\s+\)')
+
+
+def _verbalize_unicode_char(char: str) -> str:
+    """Đọc 1 ký tự không phải ASCII theo tên Unicode (số mũ, chỉ số, Hy Lạp, ký tự toán học)."""
+    try:
+        char_name = unicodedata.name(char)
+    except ValueError:
+        # Nếu không lấy được tên Unicode, giữ nguyên
+        return char
+
+    if 'SUPERSCRIPT' in char_name:
+        # Số mũ
+        if char_name.endswith('TWO'):
+            return ' mũ hai'
+        elif char_name.endswith('THREE'):
+            return ' mũ ba'
+        elif char_name.endswith('ONE'):
+            return ' mũ một'
+        # Lấy số từ tên
+        return f' mũ {char_name.split()[-1]}'
+    elif 'SUBSCRIPT' in char_name:
+        # Chỉ số dưới
+        if char_name.endswith('TWO'):
+            return ' chỉ số hai'
+        elif char_name.endswith('THREE'):
+            return ' chỉ số ba'
+        elif char_name.endswith('ONE'):
+            return ' chỉ số một'
+        return f' chỉ số {char_name.split()[-1]}'
+    elif 'GREEK' in char_name:
+        # Chữ Hy Lạp
+        return f' {char_name.split()[-1].lower()}'
+    elif 'MATHEMATICAL' in char_name:
+        # Ký tự toán học
+        return f' {char_name.split()[-1].lower()}'
+    # Giữ nguyên ký tự nếu không xử lý được
+    return char
+
+
+class _CharTable(dict):
+    """
+    Bảng cho str.translate tự điền dần: ký tự chưa có trong bảng được tra ở bảng fallback (hoặc
+    đọc qua tên Unicode) đúng 1 lần rồi ghi nhớ, nên mỗi ký tự chỉ gọi unicodedata.name một lần
+    cho cả tiến trình.
+    """
+
+    def __init__(self, fallback=None):
+        super().__init__()
+        self.fallback = fallback
+
+    def __missing__(self, code):
+        if self.fallback is not None:
+            out = self.fallback[code]
+        else:
+            out = _verbalize_unicode_char(chr(code)) if code > 127 else chr(code)
+        self[code] = out
+        return out
+
+
+_UNICODE_TABLE = _CharTable()
 
 
 class MathFormulaProcessor:
@@ -21,12 +131,10 @@ class MathFormulaProcessor:
         """Điểm 'tính toán học' theo số toán tử/ký hiệu đặc trưng."""
         if not s:
             return 0
-        ops = r"[+\-*/=^×÷⋅·]|∑|∏|√|∫|≈|≠|≤|≥|⊂|⊃|∈|∉"
-        funcs = r"\b(sin|cos|tan|log|ln|lim|exp)\b"
-        score = len(re.findall(ops, s))
-        score += 2 * len(re.findall(funcs, s, flags=re.IGNORECASE))
+        score = len(_RX_MATH_OPS.findall(s))
+        score += 2 * len(_RX_MATH_FUNCS.findall(s))
         # có superscript/subscript unicode?
-        if re.search(r"[⁰¹²³⁴⁵⁶⁷⁸⁹₀₁₂₃₄₅₆₇₈₉]", s):
+        if _RX_SUPSUB.search(s):
             score += 2
         return score
 
@@ -34,7 +142,7 @@ class MathFormulaProcessor:
         """Heuristic: coi là toán nếu có >=2 toán tử/ký hiệu, hoặc có dấu ^, ∑, ∫, √…"""
         if not s:
             return False
-        if re.search(r"[∑∏√∫^]", s):
+        if _RX_STRONG_MATH.search(s):
             return True
         return self._mathiness_score(s) >= 2
 
@@ -260,15 +368,37 @@ class MathFormulaProcessor:
             (re.compile(r'(?<=\b[\da-wyzA-WYZ])\s+x\s+(?=[\da-wyzA-WYZ]\b)'), r' nhân '),
         ]
 
+        self._math_patterns_rx = [(re.compile(p), r, _PATTERN_TRIGGERS.get(p)) for p, r in self.math_patterns]
+        self._math_ascii_rx = [(rx, r, _PATTERN_TRIGGERS.get(rx.pattern)) for rx, r in self.math_ascii_patterns]
+        self._symbol_table = self._build_symbol_table()
+        self._config_digest = hashlib.sha1(
+            repr((sorted(self.special_char_map.items()), self.math_patterns)).encode('utf-8')).hexdigest()[:12]
+
+    def _build_symbol_table(self) -> Dict[int, str]:
+        """
+        Gộp bước thay ký hiệu (fallback ASCII + special_char_map) và bước đọc Unicode thành một
+        bảng str.translate: mỗi ký tự được thay đúng một lần, kết quả giống hệt chạy tuần tự
+        replace rồi _process_unicode_chars (không bản dịch nào chứa ký tự cần thay tiếp).
+        Gọi lại hàm này nếu sửa special_char_map sau khi khởi tạo.
+        """
+        merged_map = dict(_ASCII_FALLBACKS)
+        merged_map.update(self.special_char_map)
+        table = _CharTable(fallback=_UNICODE_TABLE)
+        for ch, rep in merged_map.items():
+            if ch == '.':
+                continue
+            table[ord(ch)] = self._process_unicode_chars(rep)
+        return table
+
     # --- Helpers for better math reading ---
 
     _MATH_LET = r"[A-Za-zα-ωΑ-Ω]"  # chữ Latin + Greek 1 ký tự
 
+    _RX_EXPONENT = re.compile(rf"\b({_MATH_LET})\s*\^\s*(\d+)\b")
+
     def _normalize_superscripts(self, s: str) -> str:
         """Chuẩn hóa số mũ unicode -> dạng ^n để xử lý/thay thế ổn định hơn."""
-        trans = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹", "0123456789")
-        s = s.replace("²", "^2").replace("³", "^3").translate(trans)
-        return s
+        return s.translate(_SUPERSCRIPT_TABLE)
 
     def _insert_multiplication_reading(self, s: str) -> str:
         """
@@ -281,26 +411,30 @@ class MathFormulaProcessor:
         if not self._is_math_line(s):
             return s
 
+        # (mỗi quy tắc cần có 'x' hoặc 'π' trong dòng; không có thì bỏ qua lượt sub)
         # 1) số + x  (2x, 10x)
-        s = re.sub(r'(?<!\w)(\d+)\s*x\b', r'\1 nhân x', s, flags=re.IGNORECASE)
+        if 'x' in s or 'X' in s:
+            s = _RX_NUM_X.sub(r'\1 nhân x', s)
 
         # 2) biến đơn + x  (ax, a x) – biến là 1 chữ, và đứng độc lập (không có chữ/số ngay trước)
-        s = re.sub(r'(?<![A-Za-z0-9_])([A-Za-z])\s*x\b', r'\1 nhân x', s)         # a x
-        s = re.sub(r'(?<![A-Za-z0-9_])([A-Za-z])x\b',     r'\1 nhân x', s)         # ax
+        if 'x' in s:
+            s = _RX_VAR_SPACE_X.sub(r'\1 nhân x', s)         # a x
+            s = _RX_VAR_X.sub(r'\1 nhân x', s)               # ax
 
         # 3) π + biến đơn (πr, π r)
-        s = re.sub(r'π\s*([A-Za-z])\b', r'π nhân \1', s)
+        if 'π' in s:
+            s = _RX_PI_VAR.sub(r'π nhân \1', s)
 
         # 4) (số|biến) + x^n  (ax^2, 2x^3) – giữ cụm x^n lại để verbalize sau
-        s = re.sub(r'(?<!\w)([A-Za-z]|\d+)\s*x\s*\^\s*(\d+)\b', r'\1 nhân x^\2', s)
+        if 'x' in s and '^' in s:
+            s = _RX_COEF_X_POW.sub(r'\1 nhân x^\2', s)
 
         return s
 
 
     def _verbalize_exponents(self, s: str) -> str:
         """x^2 -> x mũ 2 (đặt sau khi đã chèn 'nhân' để giữ cụm 'x^2')."""
-        s = re.sub(rf"\b({self._MATH_LET})\s*\^\s*(\d+)\b", r"\1 mũ \2", s)
-        return s
+        return self._RX_EXPONENT.sub(r"\1 mũ \2", s) if '^' in s else s
 
     def process_special_characters(self, text: str) -> str:
         if not text:
@@ -312,8 +446,9 @@ class MathFormulaProcessor:
         s = self._normalize_superscripts(s)
 
         # (1) Quy tắc regex “công thức” sẵn có (phân số, căn, tích phân, …)
-        for pattern, replacement in self.math_patterns:
-            s = re.sub(pattern, replacement, s)
+        for rx, replacement, trigger in self._math_patterns_rx:
+            if trigger is None or trigger in s:
+                s = rx.sub(replacement, s)
 
         # (1.5) Chèn 'nhân' giữa số–biến, biến–biến… để tránh đọc dính
         s = self._insert_multiplication_reading(s)
@@ -323,23 +458,12 @@ class MathFormulaProcessor:
 
         # (2) Nếu là dòng toán, áp dụng thêm ASCII math patterns ( + - * / = ... )
         if self._is_math_line(s):
-            for rx, repl in self.math_ascii_patterns:
-                s = rx.sub(repl, s)
+            for rx, repl, trigger in self._math_ascii_rx:
+                if trigger is None or trigger in s:
+                    s = rx.sub(repl, s)
 
-        # (3) Bản đồ ký hiệu Unicode + fallback ASCII (tránh '.')
-        ascii_fallbacks = {
-            '+': ' cộng', '-': ' trừ', '=': ' bằng',
-            '/': ' chia', '*': ' nhân', '^': ' mũ ',
-        }
-        merged_map = dict(ascii_fallbacks)
-        merged_map.update(self.special_char_map)
-        for ch, rep in merged_map.items():
-            if ch == '.':
-                continue
-            s = s.replace(ch, rep)
-
-        # (4) Unicode khác
-        s = self._process_unicode_chars(s)
+        # (3)+(4) Bản đồ ký hiệu Unicode + fallback ASCII (tránh '.') và đọc Unicode khác: một lượt translate
+        s = s.translate(self._symbol_table)
 
         # (5) Làm sạch
         s = self._clean_text(s)
@@ -361,8 +485,8 @@ class MathFormulaProcessor:
 
         # Bước 1: Regex
         processed_text = text
-        for pattern, replacement in self.math_patterns:
-            processed_text = re.sub(pattern, replacement, processed_text)
+        for rx, replacement, _ in self._math_patterns_rx:
+            processed_text = rx.sub(replacement, processed_text)
         debug_info['after_regex'] = processed_text
 
         # Bước 2: Ký tự đặc biệt
@@ -383,76 +507,26 @@ class MathFormulaProcessor:
 
     def _process_unicode_chars(self, text: str) -> str:
         """
-        Xử lý các ký tự Unicode khác
+        Xử lý các ký tự Unicode khác (tên Unicode của mỗi ký tự chỉ tra một lần rồi ghi nhớ)
         """
-        processed_chars = []
-
-        for char in text:
-            if ord(char) > 127:  # Ký tự không phải ASCII
-                try:
-                    # Lấy tên Unicode
-                    char_name = unicodedata.name(char)
-
-                    # Xử lý các trường hợp đặc biệt
-                    if 'SUPERSCRIPT' in char_name:
-                        # Số mũ
-                        if char_name.endswith('TWO'):
-                            processed_chars.append(' mũ hai')
-                        elif char_name.endswith('THREE'):
-                            processed_chars.append(' mũ ba')
-                        elif char_name.endswith('ONE'):
-                            processed_chars.append(' mũ một')
-                        else:
-                            # Lấy số từ tên
-                            number = char_name.split()[-1]
-                            processed_chars.append(f' mũ {number}')
-                    elif 'SUBSCRIPT' in char_name:
-                        # Chỉ số dưới
-                        if char_name.endswith('TWO'):
-                            processed_chars.append(' chỉ số hai')
-                        elif char_name.endswith('THREE'):
-                            processed_chars.append(' chỉ số ba')
-                        elif char_name.endswith('ONE'):
-                            processed_chars.append(' chỉ số một')
-                        else:
-                            number = char_name.split()[-1]
-                            processed_chars.append(f' chỉ số {number}')
-                    elif 'GREEK' in char_name:
-                        # Chữ Hy Lạp
-                        greek_name = char_name.split()[-1].lower()
-                        processed_chars.append(f' {greek_name}')
-                    elif 'MATHEMATICAL' in char_name:
-                        # Ký tự toán học
-                        math_name = char_name.split()[-1].lower()
-                        processed_chars.append(f' {math_name}')
-                    else:
-                        # Giữ nguyên ký tự nếu không xử lý được
-                        processed_chars.append(char)
-
-                except ValueError:
-                    # Nếu không lấy được tên Unicode, giữ nguyên
-                    processed_chars.append(char)
-            else:
-                processed_chars.append(char)
-
-        return ''.join(processed_chars)
+        return text.translate(_UNICODE_TABLE)
 
     def _clean_text(self, text: str) -> str:
         """
         Làm sạch văn bản sau khi xử lý
         """
         # Loại bỏ khoảng trắng thừa
-        text = re.sub(r'\s+', ' ', text)
+        text = _RX_SPACES.sub(' ', text)
 
         # Loại bỏ khoảng trắng đầu cuối
         text = text.strip()
 
         # Xử lý các dấu câu - đảm bảo không có khoảng trắng trước dấu câu
-        text = re.sub(r'\s+([.,;:!?])', r'\1', text)
+        text = _RX_SPACE_PUNCT.sub(r'\1', text)
 
         # Xử lý dấu ngoặc - đảm bảo khoảng trắng phù hợp
-        text = re.sub(r'\(\s+', '(', text)
-        text = re.sub(r'\s+\)', ')', text)
+        text = _RX_OPEN_PAREN.sub('(', text)
+        text = _RX_CLOSE_PAREN.sub(')', text)
 
         # KHÔNG xử lý khoảng trắng giữa các từ đã được xử lý
         # Vì có thể làm hỏng các từ như "mũ hai", "chỉ số ba"
@@ -464,36 +538,15 @@ class MathFormulaProcessor:
         Trích xuất các đối tượng toán học từ PowerPoint
         """
         try:
-            from pptx import Presentation
-            from pptx.oxml import parse_xml
-            from pptx.oxml.ns import qn
-
-            prs = Presentation(pptx_file_path)
+            package = PptxPackage(pptx_file_path)
             math_objects = []
 
-            for slide_num, slide in enumerate(prs.slides):
-                slide_math = []
-
-                for shape in slide.shapes:
-                    # Kiểm tra các đối tượng toán học
-                    if hasattr(shape, 'element'):
-                        element = shape.element
-
-                        # Tìm các phần tử toán học
-                        math_elements = element.findall('.//m:oMath', {'m': 'http://schemas.openxmlformats.org/officeDocument/2006/math'})
-
-                        for math_elem in math_elements:
-                            try:
-                                # Chuyển đổi XML thành văn bản
-                                math_text = self._extract_mathml_text(math_elem)
-                                if math_text:
-                                    slide_math.append({
-                                        'type': 'math_object',
-                                        'content': math_text,
-                                        'processed_content': self.process_special_characters(math_text)
-                                    })
-                            except Exception as e:
-                                logger.warning(f"Lỗi xử lý phần tử toán học: {e}")
+            for slide_num, (slide_xml, placeholders) in enumerate(package.slides):
+                slide_math = [{
+                    'type': 'math_object',
+                    'content': math_text,
+                    'processed_content': self.process_special_characters(math_text)
+                } for math_text in parse_slide(slide_xml, placeholders)['math']]
 
                 if slide_math:
                     math_objects.append({
@@ -503,9 +556,6 @@ class MathFormulaProcessor:
 
             return math_objects
 
-        except ImportError:
-            logger.error("Không thể import python-pptx. Vui lòng cài đặt: pip install python-pptx")
-            return []
         except Exception as e:
             logger.error(f"Lỗi trích xuất đối tượng toán học: {e}")
             return []
@@ -515,158 +565,37 @@ class MathFormulaProcessor:
         Trích xuất văn bản từ phần tử MathML
         """
         try:
-            # Chuyển đổi XML thành chuỗi
-            xml_str = ET.tostring(math_element, encoding='unicode')
-
-            # Xử lý các thẻ MathML cơ bản
-            text_parts = []
-
-            # Tìm tất cả các phần tử văn bản
-            for elem in math_element.iter():
-                if elem.text and elem.text.strip():
-                    text_parts.append(elem.text.strip())
-                if elem.tail and elem.tail.strip():
-                    text_parts.append(elem.tail.strip())
-
-            return ' '.join(text_parts)
-
+            return omml_text(math_element)
         except Exception as e:
             logger.warning(f"Lỗi trích xuất MathML: {e}")
             return ""
 
     def process_powerpoint_text(self, pptx_file_path: str) -> Dict:
         """
-        Xử lý toàn bộ văn bản từ PowerPoint, bao gồm cả đối tượng toán học
+        Xử lý toàn bộ văn bản từ PowerPoint, bao gồm cả đối tượng toán học.
+
+        File chỉ được mở một lần (PptxPackage), mỗi slide được đọc XML tuần tự một lượt để lấy
+        cả văn bản, vị trí, bảng lẫn công thức OMML. Deck lớn được chia slide cho nhiều tiến trình.
+        Kết quả được cache theo hash nội dung file nên mở lại cùng một deck không phải đọc lại.
         """
         try:
-            from pptx import Presentation
-
-            prs = Presentation(pptx_file_path)
-            processed_slides: List[Dict] = []
-
-            # Trích xuất đối tượng toán học
-            math_objects = self.extract_math_objects_from_pptx(pptx_file_path)
-            math_dict = {obj['slide_number']: obj['math_objects'] for obj in math_objects}
-
-            for i, slide in enumerate(prs.slides):
-                slide_num = i + 1
-
-                # Thu thập thông tin shape: loại, tọa độ và văn bản. Chia bảng và
-                # các shape khác nhưng vẫn lưu lại vị trí để sắp xếp hợp lý.
-                shapes_info: List[Tuple[str, int, int, str]] = []  # (type, top, left, text)
-                for shape in slide.shapes:
-                    extracted_text = self._extract_text_from_shape(shape)
-                    if not extracted_text:
-                        continue
-                    # loại shape: 'table' hoặc 'text'
-                    try:
-                        is_table = getattr(shape, 'has_table', False)
-                    except Exception:
-                        is_table = False
-                    shape_type = 'table' if is_table else 'text'
-                    top = 0
-                    left = 0
-                    try:
-                        top = int(getattr(shape, 'top', 0))
-                        left = int(getattr(shape, 'left', 0))
-                    except Exception:
-                        pass
-                    shapes_info.append((shape_type, top, left, extracted_text))
-
-                # Phân loại lại: tách bảng và các shape khác (non-table)
-                table_infos = [info for info in shapes_info if info[0] == 'table']
-                non_table_infos = [info for info in shapes_info if info[0] != 'table']
-
-                ordered_texts: List[str] = []
-                # Xử lý non-table shapes: nhóm thành cột, xử lý tiêu đề bên trái trước
-                if non_table_infos:
-                    # Chuyển đổi thành dạng dict để tái sử dụng helpers
-                    items = []
-                    for t, top, left, text in non_table_infos:
-                        items.append({'text': text, 'left': left, 'top': top, 'height': 0})
-                    # Tính median width để ước lượng ngưỡng phân cột
-                    try:
-                        w_med = self._median([s['width'] for s in self._iter_text_shapes_with_pos(slide.shapes) if s.get('width', 0) > 0])
-                    except Exception:
-                        w_med = 0
-                    # Tính col threshold tương tự fallback
-                    col_thr = max(int((w_med or 1) * 0.4), int(prs.slide_width / 80))
-                    cols = self._group_columns(items, col_thr)
-                    cols.sort(key=lambda c: c['x'])
-                    if len(cols) > 1:
-                        # Xác định cột chứa tiêu đề/nội dung chính.
-                        # Nếu chỉ có 2 cột, ưu tiên chọn cột bên trái làm tiêu đề trừ khi cột đó chỉ chứa nhãn số (1–3 ký tự),
-                        # khi đó chọn cột còn lại làm tiêu đề. Nếu có nhiều hơn 2 cột, chọn cột có số phần tử ít nhất.
-                        header_col_idx = 0
-                        if len(cols) == 2:
-                            # Kiểm tra xem tất cả phần tử ở cột 0 có phải là nhãn số hay không
-                            all_numeric_in_col0 = all(
-                                self._is_numeric_badge(item['text']) for item in cols[0]['items']
-                            )
-                            if all_numeric_in_col0:
-                                header_col_idx = 1
-                        elif len(cols) > 2:
-                            # Tìm cột có số phần tử ít nhất
-                            min_count = min(len(c['items']) for c in cols)
-                            candidate_cols = [idx for idx, c in enumerate(cols) if len(c['items']) == min_count]
-                            header_col_idx = candidate_cols[0] if candidate_cols else 0
-                        # Lấy các mục tiêu đề và danh sách
-                        left_col_items = cols[header_col_idx]['items']
-                        right_items: List[Dict] = []
-                        for idx, col in enumerate(cols):
-                            if idx != header_col_idx:
-                                right_items += col['items']
-                        # Sắp xếp theo top cho tiêu đề và danh sách
-                        left_texts = [s['text'] for s in sorted(left_col_items, key=lambda s: s['top'])]
-                        right_sorted = sorted(right_items, key=lambda s: s['top'])
-                        # Nếu danh sách chỉ bao gồm các nhãn số và số nhãn bằng số tiêu đề, ghép cặp chúng
-                        numeric_badges = [item for item in right_sorted if self._is_numeric_badge(item['text'])]
-                        if numeric_badges and len(numeric_badges) == len(right_sorted) == len(left_texts):
-                            ordered_texts = []
-                            for badge_item, left_txt in zip(numeric_badges, left_texts):
-                                ordered_texts.append(f"{badge_item['text']} {left_txt}")
-                        else:
-                            # Ghép nhãn số với mô tả liền sau nó
-                            right_lines: List[str] = []
-                            for item in right_sorted:
-                                txt = item['text']
-                                if self._is_numeric_badge(txt) and right_lines:
-                                    prev = right_lines.pop()
-                                    right_lines.append(f"{txt} {prev}")
-                                else:
-                                    right_lines.append(txt)
-                            ordered_texts = left_texts + right_lines
-                    else:
-                        # Chỉ một cột, sắp xếp theo top
-                        ordered_texts = [s['text'] for s in sorted(cols[0]['items'], key=lambda s: s['top'])]
-                # Thêm bảng (nếu có) vào cuối danh sách
-                for (_, _, _, table_text) in sorted(table_infos, key=lambda x: (x[1], x[2])):
-                    ordered_texts.append(table_text)
-                slide_text = "\n".join(filter(None, ordered_texts))
-
-                # Xử lý văn bản thông thường
-                processed_text = self.process_special_characters(slide_text)
-
-                # Thêm đối tượng toán học nếu có
-                if slide_num in math_dict:
-                    math_texts: List[str] = []
-                    for math_obj in math_dict[slide_num]:
-                        math_texts.append(math_obj['processed_content'])
-                    if math_texts:
-                        processed_text += " " + " ".join(math_texts)
-
-                processed_slides.append({
-                    'slide_number': slide_num,
-                    'original_text': slide_text,
-                    'processed_text': processed_text,
-                    'has_math_objects': slide_num in math_dict
-                })
+            cache_key = self._pptx_cache_key(pptx_file_path)
+            cached = _load_pptx_text(cache_key)
+            if cached is not None:
+                return cached
 
-            return {
+            package = PptxPackage(pptx_file_path)
+            jobs = [(i + 1, slide_xml, placeholders, package.slide_width)
+                    for i, (slide_xml, placeholders) in enumerate(package.slides)]
+            processed_slides = self._process_slide_jobs(jobs)
+
+            result = {
                 'slides': processed_slides,
                 'total_slides': len(processed_slides),
                 'slides_with_math': len([s for s in processed_slides if s['has_math_objects']])
             }
+            _store_pptx_text(cache_key, result)
+            return result
 
         except Exception as e:
             logger.error(f"Lỗi xử lý PowerPoint: {e}")
@@ -677,6 +606,131 @@ class MathFormulaProcessor:
                 'error': str(e)
             }
 
+    def _pptx_cache_key(self, pptx_file_path: str) -> str:
+        # nội dung file + cấu hình bảng đọc ký hiệu (processor tùy biến không dùng chung cache)
+        return f"{file_sha256(pptx_file_path)}_{self._config_digest}_v{PPTX_TEXT_CACHE_VERSION}"
+
+    def _process_slide_jobs(self, jobs: List[Tuple]) -> List[Dict]:
+        """Xử lý tuần tự, hoặc chia cho process pool khi deck đủ lớn để bù chi phí khởi động."""
+        workers = min(os.cpu_count() or 1, len(jobs) // PPTX_SLIDES_PER_WORKER)
+        if len(jobs) >= PPTX_POOL_MIN_SLIDES and workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_slide_worker,
+                                         initargs=(self,)) as pool:
+                    return list(pool.map(_process_slide_job, jobs, chunksize=PPTX_SLIDES_PER_WORKER // 2))
+            except (OSError, BrokenProcessPool) as e:
+                logger.warning(f"Không chạy được process pool ({e}), xử lý tuần tự")
+        return [self._process_slide(slide_num, parse_slide(slide_xml, placeholders), slide_width)
+                for slide_num, slide_xml, placeholders, slide_width in jobs]
+
+    def _process_slide(self, slide_num: int, parsed: Dict, slide_width: int) -> Dict:
+        """Ghép văn bản một slide (đã đọc bằng parse_slide) theo bố cục cột, rồi đọc ký hiệu."""
+        shapes = parsed['shapes']
+
+        # Thu thập thông tin shape: loại, tọa độ và văn bản. Chia bảng và
+        # các shape khác nhưng vẫn lưu lại vị trí để sắp xếp hợp lý.
+        shapes_info: List[Tuple[str, int, int, str]] = []  # (type, top, left, text)
+        for node in shapes:
+            extracted_text = self._extract_text_from_node(node)
+            if not extracted_text:
+                continue
+            # loại shape: 'table' hoặc 'text'
+            shape_type = 'table' if 'table' in node else 'text'
+            top = 0
+            left = 0
+            try:
+                top = int(node['top'])
+                left = int(node['left'])
+            except Exception:
+                pass
+            shapes_info.append((shape_type, top, left, extracted_text))
+
+        # Phân loại lại: tách bảng và các shape khác (non-table)
+        table_infos = [info for info in shapes_info if info[0] == 'table']
+        non_table_infos = [info for info in shapes_info if info[0] != 'table']
+
+        ordered_texts: List[str] = []
+        # Xử lý non-table shapes: nhóm thành cột, xử lý tiêu đề bên trái trước
+        if non_table_infos:
+            # Chuyển đổi thành dạng dict để tái sử dụng helpers
+            items = []
+            for t, top, left, text in non_table_infos:
+                items.append({'text': text, 'left': left, 'top': top, 'height': 0})
+            # Tính median width để ước lượng ngưỡng phân cột
+            try:
+                w_med = self._median([s['width'] for s in self._iter_text_nodes_with_pos(shapes) if s.get('width', 0) > 0])
+            except Exception:
+                w_med = 0
+            # Tính col threshold tương tự fallback
+            col_thr = max(int((w_med or 1) * 0.4), int(slide_width / 80))
+            cols = self._group_columns(items, col_thr)
+            cols.sort(key=lambda c: c['x'])
+            if len(cols) > 1:
+                # Xác định cột chứa tiêu đề/nội dung chính.
+                # Nếu chỉ có 2 cột, ưu tiên chọn cột bên trái làm tiêu đề trừ khi cột đó chỉ chứa nhãn số (1–3 ký tự),
+                # khi đó chọn cột còn lại làm tiêu đề. Nếu có nhiều hơn 2 cột, chọn cột có số phần tử ít nhất.
+                header_col_idx = 0
+                if len(cols) == 2:
+                    # Kiểm tra xem tất cả phần tử ở cột 0 có phải là nhãn số hay không
+                    all_numeric_in_col0 = all(
+                        self._is_numeric_badge(item['text']) for item in cols[0]['items']
+                    )
+                    if all_numeric_in_col0:
+                        header_col_idx = 1
+                elif len(cols) > 2:
+                    # Tìm cột có số phần tử ít nhất
+                    min_count = min(len(c['items']) for c in cols)
+                    candidate_cols = [idx for idx, c in enumerate(cols) if len(c['items']) == min_count]
+                    header_col_idx = candidate_cols[0] if candidate_cols else 0
+                # Lấy các mục tiêu đề và danh sách
+                left_col_items = cols[header_col_idx]['items']
+                right_items: List[Dict] = []
+                for idx, col in enumerate(cols):
+                    if idx != header_col_idx:
+                        right_items += col['items']
+                # Sắp xếp theo top cho tiêu đề và danh sách
+                left_texts = [s['text'] for s in sorted(left_col_items, key=lambda s: s['top'])]
+                right_sorted = sorted(right_items, key=lambda s: s['top'])
+                # Nếu danh sách chỉ bao gồm các nhãn số và số nhãn bằng số tiêu đề, ghép cặp chúng
+                numeric_badges = [item for item in right_sorted if self._is_numeric_badge(item['text'])]
+                if numeric_badges and len(numeric_badges) == len(right_sorted) == len(left_texts):
+                    ordered_texts = []
+                    for badge_item, left_txt in zip(numeric_badges, left_texts):
+                        ordered_texts.append(f"{badge_item['text']} {left_txt}")
+                else:
+                    # Ghép nhãn số với mô tả liền sau nó
+                    right_lines: List[str] = []
+                    for item in right_sorted:
+                        txt = item['text']
+                        if self._is_numeric_badge(txt) and right_lines:
+                            prev = right_lines.pop()
+                            right_lines.append(f"{txt} {prev}")
+                        else:
+                            right_lines.append(txt)
+                    ordered_texts = left_texts + right_lines
+            else:
+                # Chỉ một cột, sắp xếp theo top
+                ordered_texts = [s['text'] for s in sorted(cols[0]['items'], key=lambda s: s['top'])]
+        # Thêm bảng (nếu có) vào cuối danh sách
+        for (_, _, _, table_text) in sorted(table_infos, key=lambda x: (x[1], x[2])):
+            ordered_texts.append(table_text)
+        slide_text = "\n".join(filter(None, ordered_texts))
+
+        # Xử lý văn bản thông thường
+        processed_text = self.process_special_characters(slide_text)
+
+        # Thêm đối tượng toán học nếu có
+        math_texts = [self.process_special_characters(math_text) for math_text in parsed['math']]
+        if math_texts:
+            processed_text += " " + " ".join(math_texts)
+
+        return {
+            'slide_number': slide_num,
+            'original_text': slide_text,
+            'processed_text': processed_text,
+            'has_math_objects': bool(math_texts)
+        }
+
     # ---------- Layout helpers (vị trí/khối) ----------
     def _is_numeric_badge(self, txt: str) -> bool:
         return bool(re.match(r"^\s*\d{1,3}[.)-]?\s*$", (txt or "").strip()))
@@ -688,37 +742,27 @@ class MathFormulaProcessor:
         n = len(vals)
         return vals[n // 2] if n % 2 else (vals[n // 2 - 1] + vals[n // 2]) // 2
 
-    def _iter_text_shapes_with_pos(self, shapes, dx=0, dy=0):
-        for shp in shapes:
-            try:
-                st = getattr(shp, 'shape_type', None)
-            except Exception:
-                st = None
-
-            if MSO_SHAPE_TYPE is not None and st == MSO_SHAPE_TYPE.GROUP:
-                ox, oy = int(getattr(shp, 'left', 0)), int(getattr(shp, 'top', 0))
-                yield from self._iter_text_shapes_with_pos(shp.shapes, dx + ox, dy + oy)
+    def _iter_text_nodes_with_pos(self, nodes, dx=0, dy=0):
+        for node in nodes:
+            if node['kind'] == 'grpSp':
+                ox, oy = int(node['left']), int(node['top'])
+                yield from self._iter_text_nodes_with_pos(node['children'], dx + ox, dy + oy)
                 continue
 
-            # text content
+            # text content (chỉ shape có text frame)
             txt = ''
-            if getattr(shp, 'has_text_frame', False) and getattr(shp, 'text_frame', None) is not None:
-                try:
-                    txt = shp.text_frame.text or ''
-                except Exception:
-                    txt = ''
-            elif getattr(shp, 'text', None):
-                txt = shp.text or ''
-            txt = (txt or '').strip()
+            if node['kind'] == 'sp':
+                txt = '\n'.join(p[2] for p in node['paragraphs'])
+            txt = txt.strip()
             if not txt:
                 continue
 
             yield {
                 'text': txt,
-                'left': int(getattr(shp, 'left', 0)) + dx,
-                'top': int(getattr(shp, 'top', 0)) + dy,
-                'width': int(getattr(shp, 'width', 0)),
-                'height': int(getattr(shp, 'height', 0)),
+                'left': int(node['left']) + dx,
+                'top': int(node['top']) + dy,
+                'width': int(node['width']),
+                'height': int(node['height']),
             }
 
     def _group_columns(self, items, col_thr):
@@ -760,46 +804,30 @@ class MathFormulaProcessor:
             return (badge + ' ' + other_text).strip() if other_text else badge
         return ' '.join(s['text'].strip() for s in row_items if s['text'].strip())
 
-    def _extract_text_from_shape(self, shape) -> str:
+    def _paragraph_text(self, paragraph) -> str:
+        # ghép các run để không mất ký tự; đoạn không có run dùng text đầy đủ (field, xuống dòng)
+        has_runs, run_text, text = paragraph
+        return (run_text or text) if has_runs else text
+
+    def _extract_text_from_node(self, node) -> str:
         """
-        Trích xuất text từ shape. Hỗ trợ: textbox, bảng, group và placeholder.
+        Trích xuất text từ shape (dạng dict của pptx_reader). Hỗ trợ: textbox, bảng, group và placeholder.
         Đệ quy qua group. Ghép paragraphs/runs để không mất ký tự.
         """
         try:
             # Text frame (textbox, placeholder)
-            if getattr(shape, 'has_text_frame', False):
-                parts: List[str] = []
-                tf = shape.text_frame
-                try:
-                    for p in tf.paragraphs:
-                        if getattr(p, 'runs', None):
-                            run_text = ''.join([r.text for r in p.runs if getattr(r, 'text', None)])
-                            parts.append(run_text if run_text else p.text)
-                        else:
-                            parts.append(p.text)
-                except Exception:
-                    if getattr(shape, 'text', None):
-                        parts.append(shape.text)
+            if node['kind'] == 'sp':
+                parts = [self._paragraph_text(p) for p in node['paragraphs']]
                 return self._clean_text(' '.join([t for t in parts if t]))
 
             # Table - đọc từ trái qua phải, từ trên xuống dưới
-            if getattr(shape, 'has_table', False):
+            if 'table' in node:
                 table_texts: List[str] = []
-                for row in shape.table.rows:
+                for row in node['table']:
                     row_texts: List[str] = []
-                    for cell in row.cells:
-                        cell_text = ""
-                        if getattr(cell, 'text_frame', None):
-                            cell_parts: List[str] = []
-                            for p in cell.text_frame.paragraphs:
-                                if getattr(p, 'runs', None):
-                                    run_text = ''.join([r.text for r in p.runs if getattr(r, 'text', None)])
-                                    cell_parts.append(run_text if run_text else p.text)
-                                else:
-                                    cell_parts.append(p.text)
-                            cell_text = ' '.join(cell_parts) if cell_parts else ""
-                        elif getattr(cell, 'text', None):
-                            cell_text = cell.text
+                    for cell in row:
+                        cell_parts = [self._paragraph_text(p) for p in cell]
+                        cell_text = ' '.join(cell_parts) if cell_parts else ""
                         if cell_text.strip():
                             row_texts.append(cell_text.strip())
                     if row_texts:
@@ -807,29 +835,85 @@ class MathFormulaProcessor:
                 return '\n'.join(table_texts)
 
             # Group: traverse children
-            if getattr(shape, 'shapes', None) is not None and getattr(shape, 'shape_type', None) is not None and 'GROUP' in str(shape.shape_type):
+            if node['kind'] == 'grpSp':
                 sub_texts: List[str] = []
-                for sub in shape.shapes:
-                    t = self._extract_text_from_shape(sub)
+                for sub in node['children']:
+                    t = self._extract_text_from_node(sub)
                     if t:
                         sub_texts.append(t)
                 return self._clean_text(' '.join(sub_texts))
-
-            # Fallback
-            if getattr(shape, 'text', None):
-                return self._clean_text(shape.text)
         except Exception as e:
-            logger.debug(f"_extract_text_from_shape error: {e}")
+            logger.debug(f"_extract_text_from_node error: {e}")
         return ''
 
 
+# ---------- Cache văn bản PPTX theo hash file ----------
+_pptx_text_memory = OrderedDict()
+_PPTX_TEXT_MEMORY_SIZE = 8
+
+
+def _pptx_text_path(key: str) -> str:
+    return os.path.join(os.environ.get('PPTX_TEXT_CACHE_DIR', './cache/pptx_text'), key + '.json')
+
+
+def _load_pptx_text(key: str) -> Optional[Dict]:
+    """Bản sao kết quả đã cache (bộ nhớ trước, rồi đĩa), None nếu chưa có."""
+    data = _pptx_text_memory.get(key)
+    if data is None:
+        try:
+            with open(_pptx_text_path(key), 'r', encoding='utf-8') as f:
+                data = f.read()
+        except OSError:
+            return None
+    _pptx_text_memory[key] = data
+    _pptx_text_memory.move_to_end(key)
+    while len(_pptx_text_memory) > _PPTX_TEXT_MEMORY_SIZE:
+        _pptx_text_memory.popitem(last=False)
+    return json.loads(data)
+
+
+def _store_pptx_text(key: str, result: Dict):
+    data = json.dumps(result, ensure_ascii=False)
+    _pptx_text_memory[key] = data
+    while len(_pptx_text_memory) > _PPTX_TEXT_MEMORY_SIZE:
+        _pptx_text_memory.popitem(last=False)
+    path = _pptx_text_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Không ghi được cache văn bản PPTX: {e}")
+
+
+# ---------- Worker cho process pool ----------
+_slide_worker_processor = None
+
+
+def _init_slide_worker(processor):
+    global _slide_worker_processor
+    _slide_worker_processor = processor
+
+
+def _process_slide_job(job):
+    slide_num, slide_xml, placeholders, slide_width = job
+    return _slide_worker_processor._process_slide(slide_num, parse_slide(slide_xml, placeholders), slide_width)
+
+
 # Hàm tiện ích để sử dụng nhanh
+_default_processor = None
+
+
 def process_math_text(text: str) -> str:
     """
     Hàm tiện ích để xử lý nhanh văn bản chứa công thức toán học
     """
-    processor = MathFormulaProcessor()
-    return processor.process_special_characters(text)
+    global _default_processor
+    if _default_processor is None:
+        _default_processor = MathFormulaProcessor()
+    return _default_processor.process_special_characters(text)
 
 
 def process_powerpoint_file(pptx_file_path: str) -> Dict:
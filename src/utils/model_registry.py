@@ -0,0 +1,179 @@
+import gc
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import torch
+
+from src.utils.preprocess import CropAndExtract
+from src.test_audio2coeff import Audio2Coeff
+from src.facerender.animate import AnimateFromCoeff
+from src.utils.init_path import init_path
+
+
+def preprocess_family(preprocess):
+    """init_path only distinguishes `full` (still facerender + mapping_00109) from the crop-like modes."""
+    return 'full' if 'full' in preprocess else 'crop'
+
+
+def module_nbytes(module):
+    """Bytes held by the parameters and buffers of an nn.Module (0 for anything else)."""
+    if not isinstance(module, torch.nn.Module):
+        return 0
+    total = 0
+    for t in list(module.parameters()) + list(module.buffers()):
+        total += t.numel() * t.element_size()
+    return total
+
+
+def module_report(name, module, depth=0):
+    """[(name, bytes)] of module and, `depth` levels down, of each child module ('audio2pose.netG', ...)."""
+    report = [(name, module_nbytes(module))]
+    if depth > 0 and isinstance(module, torch.nn.Module):
+        for child_name, child in module.named_children():
+            report += module_report(name + '.' + child_name, child, depth - 1)
+    return report
+
+
+class SadTalkerModels():
+    """
+    The three model groups used by SadTalker.test() for one (size, preprocess family, old_version).
+    inference_only -- do not build the training-only submodules (Audio2Pose discriminator and CVAE
+                      encoder, HEEstimator)
+    """
+
+    def __init__(self, sadtalker_paths, device, inference_only=True):
+        self.sadtalker_paths = sadtalker_paths
+        self.device = device
+
+        self.audio_to_coeff = Audio2Coeff(sadtalker_paths, device, inference_only=inference_only)
+        self.preprocess_model = CropAndExtract(sadtalker_paths, device)
+        self.animate_from_coeff = AnimateFromCoeff(sadtalker_paths, device, inference_only=inference_only)
+
+        self.lock = threading.Lock()
+        self.nbytes = sum(nbytes for _, nbytes in self.memory_report())
+
+    def memory_report(self, depth=0):
+        """
+        List of (component name, bytes) for every torch module owned by this bundle; components that
+        were not built are left out. depth > 0 also lists their submodules.
+        """
+        components = [
+            ('net_recon', self.preprocess_model.net_recon),
+            ('audio2pose', self.audio_to_coeff.audio2pose_model),
+            ('audio2exp', self.audio_to_coeff.audio2exp_model),
+            ('generator', self.animate_from_coeff.generator),
+            ('kp_extractor', self.animate_from_coeff.kp_extractor),
+            ('he_estimator', self.animate_from_coeff.he_estimator),
+            ('mapping', self.animate_from_coeff.mapping),
+        ]
+        report = []
+        for name, module in components:
+            if module is not None:
+                report += module_report(name, module, depth)
+        return report
+
+
+class ModelRegistry():
+    """
+    Process-wide LRU cache of warm SadTalkerModels.
+
+    max_entries      -- how many configurations are kept loaded at once
+    memory_budget_mb -- optional cap on the summed weight size of all cached configurations
+    """
+
+    def __init__(self, max_entries=2, memory_budget_mb=None):
+        self.max_entries = max_entries
+        self.memory_budget_mb = memory_budget_mb
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries=None, memory_budget_mb=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if memory_budget_mb is not None:
+                self.memory_budget_mb = memory_budget_mb
+            self._evict()
+
+    def key(self, checkpoint_path, config_path, size, preprocess, old_version, device):
+        return (checkpoint_path, config_path, int(size), preprocess_family(preprocess), bool(old_version), str(device))
+
+    def get(self, checkpoint_path, config_path, size=256, preprocess='crop', old_version=False, device='cpu'):
+        """Return the cached models for this configuration, loading them on a miss."""
+        key = self.key(checkpoint_path, config_path, size, preprocess, old_version, device)
+        with self._lock:
+            models = self._entries.get(key)
+            if models is not None:
+                self._entries.move_to_end(key)
+                return models
+
+        # load outside of the registry lock so that other configurations stay usable meanwhile
+        sadtalker_paths = init_path(checkpoint_path, config_path, size, old_version, preprocess)
+        models = SadTalkerModels(sadtalker_paths, device)
+
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                # another thread finished loading the same configuration first
+                self._entries.move_to_end(key)
+                return existing
+            self._entries[key] = models
+            self._evict(keep=key)
+        return models
+
+    @contextmanager
+    def borrow(self, checkpoint_path, config_path, size=256, preprocess='crop', old_version=False, device='cpu'):
+        """Hold a configuration exclusively for the duration of one generation."""
+        models = self.get(checkpoint_path, config_path, size, preprocess, old_version, device)
+        with models.lock:
+            yield models
+
+    def total_nbytes(self):
+        return sum(models.nbytes for models in self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._release_memory()
+
+    def _over_budget(self):
+        if len(self._entries) > self.max_entries:
+            return True
+        if self.memory_budget_mb is not None:
+            return self.total_nbytes() > self.memory_budget_mb * 1024 * 1024
+        return False
+
+    def _evict(self, keep=None):
+        evicted = False
+        while self._over_budget() and len(self._entries) > 1:
+            victim = None
+            for key, models in self._entries.items():
+                # never drop the entry that was just requested or one that is currently borrowed
+                if key != keep and not models.lock.locked():
+                    victim = key
+                    break
+            if victim is None:
+                break
+            print('model registry: evicting', victim)
+            del self._entries[victim]
+            evicted = True
+        if evicted:
+            self._release_memory()
+
+    def _release_memory(self):
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
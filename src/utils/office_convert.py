@@ -0,0 +1,259 @@
+import os
+import sys
+import glob
+import json
+import importlib.util
+import time
+import shutil
+import socket
+import atexit
+import tempfile
+import threading
+import subprocess
+
+from src.utils.file_hash import file_sha256
+
+
+SLIDE_WIDTH = 1920      # the lecture is composed at the slide size, so slides are rasterized for 1080p
+CLIENT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uno_convert.py')
+
+
+def _has_uno(python):
+    try:
+        return subprocess.run([python, '-c', 'import uno'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              timeout=60).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+class OfficeWorker():
+    """
+    One long-lived headless LibreOffice that converts documents to PDF over a local UNO socket.
+
+    The process (and its user profile) is started on the first job, or by warm_up(), and reused
+    afterwards, so only the first upload pays the LibreOffice start-up. Jobs are serialized, since
+    one soffice instance converts one document at a time.
+
+    The UNO side runs in a persistent uno_convert.py client under a python that can `import uno`:
+    $LIBREOFFICE_PYTHON, this interpreter, or the python bundled with LibreOffice (for an AppImage,
+    inside its --appimage-mount). Without one, every job falls back to a one-shot
+    `soffice --convert-to pdf` that pays the cold start and only reuses the warm profile.
+
+    A conversion without a reply within convert_timeout (a broken deck, a modal dialog) stops the
+    worker and is retried once with --convert-to under the same deadline.
+    """
+
+    def __init__(self, soffice, port=2002, profile_dir=None, start_timeout=60, convert_timeout=300):
+        self.soffice = soffice
+        self.port = port
+        self.profile_dir = os.path.abspath(profile_dir or os.path.join(tempfile.gettempdir(), f'lo_profile_{port}'))
+        self.start_timeout = start_timeout
+        self.convert_timeout = convert_timeout
+        self.process = None
+        self.client = None
+        self._mount = None
+        self._lock = threading.Lock()
+        self.python = self._find_uno_python()
+        if self.python is None:
+            print(f"⚠️ LibreOffice worker: no python with the UNO bridge for {soffice} (set LIBREOFFICE_PYTHON); "
+                  f"every conversion falls back to a one-shot `soffice --convert-to` with a cold start")
+        else:
+            print(f"LibreOffice worker: persistent soffice on port {port}, UNO client on {self.python}")
+
+    def _find_uno_python(self):
+        override = os.environ.get('LIBREOFFICE_PYTHON')
+        if override:
+            return override
+        if importlib.util.find_spec('uno') is not None:
+            return sys.executable
+        if self.soffice.lower().endswith('.appimage'):
+            # the bundled python is only reachable while the AppImage is mounted
+            try:
+                self._mount = subprocess.Popen([self.soffice, '--appimage-mount'], stdout=subprocess.PIPE,
+                                               stderr=subprocess.DEVNULL, text=True, start_new_session=True)
+            except OSError:
+                return None
+            root = self._mount.stdout.readline().strip()
+            candidates = sorted(glob.glob(os.path.join(root, 'opt', '*', 'program', 'python'))) if root else []
+        else:
+            program_dir = os.path.dirname(os.path.realpath(shutil.which(self.soffice) or self.soffice))
+            candidates = [os.path.join(program_dir, 'python')]
+        for python in candidates:
+            if os.path.isfile(python) and _has_uno(python):
+                return python
+        self._unmount()
+        return None
+
+    def _profile_arg(self):
+        return '-env:UserInstallation=file://' + self.profile_dir.replace(os.sep, '/')
+
+    def _port_open(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.settimeout(0.5)
+            return s.connect_ex(('127.0.0.1', self.port)) == 0
+
+    def _start(self):
+        if self.process is None or self.process.poll() is not None:
+            self._stop_client()
+            self.process = subprocess.Popen(
+                [self.soffice, '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', self._profile_arg(),
+                 f'--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext'],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+            deadline = time.time() + self.start_timeout
+            while not self._port_open():
+                if self.process.poll() is not None or time.time() > deadline:
+                    self.stop()
+                    raise RuntimeError("LibreOffice worker did not start")
+                time.sleep(0.2)
+        if self.client is None or self.client.poll() is not None:
+            self.client = subprocess.Popen([self.python, CLIENT_SCRIPT, str(self.port)], stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE, text=True, start_new_session=True)
+
+    def warm_up(self):
+        """Start soffice and the UNO client in the background, so the first upload does not wait for them."""
+        def start():
+            with self._lock:
+                try:
+                    self._start()
+                except Exception as e:
+                    print(f"⚠️ LibreOffice worker failed to start ({e})")
+        if self.python is not None:
+            threading.Thread(target=start, name='office-warm-up', daemon=True).start()
+
+    def _convert_uno(self, src, pdf_path):
+        self._start()
+        self.client.stdin.write(json.dumps({'src': os.path.abspath(src), 'pdf': os.path.abspath(pdf_path)}) + '\n')
+        self.client.stdin.flush()
+        # read the reply in a thread: readline() has no timeout and a hung soffice would hold the lock forever
+        reply = []
+        reader = threading.Thread(target=lambda stdout=self.client.stdout: reply.append(stdout.readline()), daemon=True)
+        reader.start()
+        reader.join(self.convert_timeout)
+        if reader.is_alive():
+            self.stop()     # kills the client, the reader thread ends at EOF
+            raise TimeoutError(f"no reply from LibreOffice after {self.convert_timeout}s")
+        reply = reply[0] if reply else ''
+        if not reply:
+            raise RuntimeError("UNO client exited")
+        reply = json.loads(reply)
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+
+    def _convert_cli(self, src, pdf_path):
+        outdir = os.path.dirname(os.path.abspath(pdf_path))
+        subprocess.run([self.soffice, '--headless', '--norestore', self._profile_arg(),
+                        '--convert-to', 'pdf', '--outdir', outdir, src],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=self.convert_timeout)
+        produced = os.path.join(outdir, os.path.splitext(os.path.basename(src))[0] + '.pdf')
+        if os.path.abspath(produced) != os.path.abspath(pdf_path):
+            shutil.move(produced, pdf_path)
+
+    def to_pdf(self, src, pdf_path):
+        with self._lock:
+            if self.python is None:
+                self._convert_cli(src, pdf_path)
+                return pdf_path
+            try:
+                self._convert_uno(src, pdf_path)
+            except TimeoutError as e:
+                # the same deck would hang a restarted worker again: one-shot conversion instead
+                print(f"⚠️ LibreOffice worker timed out ({e}), converting with --convert-to")
+                self._convert_cli(src, pdf_path)
+            except Exception as e:
+                # soffice or the bridge died: restart both once, then give up on this job
+                print(f"⚠️ LibreOffice worker failed ({e}), restarting")
+                self.stop()
+                self._convert_uno(src, pdf_path)
+        return pdf_path
+
+    def _stop_client(self):
+        if self.client is not None and self.client.poll() is None:
+            self.client.stdin.close()
+            try:
+                self.client.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.client.kill()
+        self.client = None
+
+    def _unmount(self):
+        if self._mount is not None and self._mount.poll() is None:
+            self._mount.terminate()
+        self._mount = None
+
+    def stop(self):
+        # soffice first: a client blocked in a UNO call then fails and exits at the closed stdin
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+        self._stop_client()
+
+    def close(self):
+        self.stop()
+        self._unmount()
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_office_worker(soffice):
+    with _workers_lock:
+        worker = _workers.get(soffice)
+        if worker is None:
+            worker = OfficeWorker(soffice, port=int(os.environ.get('LIBREOFFICE_PORT', 2002)))
+            atexit.register(worker.close)
+            _workers[soffice] = worker
+        return worker
+
+
+def rasterize_pdf(pdf_path, out_dir, width=SLIDE_WIDTH, threads=None):
+    """
+    PDF pages -> out_dir/slide-XX.png at the given pixel width (pdftoppm picks the DPI), split over
+    `threads` pdftoppm processes. pdftoppm writes the PNGs itself, nothing is re-encoded in Python.
+    """
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    pages = int(pdfinfo_from_path(pdf_path).get('Pages', 1))
+    threads = max(1, min(threads or os.cpu_count() or 1, pages))
+    paths = convert_from_path(pdf_path, size=(width, None), output_folder=out_dir, fmt='png',
+                              output_file='page', paths_only=True, thread_count=threads)
+    out = []
+    for i, p in enumerate(sorted(paths), 1):
+        dst = os.path.join(out_dir, f'slide-{i:02d}.png')
+        os.replace(p, dst)
+        out.append(dst)
+    return out
+
+
+def convert_pptx_to_images(pptx_path, soffice, width=SLIDE_WIDTH, threads=None, cache_root=None):
+    """
+    PPTX -> one PNG per slide, cached under cache_root/<sha256>_<width>/ so reopening the same deck
+    is only a hash. The PNGs are shared by later calls; callers must not modify or delete them.
+    """
+    cache_root = cache_root or os.environ.get('SLIDE_CACHE_DIR', './cache/slides')
+    cache_dir = os.path.abspath(os.path.join(cache_root, f'{file_sha256(pptx_path)}_{width}'))
+    done = os.path.join(cache_dir, 'pages.txt')
+    if os.path.isfile(done):
+        with open(done, 'r', encoding='utf-8') as f:
+            paths = [os.path.join(cache_dir, name) for name in f.read().split()]
+        if all(os.path.isfile(p) for p in paths):
+            return paths
+
+    os.makedirs(cache_root, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='pptx2img_', dir=cache_root)
+    try:
+        pdf_path = os.path.join(work, 'deck.pdf')
+        get_office_worker(soffice).to_pdf(pptx_path, pdf_path)
+        paths = rasterize_pdf(pdf_path, work, width=width, threads=threads)
+        os.remove(pdf_path)
+        with open(os.path.join(work, 'pages.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(os.path.basename(p) for p in paths))
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.move(work, cache_dir)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return [os.path.join(cache_dir, os.path.basename(p)) for p in paths]
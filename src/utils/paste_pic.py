@@ -5,8 +5,48 @@ import uuid
 
 from src.utils.videoio import save_video_with_watermark 
 
-def paste_pic(video_path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop=False):
+class PicPaster():
+    """
+    Paste rendered face crops (BGR, uint8) back into the original picture one frame at a time.
+    With output_width the picture and the face region are downscaled first, so a frame that is
+    only shown small is never cloned at full resolution.
+    """
+
+    def __init__(self, pic_path, crop_info, extended_crop=False, output_width=None):
+        self.full_img = load_first_frame(pic_path)
+        self.region = paste_region(crop_info, extended_crop)
+        h, w = self.full_img.shape[:2]
+        if output_width and output_width < w and self.region is not None:
+            scale = output_width / float(w)
+            self.full_img = cv2.resize(self.full_img, (output_width, max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+            self.region = tuple(int(round(v * scale)) for v in self.region)
+
+    def paste(self, crop_frame):
+        ox1, oy1, ox2, oy2 = self.region
+        p = cv2.resize(crop_frame.astype(np.uint8), (ox2-ox1, oy2 - oy1)) 
+
+        mask = 255*np.ones(p.shape, p.dtype)
+        location = ((ox1+ox2) // 2, (oy1+oy2) // 2)
+        return cv2.seamlessClone(p, self.full_img, mask, location, cv2.NORMAL_CLONE)
 
+def paste_region(crop_info, extended_crop=False):
+    """(ox1, oy1, ox2, oy2) of the face in the original picture, or None if the picture was not cropped."""
+    if len(crop_info) != 3:
+        return None
+    r_w, r_h = crop_info[0]
+    clx, cly, crx, cry = crop_info[1]
+    lx, ly, rx, ry = crop_info[2]
+    lx, ly, rx, ry = int(lx), int(ly), int(rx), int(ry)
+    # oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
+    # oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
+
+    if extended_crop:
+        oy1, oy2, ox1, ox2 = cly, cry, clx, crx
+    else:
+        oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
+    return ox1, oy1, ox2, oy2
+
+def load_first_frame(pic_path):
     if not os.path.isfile(pic_path):
         raise ValueError('pic_path must be a valid path to video/image file')
     elif pic_path.split('.')[-1] in ['jpg', 'png', 'jpeg']:
@@ -24,8 +64,16 @@ def paste_pic(video_path, pic_path, crop_info, new_audio_path, full_video_path,
                 break 
             break 
         full_img = frame
-    frame_h = full_img.shape[0]
-    frame_w = full_img.shape[1]
+    return full_img
+
+def paste_pic(video_path, pic_path, crop_info, new_audio_path, full_video_path, extended_crop=False):
+
+    if paste_region(crop_info, extended_crop) is None:
+        print("you didn't crop the image")
+        return
+    paster = PicPaster(pic_path, crop_info, extended_crop)
+    frame_h = paster.full_img.shape[0]
+    frame_w = paster.full_img.shape[1]
 
     video_stream = cv2.VideoCapture(video_path)
     fps = video_stream.get(cv2.CAP_PROP_FPS)
@@ -36,32 +84,11 @@ def paste_pic(video_path, pic_path, crop_info, new_audio_path, full_video_path,
             video_stream.release()
             break
         crop_frames.append(frame)
-    
-    if len(crop_info) != 3:
-        print("you didn't crop the image")
-        return
-    else:
-        r_w, r_h = crop_info[0]
-        clx, cly, crx, cry = crop_info[1]
-        lx, ly, rx, ry = crop_info[2]
-        lx, ly, rx, ry = int(lx), int(ly), int(rx), int(ry)
-        # oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
-        # oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
-
-        if extended_crop:
-            oy1, oy2, ox1, ox2 = cly, cry, clx, crx
-        else:
-            oy1, oy2, ox1, ox2 = cly+ly, cly+ry, clx+lx, clx+rx
 
     tmp_path = str(uuid.uuid4())+'.mp4'
     out_tmp = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'MP4V'), fps, (frame_w, frame_h))
     for crop_frame in tqdm(crop_frames, 'seamlessClone:'):
-        p = cv2.resize(crop_frame.astype(np.uint8), (ox2-ox1, oy2 - oy1)) 
-
-        mask = 255*np.ones(p.shape, p.dtype)
-        location = ((ox1+ox2) // 2, (oy1+oy2) // 2)
-        gen_img = cv2.seamlessClone(p, full_img, mask, location, cv2.NORMAL_CLONE)
-        out_tmp.write(gen_img)
+        out_tmp.write(paster.paste(crop_frame))
 
     out_tmp.release()
 
@@ -0,0 +1,218 @@
+import io
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+
+
+NS = {
+    'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
+    'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
+    'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'm': 'http://schemas.openxmlformats.org/officeDocument/2006/math',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+TABLE_URI = 'http://schemas.openxmlformats.org/drawingml/2006/table'
+
+
+def _qn(tag):
+    prefix, name = tag.split(':')
+    return '{%s}%s' % (NS[prefix], name)
+
+
+# shape elements python-pptx exposes in slide.shapes (mc:AlternateContent and others are skipped)
+_SHAPE_KINDS = {_qn('p:sp'): 'sp', _qn('p:grpSp'): 'grpSp', _qn('p:graphicFrame'): 'graphicFrame',
+                _qn('p:cxnSp'): 'cxnSp', _qn('p:pic'): 'pic', _qn('p:contentPart'): 'contentPart'}
+_SP_TREE = _qn('p:spTree')
+
+# layout placeholder type -> master placeholder type it inherits position/size from
+_MASTER_PH_TYPE = {'ctrTitle': 'title', 'title': 'title', 'dt': 'dt', 'ftr': 'ftr', 'sldNum': 'sldNum'}
+
+
+def _xfrm(elem, kind):
+    if kind == 'graphicFrame':
+        return elem.find('p:xfrm', NS)
+    if kind == 'grpSp':
+        return elem.find('p:grpSpPr/a:xfrm', NS)
+    return elem.find('p:spPr/a:xfrm', NS)
+
+
+def _geometry(elem, kind):
+    """[left, top, width, height] in EMU, None where the shape does not define it."""
+    xfrm = _xfrm(elem, kind)
+    off = xfrm.find('a:off', NS) if xfrm is not None else None
+    ext = xfrm.find('a:ext', NS) if xfrm is not None else None
+
+    def val(node, attr):
+        return int(node.get(attr)) if node is not None and node.get(attr) is not None else None
+    return [val(off, 'x'), val(off, 'y'), val(ext, 'cx'), val(ext, 'cy')]
+
+
+def _ph(elem):
+    for path in ('p:nvSpPr/p:nvPr/p:ph', 'p:nvPicPr/p:nvPr/p:ph', 'p:nvGraphicFramePr/p:nvPr/p:ph'):
+        ph = elem.find(path, NS)
+        if ph is not None:
+            return ph
+    return None
+
+
+def _paragraph(p):
+    """(has_runs, text of the runs, paragraph text incl. fields and line breaks) like python-pptx."""
+    runs = p.findall('a:r', NS)
+    run_text = ''.join(r.findtext('a:t', '', NS) or '' for r in runs)
+    parts = []
+    for child in p:
+        if child.tag == _qn('a:br'):
+            parts.append('\v')
+        elif child.tag in (_qn('a:r'), _qn('a:fld')):
+            parts.append(child.findtext('a:t', '', NS) or '')
+    return (bool(runs), run_text, ''.join(parts))
+
+
+def omml_text(math_elem):
+    """Text and tails of every element under an m:oMath, stripped and space-joined."""
+    parts = []
+    for elem in math_elem.iter():
+        if elem.text and elem.text.strip():
+            parts.append(elem.text.strip())
+        if elem.tail and elem.tail.strip():
+            parts.append(elem.tail.strip())
+    return ' '.join(parts)
+
+
+def shape_node(elem, placeholders=None):
+    """
+    Plain-dict (picklable) view of one shape element:
+    kind, left/top/width/height, paragraphs (p:sp), table rows of cells of paragraphs
+    (table graphicFrame), children (group). Slide placeholders missing a position take it from
+    `placeholders` (idx -> geometry of the layout placeholder), as python-pptx does.
+    """
+    kind = _SHAPE_KINDS[elem.tag]
+    geometry = _geometry(elem, kind)
+    if placeholders is not None and kind == 'sp' and None in geometry:
+        ph = _ph(elem)
+        if ph is not None:
+            base = placeholders.get(int(ph.get('idx', 0)))
+            if base is not None:
+                geometry = [own if own is not None else inherited for own, inherited in zip(geometry, base)]
+    node = {'kind': kind, 'left': geometry[0], 'top': geometry[1], 'width': geometry[2], 'height': geometry[3]}
+
+    if kind == 'sp':
+        node['paragraphs'] = [_paragraph(p) for p in elem.iterfind('p:txBody/a:p', NS)]
+    elif kind == 'graphicFrame':
+        data = elem.find('a:graphic/a:graphicData', NS)
+        if data is not None and data.get('uri') == TABLE_URI:
+            node['table'] = [[[_paragraph(p) for p in tc.iterfind('a:txBody/a:p', NS)]
+                              for tc in tr.iterfind('a:tc', NS)]
+                             for tr in data.iterfind('a:tbl/a:tr', NS)]
+    elif kind == 'grpSp':
+        node['children'] = [shape_node(child) for child in elem if child.tag in _SHAPE_KINDS]
+    return node
+
+
+def parse_slide(xml_bytes, placeholders=None):
+    """
+    Stream one slide part: every top-level shape of the spTree is converted when its end tag is
+    read and then cleared, so a slide is never held as a full tree. Returns
+    {'shapes': [node, ...], 'math': [text of each m:oMath, in shape order]}.
+    """
+    shapes, math = [], []
+    stack = []
+    for event, elem in ET.iterparse(io.BytesIO(xml_bytes), events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if stack and stack[-1].tag == _SP_TREE and elem.tag in _SHAPE_KINDS:
+            shapes.append(shape_node(elem, placeholders))
+            for m in elem.iterfind('.//m:oMath', NS):
+                text = omml_text(m)
+                if text:
+                    math.append(text)
+            elem.clear()
+    return {'shapes': shapes, 'math': math}
+
+
+class PptxPackage():
+    """
+    One read of a .pptx: the zip is opened once and the parts needed for text extraction
+    (presentation, slides in deck order, their layouts and masters) are kept as bytes.
+    """
+
+    def __init__(self, path):
+        with zipfile.ZipFile(path) as zf:
+            self._names = set(zf.namelist())
+            self._zf = zf
+            self._parts = {}
+            pres = ET.fromstring(self._read('ppt/presentation.xml'))
+            size = pres.find('p:sldSz', NS)
+            self.slide_width = int(size.get('cx')) if size is not None else None
+
+            pres_rels = self._rels('ppt/presentation.xml')
+            slide_names = [pres_rels.get(sid.get(_qn('r:id')))
+                           for sid in pres.iterfind('p:sldIdLst/p:sldId', NS)]
+            self.slides = []
+            self._layout_cache = {}
+            for name in slide_names:
+                if not name or name not in self._names:
+                    continue
+                layout = self._rels(name, '/slideLayout')
+                self.slides.append((self._read(name), self._layout_placeholders(layout)))
+        self._zf = None
+        self._parts = {}
+
+    def _read(self, name):
+        if name not in self._parts:
+            self._parts[name] = self._zf.read(name)
+        return self._parts[name]
+
+    def _rels(self, part, rel_type=None):
+        """rId -> part name, or the first target of rel_type when given."""
+        base, fname = posixpath.split(part)
+        rels_name = posixpath.join(base, '_rels', fname + '.rels')
+        targets = {}
+        if rels_name not in self._names:
+            return None if rel_type else targets
+        for rel in ET.fromstring(self._read(rels_name)).iterfind('rel:Relationship', NS):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            name = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(base, target))
+            if rel_type:
+                if rel.get('Type', '').endswith(rel_type):
+                    return name
+            else:
+                targets[rel.get('Id')] = name
+        return None if rel_type else targets
+
+    def _placeholder_elems(self, part):
+        root = ET.fromstring(self._read(part))
+        tree = root.find('p:cSld/p:spTree', NS)
+        for elem in (tree if tree is not None else []):
+            kind = _SHAPE_KINDS.get(elem.tag)
+            ph = _ph(elem) if kind else None
+            if ph is not None:
+                yield elem, kind, ph
+
+    def _layout_placeholders(self, layout):
+        """idx -> effective [left, top, width, height] of the layout's placeholders (master fills gaps)."""
+        if not layout or layout not in self._names:
+            return {}
+        if layout in self._layout_cache:
+            return self._layout_cache[layout]
+        master = {}
+        master_name = self._rels(layout, '/slideMaster')
+        if master_name and master_name in self._names:
+            for elem, kind, ph in self._placeholder_elems(master_name):
+                master.setdefault(ph.get('type', 'obj'), _geometry(elem, kind))
+        placeholders = {}
+        for elem, kind, ph in self._placeholder_elems(layout):
+            idx = int(ph.get('idx', 0))
+            if idx in placeholders:
+                continue
+            geometry = _geometry(elem, kind)
+            base = master.get(_MASTER_PH_TYPE.get(ph.get('type', 'obj'), 'body'))
+            if base is not None:
+                geometry = [own if own is not None else inherited for own, inherited in zip(geometry, base)]
+            placeholders[idx] = geometry
+        self._layout_cache[layout] = placeholders
+        return placeholders
@@ -4,8 +4,6 @@ from tqdm import tqdm
 from PIL import Image 
 
 # 3dmm extraction
-import safetensors
-import safetensors.torch 
 from src.face3d.util.preprocess import align_img
 from src.face3d.util.load_mats import load_lm3d
 from src.face3d.models import networks
@@ -16,7 +14,8 @@ from src.utils.croper import Preprocesser
 
 import warnings
 
-from src.utils.safetensor_helper import load_x_from_safetensor 
+from src.utils.safetensor_helper import open_safetensor
+from src.utils.inference_build import load_checkpoint_module
 warnings.filterwarnings("ignore")
 
 def split_coeff(coeffs):
@@ -50,8 +49,8 @@ class CropAndExtract():
         self.net_recon = networks.define_net_recon(net_recon='resnet50', use_last_fc=False, init_path='').to(device)
         
         if sadtalker_path['use_safetensor']:
-            checkpoint = safetensors.torch.load_file(sadtalker_path['checkpoint'])    
-            self.net_recon.load_state_dict(load_x_from_safetensor(checkpoint, 'face_3drecon'))
+            checkpoint = open_safetensor(sadtalker_path['checkpoint'])
+            load_checkpoint_module(self.net_recon, checkpoint, 'face_3drecon')
         else:
             checkpoint = torch.load(sadtalker_path['path_of_net_recon_model'], map_location=torch.device(device))    
             self.net_recon.load_state_dict(checkpoint['net_recon'])
@@ -60,7 +59,7 @@ class CropAndExtract():
         self.lm3d_std = load_lm3d(sadtalker_path['dir_of_BFM_fitting'])
         self.device = device
     
-    def generate(self, input_path, save_dir, crop_or_resize='crop', source_image_flag=False, pic_size=256):
+    def generate(self, input_path, save_dir, crop_or_resize='crop', source_image_flag=False, pic_size=256, avatar=None):
 
         pic_name = os.path.splitext(os.path.split(input_path)[-1])[0]  
 
@@ -68,6 +67,13 @@ class CropAndExtract():
         coeff_path =  os.path.join(save_dir, pic_name+'.mat')  
         png_path =  os.path.join(save_dir, pic_name+'.png')  
 
+        # avatar: AvatarBundle of this image, skips detection, landmarks and 3dmm extraction when filled
+        if avatar is not None and source_image_flag:
+            crop_info = avatar.restore_preprocess(coeff_path, png_path, landmarks_path)
+            if crop_info is not None:
+                print(' Using cached avatar bundle.')
+                return coeff_path, png_path, crop_info
+
         #load input
         if not os.path.isfile(input_path):
             raise ValueError('input_path must be a valid path to video/image file')
@@ -167,4 +173,7 @@ class CropAndExtract():
 
             savemat(coeff_path, {'coeff_3dmm': semantic_npy, 'full_3dmm': np.array(full_coeffs)[0]})
 
+        if avatar is not None and source_image_flag:
+            avatar.save_preprocess(coeff_path, png_path, landmarks_path, crop_info)
+
         return coeff_path, png_path, crop_info
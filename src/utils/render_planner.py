@@ -0,0 +1,100 @@
+RENDER_SIZES = (256, 512)
+
+# Rough per-frame cost relative to one 256px face render. The generator scales with the pixel
+# count, GFPGAN restores every frame at 512px, and the full-mode paste (resize + seamlessClone)
+# scales with the size of the picture it pastes into.
+RENDER_COST = {256: 1.0, 512: 4.0}
+ENHANCER_COST = 3.0
+PASTE_COST_PER_MPIX = 0.5
+
+# Rough peak memory (GB) of one render: the model set for the size, activations per frame of the
+# facerender batch, and GFPGAN when the enhancer is on.
+MODEL_MEM_GB = {256: 1.5, 512: 2.0}
+FRAME_MEM_GB = {256: 0.25, 512: 1.0}
+ENHANCER_MEM_GB = 1.2
+
+
+def pip_target_width(slide_width, pip_ratio):
+    """On-screen width of the teacher overlay, the same value pip_composite_ffmpeg scales to."""
+    return max(1, int(slide_width * pip_ratio))
+
+
+def frame_cost(size, enhancer, paste_pixels=0):
+    return RENDER_COST.get(size, (size / 256.0) ** 2) + (ENHANCER_COST if enhancer else 0.0) \
+        + PASTE_COST_PER_MPIX * paste_pixels / 1e6
+
+
+def estimate_render_memory_gb(size=256, enhancer=False, batch_size=1):
+    """Peak memory of one SadTalker render, used for admission by the job scheduler."""
+    size = 512 if size > 256 else 256
+    return MODEL_MEM_GB[size] + FRAME_MEM_GB[size] * max(1, int(batch_size)) \
+        + (ENHANCER_MEM_GB if enhancer else 0.0)
+
+
+def estimate_render_work(n_slides, size=256, enhancer=False):
+    """Relative render work of a lecture (one unit = one slide at 256px); the scheduler runs small work first."""
+    return max(1, n_slides) * frame_cost(size, enhancer)
+
+
+class RenderPlan():
+    """
+    Cheapest SadTalker settings that still cover the on-screen teacher resolution.
+
+    size         -- render size (256 / 512)
+    enhancer     -- keep the face enhancer (only when the overlay is wider than a 512 render)
+    output_width -- width the teacher video is written at (the full-mode paste canvas is
+                    downscaled to it), None to keep the native width
+    """
+
+    def __init__(self, target_width, size, enhancer, output_width, cost, requested_cost):
+        self.target_width = target_width
+        self.size = size
+        self.enhancer = enhancer
+        self.output_width = output_width
+        self.cost = cost
+        self.requested_cost = requested_cost
+
+    @property
+    def speedup(self):
+        return self.requested_cost / self.cost if self.cost else 1.0
+
+    def seconds_saved(self, rendered_seconds):
+        """Estimated render time saved, given the measured time of the planned render."""
+        return max(0.0, rendered_seconds * (self.speedup - 1.0))
+
+    def as_dict(self):
+        return {'size': self.size, 'enhancer': self.enhancer, 'output_width': self.output_width}
+
+    def __repr__(self):
+        return (f'RenderPlan(target={self.target_width}px, size={self.size}, enhancer={self.enhancer}, '
+                f'output_width={self.output_width}, ~{self.speedup:.1f}x cheaper)')
+
+
+def plan_pip_render(slide_size, pip_ratio, preprocess='crop', size=256, enhancer=False, source_size=None):
+    """
+    slide_size  -- (w, h) of the slide the teacher is overlaid on
+    source_size -- (w, h) of the teacher picture; used for the full-mode paste cost and canvas
+
+    The crop / full framing is left as requested, since it changes what is on screen. The face
+    never covers more than the overlay width, so rendering at least target_width pixels wide is
+    enough in either mode; the enhancer is only kept while the render is still narrower.
+    """
+    target = pip_target_width(slide_size[0], pip_ratio)
+    full = 'full' in (preprocess or '').lower()
+    source_pixels = source_size[0] * source_size[1] if (full and source_size) else 0
+
+    # never more than what was asked for: the planner only removes work
+    plan_size = min(size, next((s for s in RENDER_SIZES if s >= target), RENDER_SIZES[-1]))
+    plan_enhancer = bool(enhancer) and plan_size < target
+    output_width = None
+    paste_pixels = source_pixels
+    if not plan_enhancer:
+        if full and source_size and source_size[0] > target:
+            output_width = target
+            paste_pixels = source_pixels * (target / source_size[0]) ** 2
+        elif not full and plan_size > target:
+            output_width = target
+
+    return RenderPlan(target, plan_size, plan_enhancer, output_width,
+                      cost=frame_cost(plan_size, plan_enhancer, paste_pixels),
+                      requested_cost=frame_cost(size, enhancer, source_pixels))
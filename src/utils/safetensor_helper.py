@@ -1,8 +1,119 @@
+import os
+import json
+import mmap
+import struct
+import inspect
+import threading
+
+import torch
+
+
+_SAFETENSOR_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+
+
+class MappedSafetensor():
+    """
+    A safetensors file mapped into memory once.
+
+    Tensors are zero-copy views on the mapping. The mapping is private (copy-on-write), so
+    the clean pages come straight from the page cache and are shared by every model instance
+    and every worker process that maps the same file. Treat the views as read-only.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        header_len = struct.unpack('<Q', self._mmap[:8])[0]
+        header = json.loads(self._mmap[8:8 + header_len])
+        self.metadata = header.pop('__metadata__', None) or {}
+        self._data_start = 8 + header_len
+        self._header = header
+
+        # top-level module name -> tensor names, e.g. 'generator' -> ['generator.first.conv.weight', ...]
+        self._prefix_index = {}
+        for name in header:
+            self._prefix_index.setdefault(name.split('.', 1)[0], []).append(name)
+
+        self._tensors = {}
+        self._lock = threading.Lock()
+
+    def keys(self):
+        return self._header.keys()
+
+    def prefixes(self):
+        return list(self._prefix_index.keys())
+
+    def tensor(self, name):
+        with self._lock:
+            t = self._tensors.get(name)
+            if t is None:
+                t = self._view(self._header[name])
+                self._tensors[name] = t
+            return t
+
+    def state_dict(self, prefix):
+        """State dict of one sub-model with `prefix.` stripped, e.g. state_dict('audio2pose')."""
+        return {name[len(prefix) + 1:]: self.tensor(name) for name in self._prefix_index.get(prefix, [])}
+
+    def _view(self, info):
+        dtype = _SAFETENSOR_DTYPES[info['dtype']]
+        begin, end = info['data_offsets']
+        if end == begin:
+            return torch.empty(info['shape'], dtype=dtype)
+        count = (end - begin) // torch.empty((), dtype=dtype).element_size()
+        return torch.frombuffer(self._mmap, dtype=dtype, count=count, offset=self._data_start + begin).view(info['shape'])
+
+
+_mapped_checkpoints = {}
+_mapped_checkpoints_lock = threading.Lock()
+
+
+def open_safetensor(path):
+    """Return the process-wide MappedSafetensor for `path`, mapping it on first use."""
+    real_path = os.path.realpath(path)
+    key = (real_path, os.path.getmtime(real_path))
+    with _mapped_checkpoints_lock:
+        checkpoint = _mapped_checkpoints.get(key)
+        if checkpoint is None:
+            checkpoint = MappedSafetensor(real_path)
+            _mapped_checkpoints[key] = checkpoint
+        return checkpoint
+
+
+_load_supports_assign = 'assign' in inspect.signature(torch.nn.Module.load_state_dict).parameters
+
+
+def load_state_dict_shared(module, state_dict, strict=True):
+    """
+    Load a (mapped) state dict into `module`.
+
+    Modules living on the CPU adopt the mapped tensors directly instead of copying them,
+    so their weights stay backed by the shared file pages.
+    """
+    on_cpu = all(t.device.type == 'cpu' for t in list(module.parameters()) + list(module.buffers()))
+    if on_cpu and _load_supports_assign:
+        return module.load_state_dict(state_dict, strict=strict, assign=True)
+    return module.load_state_dict(state_dict, strict=strict)
 
 
 def load_x_from_safetensor(checkpoint, key):
+    if isinstance(checkpoint, MappedSafetensor):
+        return checkpoint.state_dict(key)
     x_generator = {}
     for k,v in checkpoint.items():
         if key in k:
             x_generator[k.replace(key+'.', '')] = v
-    return x_generator
\ No newline at end of file
+    return x_generator
@@ -0,0 +1,128 @@
+import os
+import atexit
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.utils.file_hash import file_sha256
+
+
+OCR_DPI = 120               # slide text is >= ~18pt, 120 dpi keeps it well above tesseract's minimum glyph height
+SLIDE_WIDTH_INCHES = 13.333  # 16:9 deck; 4:3 decks are 10in wide and are only downscaled less
+OCR_LANG = 'vie+eng'
+
+_engine = None
+
+
+def _init_ocr_worker(lang):
+    """Per worker: one tesseract thread (the pool is the parallelism) and, with tesserocr, one loaded engine."""
+    global _engine
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    try:
+        from tesserocr import PyTessBaseAPI
+        _engine = PyTessBaseAPI(lang=lang)
+    except Exception:
+        _engine = None
+
+
+def ocr_image(image_path, lang=OCR_LANG, dpi=OCR_DPI, slide_width_in=SLIDE_WIDTH_INCHES):
+    """Grayscale, downscaled to `dpi` over the slide width, then OCR. None when no OCR backend is available."""
+    from PIL import Image
+
+    with Image.open(image_path) as im:
+        im = im.convert('L')
+        target_w = int(round(dpi * slide_width_in))
+        if im.width > target_w:
+            im = im.resize((target_w, max(1, round(im.height * target_w / im.width))), Image.LANCZOS)
+        if _engine is not None:
+            _engine.SetImage(im)
+            return _engine.GetUTF8Text() or ''
+        try:
+            import pytesseract
+        except ImportError:
+            return None
+        return pytesseract.image_to_string(im, lang=lang) or ''
+
+
+def _ocr_job(args):
+    try:
+        return ocr_image(*args)
+    except Exception as e:
+        print(f"⚠️ OCR lỗi {args[0]}: {e}")
+        return None
+
+
+_pool = None
+_pool_lang = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(lang):
+    """Process pool sized to the cores, kept warm between decks (each worker keeps its engine)."""
+    global _pool, _pool_lang
+    with _pool_lock:
+        if _pool is None or _pool_lang != lang:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, initializer=_init_ocr_worker,
+                                        initargs=(lang,))
+            _pool_lang = lang
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+atexit.register(_reset_pool)
+
+
+def _cache_path(cache_root, image_path, lang, dpi):
+    return os.path.join(cache_root, f'{file_sha256(image_path)}_{lang}_{dpi}.txt')
+
+
+def ocr_slides(image_paths, lang=OCR_LANG, dpi=OCR_DPI, slide_width_in=SLIDE_WIDTH_INCHES, cache_root=None):
+    """
+    OCR text for each image (same order, '' on failure). Results are cached under
+    cache_root/<sha256>_<lang>_<dpi>.txt, so re-importing a deck only hashes its slide images;
+    the remaining images are spread over the shared process pool.
+    """
+    cache_root = cache_root or os.environ.get('OCR_CACHE_DIR', './cache/ocr')
+    os.makedirs(cache_root, exist_ok=True)
+    texts = [''] * len(image_paths)
+    todo = []
+    for i, path in enumerate(image_paths):
+        cached = _cache_path(cache_root, path, lang, dpi)
+        if os.path.isfile(cached):
+            with open(cached, 'r', encoding='utf-8') as f:
+                texts[i] = f.read()
+        else:
+            todo.append((i, cached))
+    if not todo:
+        return texts
+
+    jobs = [(image_paths[i], lang, dpi, slide_width_in) for i, _ in todo]
+    if len(jobs) == 1 or (os.cpu_count() or 1) == 1:
+        results = [_ocr_job(job) for job in jobs]
+    else:
+        try:
+            results = list(_get_pool(lang).map(_ocr_job, jobs))
+        except BrokenProcessPool:
+            # a worker died (e.g. tesseract crashed): drop the pool, this batch runs in-process
+            _reset_pool()
+            results = [_ocr_job(job) for job in jobs]
+
+    for (i, cached), text in zip(todo, results):
+        if text is None:    # failed / no backend: not cached, retried next time
+            continue
+        texts[i] = text
+        fd, tmp = tempfile.mkstemp(dir=cache_root, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, cached)
+    return texts
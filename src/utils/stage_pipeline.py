@@ -0,0 +1,50 @@
+import queue
+import threading
+import traceback
+
+
+_DONE = object()
+
+
+def run_pipeline(items, stages, queue_size=2):
+    """
+    Push items through a chain of stages, each running in its own thread.
+
+    stages     -- list of (name, fn); fn(index, value) returns the value handed to the next stage,
+                  or None to drop the item (the remaining stages are skipped for it)
+    queue_size -- bound of the queue in front of every stage after the first, so a fast stage
+                  can run at most queue_size items ahead of a slow one
+
+    Items keep their input order in every stage. Returns the output of the last stage for every
+    item, in input order, with None for dropped or failed items.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages[1:]]
+
+    def worker(stage_idx, name, fn):
+        inbox = queues[stage_idx - 1] if stage_idx > 0 else None
+        outbox = queues[stage_idx] if stage_idx < len(queues) else None
+        source = iter(enumerate(items)) if inbox is None else iter(inbox.get, _DONE)
+        for index, value in source:
+            out = None
+            if value is not None:
+                try:
+                    out = fn(index, value)
+                except Exception:
+                    print(f"❌ Stage '{name}' failed on item {index + 1}")
+                    traceback.print_exc()
+            if outbox is not None:
+                outbox.put((index, out))
+            else:
+                results[index] = out
+        if outbox is not None:
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=worker, args=(i, name, fn), name=f'stage-{name}', daemon=True)
+               for i, (name, fn) in enumerate(stages)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
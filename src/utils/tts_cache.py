@@ -0,0 +1,103 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import unicodedata
+
+
+def normalize_text(text):
+    """NFC + collapsed whitespace, so re-typed but identical slide text hits the same entry."""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+
+class TTSCache():
+    """
+    Content-addressed disk cache for synthesized speech.
+
+    Entries are keyed by sha256 of (normalized text, engine, voice / clone id, language, rate) and
+    evicted least-recently-used first once the directory exceeds max_bytes. A hit refreshes the
+    entry's mtime, which is the LRU clock. fetch() hands out a temporary copy, so callers can keep
+    deleting their audio files after use.
+    """
+
+    def __init__(self, root='./cache/tts', max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, text, engine, voice='', language='', rate=1.0):
+        payload = json.dumps([normalize_text(text), engine or '', voice or '', language or '', round(float(rate), 3)],
+                             ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key, ext):
+        return os.path.join(self.root, key[:2], key + ext)
+
+    def fetch(self, key, ext='.wav'):
+        """Temporary copy of the cached audio, or None on a miss."""
+        path = self._path(key, ext)
+        if not os.path.isfile(path):
+            return None
+        try:
+            os.utime(path)
+            fd, out_path = tempfile.mkstemp(suffix=ext)
+            os.close(fd)
+            shutil.copyfile(path, out_path)
+            return out_path
+        except OSError:
+            return None
+
+    def store(self, key, src_path, ext=None):
+        """Copy src_path into the cache under key; the source file is left untouched."""
+        if not src_path or not os.path.isfile(src_path):
+            return None
+        ext = ext or os.path.splitext(src_path)[1] or '.wav'
+        path = self._path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.tmp.{os.getpid()}.{threading.get_ident()}'
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if '.tmp.' in name:
+                        continue
+                    p = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+                    total += st.st_size
+            entries.sort()
+            for _, size, p in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except OSError:
+                    pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """Process-wide TTSCache; TTS_CACHE_DIR / TTS_CACHE_MAX_MB override the defaults."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(root=os.environ.get('TTS_CACHE_DIR', './cache/tts'),
+                              max_bytes=int(float(os.environ.get('TTS_CACHE_MAX_MB', 2048)) * 1024 * 1024))
+        return _cache
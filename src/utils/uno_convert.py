@@ -0,0 +1,72 @@
+"""
+UNO conversion client for OfficeWorker. Runs under any python that can `import uno` (usually
+LibreOffice's own bundled python, e.g. inside the AppImage), so it only uses the standard library.
+
+    <python> uno_convert.py <port>
+
+Reads one JSON job per stdin line ({"src": ..., "pdf": ...}) and answers each with one JSON line
+({"ok": true} or {"ok": false, "error": ...}) on stdout. The connection to the soffice listening
+on 127.0.0.1:<port> is opened once and kept for every later job.
+"""
+import os
+import sys
+import json
+import time
+
+import uno
+from com.sun.star.beans import PropertyValue
+
+
+def _props(**kwargs):
+    props = []
+    for name, value in kwargs.items():
+        p = PropertyValue()
+        p.Name, p.Value = name, value
+        props.append(p)
+    return tuple(props)
+
+
+def connect(port, timeout=60):
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+    deadline = time.time() + timeout
+    while True:
+        try:
+            ctx = resolver.resolve(f'uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext')
+            return ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def to_pdf(desktop, src, pdf_path):
+    doc = desktop.loadComponentFromURL(uno.systemPathToFileUrl(os.path.abspath(src)), '_blank', 0,
+                                       _props(Hidden=True, ReadOnly=True))
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(pdf_path)), _props(FilterName='impress_pdf_Export'))
+    finally:
+        doc.close(True)
+
+
+def main(port):
+    desktop = None
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        try:
+            if desktop is None:
+                desktop = connect(port)
+            to_pdf(desktop, job['src'], job['pdf'])
+            reply = {'ok': True}
+        except Exception as e:
+            # the bridge may be dead: reconnect on the next job
+            desktop = None
+            reply = {'ok': False, 'error': f'{type(e).__name__}: {e}'}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]))
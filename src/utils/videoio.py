@@ -1,9 +1,11 @@
 import shutil
 import uuid
+import subprocess
 
 import os
 
 import cv2
+import numpy as np
 
 def load_video_to_cv2(input_path):
     video_stream = cv2.VideoCapture(input_path)
@@ -17,6 +19,66 @@ def load_video_to_cv2(input_path):
         full_frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
     return full_frames
 
+class FFmpegVideoWriter():
+    """
+    Pipe uint8 frames (H, W, 3) into a single ffmpeg process that encodes them and muxes the audio track.
+    The process is started on the first frame, so the frame size does not need to be known up front.
+    """
+
+    def __init__(self, save_path, audio_path=None, fps=25, pix_fmt='rgb24', crf=18):
+        self.save_path = save_path
+        self.audio_path = audio_path
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.crf = crf
+        self.frame_shape = None
+        self.frame_count = 0
+        self.proc = None
+
+    def _start(self, frame_shape):
+        h, w = frame_shape[:2]
+        cmd = ['ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', self.pix_fmt, '-s', '%dx%d' % (w, h), '-r', str(self.fps), '-i', '-']
+        if self.audio_path is not None:
+            cmd += ['-i', self.audio_path]
+        # yuv420p needs even dimensions
+        cmd += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-crf', str(self.crf)]
+        if self.audio_path is not None:
+            cmd += ['-c:a', 'aac', '-shortest']
+        cmd.append(self.save_path)
+        self.frame_shape = frame_shape
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if self.proc is None:
+            self._start(frame.shape)
+        if frame.shape != self.frame_shape:
+            raise ValueError('frame shape %s differs from the first frame %s' % (frame.shape, self.frame_shape))
+        self.proc.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+        self.frame_count += 1
+
+    def close(self):
+        if self.proc is None:
+            raise RuntimeError('no frames were written to %s' % self.save_path)
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError('ffmpeg failed to write %s' % self.save_path)
+
+    def abort(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
 def save_video_with_watermark(video, audio, save_path, watermark=False):
     temp_file = str(uuid.uuid4())+'.mp4'
     cmd = r'ffmpeg -y -hide_banner -loglevel error -i "%s" -i "%s" -vcodec copy "%s"' % (video, audio, temp_file)
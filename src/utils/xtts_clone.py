@@ -1,14 +1,22 @@
 import os
 import json
+import shutil
+import wave
 import tempfile
+import threading
 import time
 from typing import List, Tuple, Optional
 
+import numpy as np
+import torch
 from pydub import AudioSegment
-from TTS.api import TTS
+
+from src.utils.tts_cache import get_tts_cache
+from src.utils.file_hash import file_sha256
 
 
 XTTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+CONDITIONING_FILE = "conditioning_latents.pt"
 
 
 def ensure_dir(path: str) -> None:
@@ -85,24 +93,163 @@ def create_cloned_voice(reference_mp3_path: str, voices_root: str = "./cloned_vo
     return True, display_name, None
 
 
+def write_wav(path: str, wav, sample_rate: int) -> None:
+    """Write a float waveform in [-1, 1] as 16-bit PCM mono wav."""
+    pcm = (np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def _inference_settings(config) -> dict:
+    """Sampling settings of the model config, as Xtts.synthesize (tts_to_file) passes them."""
+    if config is None:
+        return {}
+    return {
+        "temperature": config.temperature,
+        "length_penalty": config.length_penalty,
+        "repetition_penalty": config.repetition_penalty,
+        "top_k": config.top_k,
+        "top_p": config.top_p,
+    }
+
+
+def _conditioning_settings(config) -> dict:
+    """Reference-audio settings of the model config, as Xtts.synthesize passes them to get_conditioning_latents."""
+    if config is None:
+        return {}
+    return {
+        "gpt_cond_len": config.gpt_cond_len,
+        "gpt_cond_chunk_len": config.gpt_cond_chunk_len,
+        "max_ref_length": config.max_ref_len,
+        "sound_norm_refs": config.sound_norm_refs,
+    }
+
+
+class XTTSEngine:
+    """XTTS-v2 loaded once per process, with speaker conditioning computed once per cloned voice.
+
+    The GPT conditioning latent and speaker embedding of a voice are saved as
+    conditioning_latents.pt next to the voice's config.json and reused until the reference wav or
+    the conditioning settings change. Sampling and conditioning use the model config values, like
+    TTS.tts_to_file did.
+    """
+
+    def __init__(self, device: Optional[str] = None, model=None):
+        self.device = device
+        self.model = model
+        self.sample_rate = getattr(model, "output_sample_rate", None)
+        self._split_sentences = None
+        self._conditioning = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self.model is None:
+            from TTS.api import TTS
+            tts = TTS(XTTS_MODEL_NAME)
+            if self.device:
+                tts = tts.to(self.device)
+            self.model = tts.synthesizer.tts_model
+            self.sample_rate = tts.synthesizer.output_sample_rate
+            self._split_sentences = tts.synthesizer.split_into_sentences
+        return self.model
+
+    def conditioning(self, reference_wav_path: str):
+        """(gpt_cond_latent, speaker_embedding) for a reference wav, from memory, disk or the model."""
+        ref_sha = file_sha256(reference_wav_path)
+        cached = self._conditioning.get(ref_sha)
+        if cached is not None:
+            return cached
+        settings = _conditioning_settings(getattr(self._load(), "config", None))
+
+        cache_path = os.path.join(os.path.dirname(os.path.abspath(reference_wav_path)), CONDITIONING_FILE)
+        if os.path.isfile(cache_path):
+            try:
+                data = torch.load(cache_path, map_location="cpu")
+                if (data.get("reference_sha256") == ref_sha and data.get("model_name") == XTTS_MODEL_NAME
+                        and data.get("settings") == settings):
+                    cached = (data["gpt_cond_latent"], data["speaker_embedding"])
+            except Exception as e:
+                print(f"⚠️ Cannot read {cache_path}: {e}")
+
+        if cached is None:
+            gpt_cond_latent, speaker_embedding = self._load().get_conditioning_latents(
+                audio_path=[reference_wav_path], **settings)
+            cached = (gpt_cond_latent.detach().cpu(), speaker_embedding.detach().cpu())
+            tmp = cache_path + f".tmp.{os.getpid()}"
+            torch.save({"model_name": XTTS_MODEL_NAME, "reference_sha256": ref_sha, "settings": settings,
+                        "gpt_cond_latent": cached[0], "speaker_embedding": cached[1]}, tmp)
+            os.replace(tmp, cache_path)
+
+        self._conditioning[ref_sha] = cached
+        return cached
+
+    def synthesize(self, text: str, language: str, reference_wav_path: str, out_path: Optional[str] = None,
+                   use_cache: bool = True) -> str:
+        cache = get_tts_cache() if use_cache else None
+        if cache is not None:
+            cache_key = cache.key(text, "xtts", file_sha256(reference_wav_path), language)
+            cached = cache.fetch(cache_key, ".wav")
+            if cached:
+                if out_path is None:
+                    return cached
+                shutil.move(cached, out_path)
+                return out_path
+
+        if out_path is None:
+            out_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
+            out_path = out_wav.name
+            out_wav.close()
+
+        with self._lock:
+            model = self._load()
+            gpt_cond_latent, speaker_embedding = self.conditioning(reference_wav_path)
+            device = next(model.parameters()).device if hasattr(model, "parameters") else "cpu"
+            gpt_cond_latent = gpt_cond_latent.to(device)
+            speaker_embedding = speaker_embedding.to(device)
+            settings = _inference_settings(getattr(model, "config", None))
+
+            # same sentence split and 10000-sample pause as TTS.tts_to_file
+            sentences = self._split_sentences(text) if self._split_sentences else [text]
+            wavs = []
+            for sentence in sentences:
+                out = model.inference(sentence, language, gpt_cond_latent, speaker_embedding, **settings)
+                wav = out["wav"]
+                if torch.is_tensor(wav):
+                    wav = wav.detach().cpu().numpy()
+                wavs.append(np.asarray(wav, dtype=np.float32).reshape(-1))
+                wavs.append(np.zeros(10000, dtype=np.float32))
+
+        write_wav(out_path, np.concatenate(wavs), self.sample_rate)
+        if cache is not None:
+            cache.store(cache_key, out_path)
+        return out_path
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_xtts_engine(device: Optional[str] = None, model=None) -> XTTSEngine:
+    """Process-wide XTTSEngine. Passing model (e.g. a stand-in model in tests) replaces the engine."""
+    global _engine
+    with _engine_lock:
+        if _engine is None or model is not None:
+            _engine = XTTSEngine(device=device, model=model)
+        return _engine
+
+
 class XTTSInference:
-    """Thin wrapper for XTTS-v2 synthesis with reference speaker wav."""
+    """Thin wrapper for XTTS-v2 synthesis with reference speaker wav (backed by the shared XTTSEngine)."""
 
     def __init__(self, device: Optional[str] = None):
         self.model_name = XTTS_MODEL_NAME
-        self.tts = TTS(self.model_name)
+        self.engine = get_xtts_engine(device)
         self.device = device
 
     def synthesize(self, text: str, language: str, reference_wav_path: str) -> str:
-        out_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        out_path = out_wav.name
-        out_wav.close()
-        self.tts.tts_to_file(
-            text=text,
-            language=language,
-            speaker_wav=reference_wav_path,
-            file_path=out_path
-        )
-        return out_path
+        return self.engine.synthesize(text, language, reference_wav_path)
 
 
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Test: DenseMotionNetwork (warp không nhân bản volume) phải cho kết quả giống bản cũ dùng repeat
+"""
+
+import sys
+import os
+
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.facerender.modules.dense_motion import DenseMotionNetwork
+from src.facerender.modules.util import make_coordinate_grid, make_coordinate_grid_2d, kp2gaussian, expand_batch
+
+
+class LegacyDenseMotionNetwork(DenseMotionNetwork):
+    """Các hàm gốc (repeat volume đặc trưng num_kp+1 lần), giữ lại để so sánh"""
+
+    def create_sparse_motions(self, feature, kp_driving, kp_source):
+        bs, _, d, h, w = feature.shape
+        identity_grid = make_coordinate_grid((d, h, w), type=kp_source['value'].type())
+        identity_grid = identity_grid.view(1, 1, d, h, w, 3)
+        coordinate_grid = identity_grid - kp_driving['value'].view(bs, self.num_kp, 1, 1, 1, 3)
+        if 'jacobian' in kp_driving and kp_driving['jacobian'] is not None:
+            jacobian = torch.matmul(kp_source['jacobian'], torch.inverse(kp_driving['jacobian']))
+            jacobian = jacobian.unsqueeze(-3).unsqueeze(-3).unsqueeze(-3)
+            jacobian = jacobian.repeat(1, 1, d, h, w, 1, 1)
+            coordinate_grid = torch.matmul(jacobian, coordinate_grid.unsqueeze(-1))
+            coordinate_grid = coordinate_grid.squeeze(-1)
+        driving_to_source = coordinate_grid + kp_source['value'].view(bs, self.num_kp, 1, 1, 1, 3)
+        identity_grid = identity_grid.repeat(bs, 1, 1, 1, 1, 1)
+        return torch.cat([identity_grid, driving_to_source], dim=1)
+
+    def create_deformed_feature(self, feature, sparse_motions):
+        bs, _, d, h, w = feature.shape
+        feature_repeat = feature.unsqueeze(1).unsqueeze(1).repeat(1, self.num_kp+1, 1, 1, 1, 1, 1)
+        feature_repeat = feature_repeat.view(bs * (self.num_kp+1), -1, d, h, w)
+        sparse_motions = sparse_motions.view((bs * (self.num_kp+1), d, h, w, -1))
+        sparse_deformed = F.grid_sample(feature_repeat, sparse_motions)
+        return sparse_deformed.view((bs, self.num_kp+1, -1, d, h, w))
+
+    def forward(self, feature, kp_driving, kp_source, source=None):
+        if source is None:
+            source = self.encode_source(feature, kp_source)
+        bs = kp_driving['value'].shape[0]
+        feature = expand_batch(source['feature'], bs)
+        _, _, d, h, w = feature.shape
+        gaussian_source = expand_batch(source['gaussian_source'], bs)
+
+        out_dict = dict()
+        sparse_motion = self.create_sparse_motions(feature, kp_driving, kp_source)
+        deformed_feature = self.create_deformed_feature(feature, sparse_motion)
+        heatmap = self.create_heatmap_representations(deformed_feature, kp_driving, kp_source, gaussian_source)
+        input_ = torch.cat([heatmap, deformed_feature], dim=2).view(bs, -1, d, h, w)
+        prediction = self.hourglass(input_)
+
+        mask = F.softmax(self.mask(prediction), dim=1)
+        out_dict['mask'] = mask
+        mask = mask.unsqueeze(2)
+        mask = torch.where(mask < 1e-3, torch.zeros_like(mask), mask)
+        sparse_motion = sparse_motion.permute(0, 1, 5, 2, 3, 4)
+        deformation = (sparse_motion * mask).sum(dim=1)
+        out_dict['deformation'] = deformation.permute(0, 2, 3, 4, 1)
+
+        if self.occlusion:
+            bs, c, d, h, w = prediction.shape
+            out_dict['occlusion_map'] = torch.sigmoid(self.occlusion(prediction.view(bs, -1, h, w)))
+        return out_dict
+
+
+def build_pair(num_kp=15, depth=16):
+    kwargs = dict(block_expansion=8, num_blocks=2, max_features=64, num_kp=num_kp, feature_channel=32,
+                  reshape_depth=depth, compress=4, estimate_occlusion_map=True)
+    torch.manual_seed(0)
+    new = DenseMotionNetwork(**kwargs).eval()
+    old = LegacyDenseMotionNetwork(**kwargs).eval()
+    old.load_state_dict(new.state_dict())
+    return new, old
+
+
+def random_kp(bs, num_kp, jacobian=True):
+    kp = {'value': torch.rand(bs, num_kp, 3) * 1.6 - 0.8}
+    kp['jacobian'] = torch.eye(3).repeat(bs, num_kp, 1, 1) + 0.1 * torch.randn(bs, num_kp, 3, 3) if jacobian else None
+    return kp
+
+
+def test_deformed_feature_matches_repeat():
+    new, old = build_pair()
+    torch.manual_seed(1)
+    for bs in (1, 3):
+        feature = torch.randn(bs, 4, 16, 32, 32)
+        motions = old.create_sparse_motions(feature, random_kp(bs, 15), random_kp(bs, 15))
+        assert torch.allclose(new.create_deformed_feature(feature, motions),
+                              old.create_deformed_feature(feature, motions), atol=1e-6)
+
+    # nguồn dùng chung cho cả batch (expand_batch): lấy mẫu từ một bản duy nhất
+    source = torch.randn(1, 4, 16, 32, 32)
+    feature = expand_batch(source, 4)
+    motions = old.create_sparse_motions(feature, random_kp(4, 15), random_kp(4, 15))
+    assert torch.allclose(new.create_deformed_feature(feature, motions),
+                          old.create_deformed_feature(feature, motions), atol=1e-6)
+
+
+def test_sparse_motions_match_repeat():
+    new, old = build_pair()
+    torch.manual_seed(2)
+    feature = torch.randn(2, 4, 16, 32, 32)
+    for jacobian in (True, False):
+        kp_d, kp_s = random_kp(2, 15, jacobian), random_kp(2, 15, jacobian)
+        assert torch.allclose(new.create_sparse_motions(feature, kp_d, kp_s),
+                              old.create_sparse_motions(feature, kp_d, kp_s), atol=1e-5)
+
+
+def test_forward_matches_reference():
+    new, old = build_pair()
+    torch.manual_seed(3)
+    feature = torch.randn(1, 32, 16, 32, 32)
+    kp_source = random_kp(1, 15)
+    kp_driving = random_kp(4, 15)
+    with torch.no_grad():
+        source = new.encode_source(feature, kp_source)
+        kp_source_b = {k: expand_batch(v, 4) for k, v in kp_source.items()}
+        out_new = new(feature, kp_driving, kp_source_b, source=source)
+        out_old = old(feature, kp_driving, kp_source_b, source=source)
+    for key in ('mask', 'deformation', 'occlusion_map'):
+        assert out_new[key].shape == out_old[key].shape
+        assert torch.allclose(out_new[key], out_old[key], atol=1e-5), key
+
+
+def test_coordinate_grid_cache_and_gaussian():
+    # lưới tọa độ được tạo một lần cho mỗi kích thước / kiểu dữ liệu và dùng chung
+    grid = make_coordinate_grid((4, 5, 6), 'torch.FloatTensor')
+    assert make_coordinate_grid((4, 5, 6), 'torch.FloatTensor') is grid
+    assert make_coordinate_grid((4, 5, 6), 'torch.DoubleTensor').dtype == torch.float64
+    assert make_coordinate_grid_2d((5, 6), 'torch.FloatTensor') is make_coordinate_grid_2d((5, 6), 'torch.FloatTensor')
+    z, y, x = torch.meshgrid(torch.linspace(-1, 1, 4), torch.linspace(-1, 1, 5), torch.linspace(-1, 1, 6))
+    assert torch.allclose(grid, torch.stack([x, y, z], dim=-1), atol=1e-6)
+
+    # kp2gaussian (broadcast) khớp với bản cũ dùng repeat
+    kp = random_kp(3, 15, jacobian=False)
+    ref = grid.view(1, 1, 4, 5, 6, 3).repeat(3, 15, 1, 1, 1, 1) - kp['value'].view(3, 15, 1, 1, 1, 3)
+    ref = torch.exp(-0.5 * (ref ** 2).sum(-1) / 0.01)
+    assert torch.allclose(kp2gaussian(kp, spatial_size=(4, 5, 6), kp_variance=0.01), ref)
+    assert make_coordinate_grid((4, 5, 6), 'torch.FloatTensor').shape == (4, 5, 6, 3)
+
+
+if __name__ == "__main__":
+    test_deformed_feature_matches_repeat()
+    test_sparse_motions_match_repeat()
+    test_forward_matches_reference()
+    test_coordinate_grid_cache_and_gaussian()
+    print("✅ DenseMotionNetwork khớp với bản repeat cũ")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test: bản inference (gộp BatchNorm vào conv, nướng spectral norm) phải cho kết quả giống mô hình gốc
+"""
+
+import sys
+import os
+import copy
+import tempfile
+
+import torch
+from torch import nn
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.facerender.modules.util import DownBlock2d, ResBlock3d, ResBottleneck, UpBlock3d, SPADEResnetBlock
+from src.facerender.modules.dense_motion import DenseMotionNetwork
+from src.audio2exp_models.networks import Conv2d as AudioConv2d
+from src.utils.inference_build import (bake_for_inference, build_inference_checkpoint, load_checkpoint_module,
+                                       is_inference_build)
+from src.utils.safetensor_helper import open_safetensor
+
+
+def randomize_norms(model):
+    """BN mặc định là phép đồng nhất; gán thống kê ngẫu nhiên để phép gộp thực sự được kiểm tra"""
+    torch.manual_seed(0)
+    for m in model.modules():
+        if isinstance(m, nn.modules.batchnorm._BatchNorm):
+            m.running_mean.uniform_(-0.5, 0.5)
+            m.running_var.uniform_(0.5, 2.0)
+            if m.affine:
+                m.weight.data.uniform_(0.5, 1.5)
+                m.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+def toy_models():
+    return {
+        'down': (randomize_norms(DownBlock2d(3, 8)), lambda: (torch.randn(2, 3, 16, 16),)),
+        'res3d': (randomize_norms(ResBlock3d(8, kernel_size=3, padding=1)), lambda: (torch.randn(2, 8, 4, 8, 8),)),
+        'bottleneck': (randomize_norms(ResBottleneck(16, stride=2)), lambda: (torch.randn(2, 16, 8, 8),)),
+        'up3d': (randomize_norms(UpBlock3d(8, 4)), lambda: (torch.randn(1, 8, 2, 4, 4),)),
+        'audio': (randomize_norms(nn.Sequential(AudioConv2d(1, 8, 3, 1, 1), AudioConv2d(8, 8, 3, 1, 1, residual=True))),
+                  lambda: (torch.randn(2, 1, 20, 16),)),
+        'spade': (SPADEResnetBlock(8, 4, 'spadespectralinstance', 5).eval(),
+                  lambda: (torch.randn(2, 8, 8, 8), torch.randn(2, 5, 8, 8))),
+    }
+
+
+def test_bake_matches_eval_and_keeps_original_weights():
+    for name, (model, make_inputs) in toy_models().items():
+        torch.manual_seed(1)
+        inputs = make_inputs()
+        baked = copy.deepcopy(model)
+        counts = bake_for_inference(baked)
+        with torch.no_grad():
+            expected = model(*inputs)
+            got = baked(*inputs)
+        assert torch.allclose(got, expected, atol=1e-4), name
+        assert counts['batchnorm'] + counts['spectral_norm'] > 0, name
+
+    # trọng số có thể là view trên file mmap dùng chung: không được ghi đè tại chỗ
+    model, make_inputs = toy_models()['bottleneck']
+    tensors = {k: v for k, v in model.state_dict().items()}
+    originals = {k: v.clone() for k, v in tensors.items()}
+    bake_for_inference(model)
+    for k in originals:
+        assert torch.equal(tensors[k], originals[k]), k
+
+
+def test_dense_motion_compress_is_folded():
+    torch.manual_seed(2)
+    model = randomize_norms(DenseMotionNetwork(block_expansion=8, num_blocks=2, max_features=32, num_kp=4,
+                                               feature_channel=8, reshape_depth=4, compress=2,
+                                               estimate_occlusion_map=True))
+    baked = copy.deepcopy(model)
+    bake_for_inference(baked)
+    assert isinstance(baked.norm, nn.Identity)
+    feature = torch.randn(1, 8, 4, 16, 16)
+    kp = {'value': torch.rand(2, 4, 3) - 0.5, 'jacobian': None}
+    kp_source = {'value': torch.rand(2, 4, 3) - 0.5, 'jacobian': None}
+    with torch.no_grad():
+        ref, out = model(feature, kp, kp_source), baked(feature, kp, kp_source)
+    for key in ('mask', 'deformation', 'occlusion_map'):
+        assert torch.allclose(ref[key], out[key], atol=1e-4), key
+
+
+def test_artifact_round_trip():
+    from safetensors.torch import save_file
+
+    models = {name: model for name, (model, _) in toy_models().items()}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'toy.safetensors')
+        dst = os.path.join(tmp, 'toy_inference.safetensors')
+        save_file({prefix + '.' + k: v.contiguous() for prefix, m in models.items() for k, v in m.state_dict().items()}, src)
+        build_inference_checkpoint(src, dst, {name: copy.deepcopy(m) for name, m in models.items()})
+
+        checkpoint = open_safetensor(dst)
+        assert is_inference_build(checkpoint) and not is_inference_build(open_safetensor(src))
+        for name, (reference, make_inputs) in toy_models().items():
+            # mô hình mới (trọng số khác) được dựng lại theo cấu trúc đã nướng rồi mới nạp
+            fresh = copy.deepcopy(reference)
+            load_checkpoint_module(fresh, checkpoint, name)
+            inputs = make_inputs()
+            with torch.no_grad():
+                assert torch.allclose(fresh(*inputs), models[name](*inputs), atol=1e-4), name
+
+
+if __name__ == "__main__":
+    test_bake_matches_eval_and_keeps_original_weights()
+    test_dense_motion_compress_is_folded()
+    test_artifact_round_trip()
+    print("✅ inference build khớp với mô hình gốc")
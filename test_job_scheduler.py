@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test JobScheduler: ưu tiên, giới hạn bộ nhớ, hủy job và job lỗi
+"""
+
+import sys
+import os
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.job_scheduler import JobScheduler
+
+
+def _wait(scheduler, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        info = scheduler.status(job_id)
+        if info['status'] in ('done', 'failed', 'cancelled'):
+            return info
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} not finished")
+
+
+def test_priority_order_and_progress():
+    gate = threading.Event()
+    order = []
+    scheduler = JobScheduler(lambda i: f"ctx{i}", n_workers=1, aging_seconds=1e6)
+
+    blocker = scheduler.submit(lambda ctx, job: gate.wait(5))
+    time.sleep(0.05)
+
+    def work(name):
+        def fn(ctx, job):
+            job.report(0.5, name)
+            order.append(name)
+            return ctx, name
+        return fn
+
+    big = scheduler.submit(work("big"), priority=20)
+    small = scheduler.submit(work("small"), priority=1)
+    assert scheduler.status(small)['position'] == 1 and scheduler.status(big)['position'] == 2
+
+    gate.set()
+    assert _wait(scheduler, big)['progress'] == 1.0
+    assert order == ["small", "big"]
+    assert scheduler.get(small).result == ("ctx0", "small")
+    assert _wait(scheduler, blocker)['status'] == 'done'
+    scheduler.shutdown()
+
+
+def test_memory_admission_runs_one_at_a_time():
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fn(ctx, job):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    scheduler = JobScheduler(lambda i: None, n_workers=3, memory_budget_gb=5.0)
+    ids = [scheduler.submit(fn, est_mem_gb=3.0) for _ in range(3)]
+    for job_id in ids:
+        assert _wait(scheduler, job_id)['status'] == 'done'
+    assert peak[0] == 1
+
+    # job nhỏ thì chạy song song được
+    ids = [scheduler.submit(fn, est_mem_gb=1.0) for _ in range(3)]
+    for job_id in ids:
+        _wait(scheduler, job_id)
+    assert peak[0] > 1
+    scheduler.shutdown()
+
+
+def test_memory_budget_is_per_device():
+    running, peak = {}, {}
+    lock = threading.Lock()
+
+    def fn(ctx, job):
+        with lock:
+            running[job.device] = running.get(job.device, 0) + 1
+            peak[job.device] = max(peak.get(job.device, 0), running[job.device])
+        time.sleep(0.05)
+        with lock:
+            running[job.device] -= 1
+
+    # 3 worker, 2 trên cuda:0: hai job lớn không được chạy cùng lúc trên cuda:0 dù tổng ngân sách đủ
+    scheduler = JobScheduler(lambda i: None, devices=['cuda:0', 'cuda:1', 'cuda:0'],
+                             memory_budget_gb={'cuda:0': 5.0, 'cuda:1': 5.0})
+    ids = [scheduler.submit(fn, est_mem_gb=3.0) for _ in range(4)]
+    for job_id in ids:
+        assert _wait(scheduler, job_id)['status'] == 'done'
+    assert peak == {'cuda:0': 1, 'cuda:1': 1}
+    assert set(scheduler.status(job_id)['device'] for job_id in ids) == {'cuda:0', 'cuda:1'}
+    scheduler.shutdown()
+
+
+def test_cancel_queued_and_running_and_failure():
+    started = threading.Event()
+
+    def long_job(ctx, job):
+        started.set()
+        while True:
+            job.raise_if_cancelled()
+            time.sleep(0.01)
+
+    scheduler = JobScheduler(lambda i: None, n_workers=1)
+    running = scheduler.submit(long_job)
+    queued = scheduler.submit(lambda ctx, job: "never")
+    assert started.wait(5)
+
+    assert scheduler.cancel(queued)
+    assert scheduler.status(queued)['status'] == 'cancelled'
+    assert scheduler.cancel(running)
+    assert _wait(scheduler, running)['status'] == 'cancelled'
+    assert not scheduler.cancel(running)
+
+    def broken(ctx, job):
+        raise ValueError("boom")
+    info = _wait(scheduler, scheduler.submit(broken))
+    assert info['status'] == 'failed' and info['error'] == 'boom'
+    scheduler.shutdown()
+
+
+def test_same_key_runs_one_at_a_time():
+    running, peak = {}, {}
+    lock = threading.Lock()
+
+    def fn(ctx, job):
+        with lock:
+            running[job.key] = running.get(job.key, 0) + 1
+            peak[job.key] = max(peak.get(job.key, 0), running[job.key])
+        time.sleep(0.05)
+        with lock:
+            running[job.key] -= 1
+
+    scheduler = JobScheduler(lambda i: None, n_workers=3)
+    ids = [scheduler.submit(fn, key="deck_a") for _ in range(3)] + [scheduler.submit(fn, key="deck_b")]
+    for job_id in ids:
+        assert _wait(scheduler, job_id)['status'] == 'done'
+    assert peak == {"deck_a": 1, "deck_b": 1}
+    # job của dự án khác không phải chờ các job của deck_a
+    assert scheduler.get(ids[3]).started < scheduler.get(ids[2]).started
+    scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    test_priority_order_and_progress()
+    test_memory_admission_runs_one_at_a_time()
+    test_memory_budget_is_per_device()
+    test_cancel_queued_and_running_and_failure()
+    test_same_key_runs_one_at_a_time()
+    print("✅ job scheduler tests passed")
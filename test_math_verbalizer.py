@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Golden test cho process_special_characters: kết quả được ghi lại từ bản tuần tự cũ
+(re.sub + replace từng ký tự + unicodedata.name từng ký tự) trước khi chuyển sang bảng translate
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.math_formula_processor import MathFormulaProcessor, process_math_text
+
+GOLDEN = [
+    ('x² + y³ = z', 'x mũ 2 cộng y mũ 3 bằng z'),
+    ('α + β = γ', 'alpha cộng beta bằng gamma'),
+    ('√x + ∫f(x)dx', 'căn bậc hai của x cộng tích phân của f(x) theo x'),
+    ('a/b × c', 'a chia b nhân c'),
+    ('x₁ + x₂ = x₃', 'x chỉ số một cộng x chỉ số hai bằng x chỉ số ba'),
+    ('πr²', 'pir mũ 2'),
+    ('∑(i=1 to n) x_i', 'tổng(i bằng 1 to n) x_i'),
+    ('∀x ∈ ℝ', 'với mọix thuộc tập số thực'),
+    ('A ⊂ B', 'A tập con B'),
+    ("f'(x) = lim(h→0) [f(x+h) - f(x)]/h", "f'(x) bằng lim(h mũi tên phải0) [f(x cộng h) trừ f(x)] chiah"),
+    ('x²', 'x mũ 2'),
+    ('H₂O', 'H chỉ số haiO'),
+    ('αβγ', 'alpha beta gamma'),
+    ('∑∏∫', 'tổng tích tích phân'),
+    ('1/2', '1 chia 2'),
+    ('√x', 'căn bậc hai của x'),
+    ('3√y', '3căn bậc hai của y'),
+    ('x^2', 'x mũ 2'),
+    ('∫f(x)dx', 'tích phân của f(x) theo x'),
+    ('  x²  +  y³  ', 'x mũ 2 cộng y mũ 3'),
+    ('( x + y )', '(x cộng y)'),
+    ('x . y , z', 'x. y, z'),
+    ('Phương trình bậc hai: ax² + bx + c = 0, với a ≠ 0.', 'Phương trình bậc hai: a nhân x mũ 2 cộng b nhân x cộng c bằng 0, với a khác 0.'),
+    ('Diện tích hình tròn S = πr², chu vi C = 2πr.', 'Diện tích hình tròn S bằng pi nhân r mũ 2, chu vi C bằng 2 pi nhân r.'),
+    ('Nếu Δ > 0 thì phương trình có hai nghiệm phân biệt x₁, x₂.', 'Nếu Delta > 0 thì phương trình có hai nghiệm phân biệt x chỉ số một, x chỉ số hai.'),
+    ('Tỉ lệ 3:4 và số âm -5, nhiệt độ 25°C, góc 30° 15′ 20″.', 'Tỉ lệ 3:4 và số âm trừ5, nhiệt độ 25 độC, góc 30 độ 15 phút 20 giây.'),
+    ('2x + 3y - 4 = 0 và 5 x 6 = 30', '2 nhân nhân x cộng 3y trừ 4 bằng 0 và 5 nhân nhân x 6 bằng 30'),
+    ('∀ε > 0, ∃δ > 0: |x − a| < δ ⇒ |f(x) − L| < ε', 'với mọi epsilon > 0, tồn tại delta > 0: |x − a| < delta suy ra |f(x) − L| < epsilon'),
+    ('A ∪ B ∩ C ∖ D, ∅ ⊆ A ⊇ ∅, x ∉ ℕ, y ∈ ℤ ∪ ℚ ∪ ℂ', 'A hợp B giao C hiệu D, tập rỗng tập con hoặc bằng A tập cha hoặc bằng tập rỗng, x không thuộc tập số tự nhiên, y thuộc tập số nguyên hợp tập số hữu tỷ hợp tập số phức'),
+    ('ℵ₀ ℏ ℯ ℊ ℴ ℶ ℷ ℸ ℙ ⊤ ⊥ ∥ ∠ ∡ ∢ ‰ ‱', 'aleph chỉ số không h bar e g o beth gimel daleth tập số nguyên tố đúng sai song song góc góc đo góc phẳng phần nghìn phần vạn'),
+    ('lim x→∞ (1 + 1/n)^n = e ≈ 2.718', 'lim x mũi tên phải vô cùng (1 cộng 1 chia n) mũ n bằng e xấp xỉ 2.718'),
+    ('d/dx sin(x) = cos(x); ∂f/∂x ∇f ∆x', 'đạo hàm theo d nhân x sin(x) bằng cos(x); đạo hàm riêngf chia đạo hàm riêngx nablaf deltax'),
+    ('Σi=1 Πk=2 x⁴ y⁵ z⁶ w⁷ v⁸ u⁹ t⁰ s¹', 'tổng của i từ 1 tích của k từ 2 x4 y5 z6 w7 v8 u9 t0 s1'),
+    ('x₀ x₄ x₅ x₆ x₇ x₈ x₉ ∛8 ∜16 ∓ ± ÷ ⋅ ∗ ≪ ≫ ≡ ≅ ∝', 'x chỉ số không x chỉ số bốn x chỉ số năm x chỉ số sáu x chỉ số bảy x chỉ số tám x chỉ số chín căn bậc ba8 căn bậc bốn16 trừ cộng cộng trừ chia nhân nhân nhỏ hơn rất nhiều lớn hơn rất nhiều đồng dư đồng dạng tỷ lệ thuận'),
+    ('∬ ∭ ∮ ∯ ∰ ∋ ∌ ⊕ ⊗ ← ↑ ↓ ↔ ↕ ⇐ ⇔ ⇎ ∄ ∴ ∵ ∧ ∨ ¬', 'tích phân kép tích phân ba tích phân đường tích phân mặt tích phân thể tích chứa không chứa tổng trực tiếp tích tensor mũi tên trái mũi tên lên mũi tên xuống mũi tên hai chiều mũi tên lên xuống ngược lại tương đương không tương đương không tồn tại do đó vì và hoặc không'),
+    ('𝑥 + 𝑦 = 𝑧 và 𝔸 𝕏 ℎ ϕ ϑ ϵ ᵢ ⱼ ⁿ ₙ ⁺ ₋', 'x cộng y bằng z và a x ℎ symbol symbol symbol chỉ số I chỉ số J mũ N chỉ số N mũ SIGN chỉ số MINUS'),
+    ('Hôm nay chúng ta học về đạo hàm — một khái niệm quan trọng “trong” giải tích…', 'Hôm nay chúng ta học về đạo hàm — một khái niệm quan trọng “trong” giải tích…'),
+    ('Mô hình y = ax + b; hệ số a = 2, b = -3; sai số ≤ 0,5%', 'Mô hình y bằng a nhân x cộng b; hệ số a bằng 2, b bằng âm 3; sai số nhỏ hơn hoặc bằng 0,5%'),
+    ('E = mc², F = ma, P = UI, v = s/t, a*b = c, a^b, x ^ y', 'E bằng mc mũ 2, F bằng ma, P bằng UI, v bằng s chia t, a nhân b bằng c, a mũ b, x mũ y'),
+    ('Bài 1. Tính 12 x 7; Bài 2. Tính 3 * 4 / 2', 'Bài 1. Tính 12 nhân nhân x 7; Bài 2. Tính 3 nhân 4 chia 2'),
+    ('‐ ‑ ‒ – — ― ‘ ’ ‚ ‛ • … ← ™ © ® € £ ¥ ½ ¼ ¾ × ÷', '‐ ‑ ‒ – — ― ‘ ’ ‚ ‛ • … mũi tên trái ™ © ® € £ ¥ ½ ¼ ¾ nhân chia'),
+    ('', ''),
+    (' ', ''),
+    ('\n\nα\n\tβ\n', 'alpha beta'),
+    ('abc def', 'abc def'),
+    ('=', 'bằng'),
+    ('x x x', 'x x x'),
+    ('ax^2 + bx + c', 'a nhân x mũ 2 cộng b nhân x cộng c'),
+    ('2x^3 - x', '2x mũ 3 trừ x'),
+    ('a x', 'a x'),
+    ('π d', 'pi d'),
+    ('10x', '10x'),
+    ('sin²x + cos²x = 1', 'sin mũ 2 nhân nhân x cộng cos mũ 2 nhân nhân x bằng 1'),
+    ('log₂8 = 3, ln e = 1, tan θ = sin θ / cos θ', 'log chỉ số hai8 bằng 3, ln e bằng 1, tan theta bằng sin theta chia cos theta'),
+]
+
+
+def test_golden_outputs():
+    processor = MathFormulaProcessor()
+    for text, expected in GOLDEN:
+        assert processor.process_special_characters(text) == expected, text
+
+
+def test_repeated_calls_and_shared_processor():
+    processor = MathFormulaProcessor()
+    for text, expected in GOLDEN * 2:          # bảng ghi nhớ đã đầy ở lượt 2
+        assert processor.process_special_characters(text) == expected
+        assert process_math_text(text) == expected
+
+
+def test_symbol_table_rebuilt_after_map_change():
+    processor = MathFormulaProcessor()
+    processor.special_char_map['∞'] = ' vô hạn'
+    processor._symbol_table = processor._build_symbol_table()
+    assert processor.process_special_characters("n → ∞") == "n mũi tên phải vô hạn"
+
+
+if __name__ == "__main__":
+    test_golden_outputs()
+    test_repeated_calls_and_shared_processor()
+    test_symbol_table_rebuilt_after_map_change()
+    print("✅ Golden math verbalizer OK")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Test: mel_windows phải cho kết quả giống hệt vòng lặp cũ trong get_data
+"""
+
+import sys
+import os
+
+import numpy as np
+
+# Thêm thư mục gốc vào sys.path (src.generate_batch dùng import dạng src.*)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.generate_batch import mel_windows
+
+
+def reference_mel_windows(spec, num_frames, fps=25, syncnet_mel_step_size=16):
+    """Vòng lặp gốc của get_data, giữ lại để so sánh"""
+    indiv_mels = []
+    for i in range(num_frames):
+        start_frame_num = i-2
+        start_idx = int(80. * (start_frame_num / float(fps)))
+        end_idx = start_idx + syncnet_mel_step_size
+        seq = list(range(start_idx, end_idx))
+        seq = [ min(max(item, 0), spec.shape[0]-1) for item in seq ]
+        m = spec[seq, :]
+        indiv_mels.append(m.T)
+    return np.asarray(indiv_mels)
+
+
+def test_mel_windows_parity():
+    rng = np.random.RandomState(0)
+    for seconds in (0.2, 1, 7.36, 60):
+        num_frames = int(seconds * 25)
+        spec = rng.rand(int(seconds * 80) + 1, 80).astype(np.float32)
+        expected = reference_mel_windows(spec, num_frames)
+        result = mel_windows(spec, np.arange(num_frames))
+        assert result.shape == expected.shape == (num_frames, 80, 16)
+        assert np.array_equal(result, expected)
+
+
+def test_mel_windows_chunks():
+    rng = np.random.RandomState(1)
+    spec = rng.rand(801, 80).astype(np.float32)
+    num_frames = 250
+    whole = mel_windows(spec, np.arange(num_frames))
+    chunks = [mel_windows(spec, np.arange(start, min(start + 64, num_frames))) for start in range(0, num_frames, 64)]
+    assert np.array_equal(np.concatenate(chunks, axis=0), whole)
+
+
+if __name__ == "__main__":
+    test_mel_windows_parity()
+    test_mel_windows_chunks()
+    print("✅ mel_windows khớp với vòng lặp cũ")
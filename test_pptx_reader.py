@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test đọc PPTX một lượt (pptx_reader + process_powerpoint_text) trên deck tự dựng bằng zipfile
+"""
+
+import sys
+import os
+import zipfile
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.utils.math_formula_processor as mfp
+from src.utils.math_formula_processor import MathFormulaProcessor
+from src.utils.pptx_reader import PptxPackage, parse_slide
+
+NS = ('xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+      'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+      'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+      'xmlns:m="http://schemas.openxmlformats.org/officeDocument/2006/math"')
+REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+
+
+def _rels(*rels):
+    body = ''.join(f'<Relationship Id="{rid}" Type="{REL}{t}" Target="{target}"/>' for rid, t, target in rels)
+    return f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{body}</Relationships>'
+
+
+def _xfrm(x, y, cx=2000000, cy=500000, tag='a:xfrm'):
+    return f'<{tag}><a:off x="{x}" y="{y}"/><a:ext cx="{cx}" cy="{cy}"/></{tag}>'
+
+
+def _sp(text, pos=None, ph=None):
+    nv = f'<p:nvPr><p:ph {ph}/></p:nvPr>' if ph else '<p:nvPr/>'
+    paras = ''.join(f'<a:p><a:r><a:t>{line}</a:t></a:r></a:p>' for line in text.split('\n'))
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="1" name="s"/><p:cNvSpPr/>{nv}</p:nvSpPr>'
+            f'<p:spPr>{_xfrm(*pos) if pos else ""}</p:spPr><p:txBody><a:bodyPr/>{paras}</p:txBody></p:sp>')
+
+
+def _table(rows, pos):
+    trs = ''.join('<a:tr h="1">' + ''.join(f'<a:tc><a:txBody><a:bodyPr/><a:p><a:r><a:t>{c}</a:t></a:r></a:p>'
+                                          f'</a:txBody></a:tc>' for c in row) + '</a:tr>' for row in rows)
+    return (f'<p:graphicFrame><p:nvGraphicFramePr><p:cNvPr id="9" name="t"/><p:cNvGraphicFramePr/><p:nvPr/>'
+            f'</p:nvGraphicFramePr>{_xfrm(*pos, tag="p:xfrm")}<a:graphic>'
+            f'<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/table"><a:tbl>{trs}</a:tbl>'
+            f'</a:graphicData></a:graphic></p:graphicFrame>')
+
+
+def _group(children, pos):
+    return (f'<p:grpSp><p:nvGrpSpPr><p:cNvPr id="5" name="g"/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+            f'<p:grpSpPr>{_xfrm(*pos)}</p:grpSpPr>{"".join(children)}</p:grpSp>')
+
+
+def _math_sp(pos):
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="7" name="eq"/><p:cNvSpPr/><p:nvPr/></p:nvSpPr><p:spPr>{_xfrm(*pos)}'
+            f'</p:spPr><p:txBody><a:bodyPr/><a:p><m:oMathPara><m:oMath><m:r><m:t>x²</m:t></m:r>'
+            f'<m:r><m:t>+ 1</m:t></m:r></m:oMath></m:oMathPara></a:p></p:txBody></p:sp>')
+
+
+def _part(root, shapes):
+    return f'<p:{root} {NS}><p:cSld><p:spTree>{"".join(shapes)}</p:spTree></p:cSld></p:{root}>'
+
+
+def build_pptx(path, slides):
+    """slides: list of shape-xml lists, written in reverse file order to check the deck order"""
+    with zipfile.ZipFile(path, 'w') as z:
+        ids = ''.join(f'<p:sldId id="{256 + i}" r:id="rId{i + 2}"/>' for i in range(len(slides)))
+        z.writestr('ppt/presentation.xml', f'<p:presentation {NS}><p:sldIdLst>{ids}</p:sldIdLst>'
+                                           f'<p:sldSz cx="12192000" cy="6858000"/></p:presentation>')
+        z.writestr('ppt/_rels/presentation.xml.rels', _rels(
+            ('rId1', 'slideMaster', 'slideMasters/slideMaster1.xml'),
+            *[(f'rId{i + 2}', 'slide', f'slides/slide{len(slides) - i}.xml') for i in range(len(slides))]))
+        z.writestr('ppt/slideMasters/slideMaster1.xml', _part('sldMaster', [
+            _sp('', (600000, 300000, 11000000, 1200000), ph='type="title"')]))
+        # layout: tiêu đề không có xfrm (lấy từ master), body idx=1 có xfrm riêng
+        z.writestr('ppt/slideLayouts/slideLayout1.xml', _part('sldLayout', [
+            _sp('', None, ph='type="title"'), _sp('', (600000, 1800000, 5000000, 4000000), ph='idx="1"')]))
+        z.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels', _rels(
+            ('rId1', 'slideMaster', '../slideMasters/slideMaster1.xml')))
+        for i, shapes in enumerate(slides):
+            name = f'slide{len(slides) - i}.xml'
+            z.writestr(f'ppt/slides/{name}', _part('sld', shapes))
+            z.writestr(f'ppt/slides/_rels/{name}.rels', _rels(('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml')))
+
+
+def _deck():
+    return [
+        # slide 1: body (placeholder idx=1) nằm dưới tiêu đề dù được khai báo trước
+        [_sp('Nội dung chính', ph='idx="1"'), _sp('Bài 1: Hàm số', ph='type="title"')],
+        # slide 2: bảng luôn đứng cuối, group ghép chữ các con, công thức OMML
+        [_table([['a', 'b'], ['1', '2']], (600000, 400000, 4000000, 800000)),
+         _group([_sp('Phần', (0, 0)), _sp('hai', (0, 600000))], (600000, 2000000, 3000000, 1200000)),
+         _math_sp((600000, 4000000)),
+         _sp('Giới thiệu', (600000, 300000))],
+    ]
+
+
+def test_package_reads_in_deck_order_with_inherited_positions():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'deck.pptx')
+        build_pptx(path, _deck())
+        package = PptxPackage(path)
+        assert package.slide_width == 12192000 and len(package.slides) == 2
+
+        first = parse_slide(*package.slides[0])
+        title = [n for n in first['shapes'] if n['paragraphs'][0][1] == 'Bài 1: Hàm số'][0]
+        assert (title['left'], title['top'], title['width']) == (600000, 300000, 11000000)
+
+        second = parse_slide(*package.slides[1])
+        assert second['math'] == ['x² + 1']
+        assert [n['kind'] for n in second['shapes']] == ['graphicFrame', 'grpSp', 'sp', 'sp']
+
+
+def test_process_powerpoint_text_layout_table_group_math():
+    with tempfile.TemporaryDirectory() as d:
+        os.environ['PPTX_TEXT_CACHE_DIR'] = os.path.join(d, 'cache')
+        path = os.path.join(d, 'deck.pptx')
+        build_pptx(path, _deck())
+        res = MathFormulaProcessor().process_powerpoint_text(path)
+        assert 'error' not in res
+        assert res['total_slides'] == 2 and res['slides_with_math'] == 1
+
+        s1, s2 = res['slides']
+        assert s1['original_text'] == 'Bài 1: Hàm số\nNội dung chính'
+        assert not s1['has_math_objects']
+        assert s2['original_text'] == 'Giới thiệu\nPhần hai\na b\n1 2'
+        assert s2['has_math_objects'] and s2['processed_text'].endswith('x mũ 2 cộng 1')
+
+        # lần hai đọc từ cache (kể cả sau khi xóa cache bộ nhớ)
+        assert len(os.listdir(os.path.join(d, 'cache'))) == 1
+        mfp._pptx_text_memory.clear()
+        assert MathFormulaProcessor().process_powerpoint_text(path) == res
+
+
+def test_process_pool_matches_serial():
+    with tempfile.TemporaryDirectory() as d:
+        os.environ['PPTX_TEXT_CACHE_DIR'] = os.path.join(d, 'cache')
+        path = os.path.join(d, 'deck.pptx')
+        build_pptx(path, _deck() * 20)
+        processor = MathFormulaProcessor()
+        package = PptxPackage(path)
+        jobs = [(i + 1, xml, ph, package.slide_width) for i, (xml, ph) in enumerate(package.slides)]
+        serial = [processor._process_slide(n, parse_slide(xml, ph), w) for n, xml, ph, w in jobs]
+
+        # ép chạy pool kể cả trên máy một nhân
+        old = mfp.PPTX_POOL_MIN_SLIDES, mfp.PPTX_SLIDES_PER_WORKER, os.cpu_count
+        mfp.PPTX_POOL_MIN_SLIDES, mfp.PPTX_SLIDES_PER_WORKER, os.cpu_count = 8, 4, lambda: 2
+        try:
+            assert processor._process_slide_jobs(jobs) == serial
+        finally:
+            mfp.PPTX_POOL_MIN_SLIDES, mfp.PPTX_SLIDES_PER_WORKER, os.cpu_count = old
+
+
+if __name__ == "__main__":
+    test_package_reads_in_deck_order_with_inherited_positions()
+    test_process_powerpoint_text_layout_table_group_math()
+    test_process_pool_matches_serial()
+    print("✅ pptx reader tests passed")
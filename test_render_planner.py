@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Test plan_pip_render: chọn size / enhancer rẻ nhất vẫn đủ độ phân giải giáo viên trên slide
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.render_planner import plan_pip_render, pip_target_width
+
+
+def test_small_overlay_drops_512_and_enhancer():
+    plan = plan_pip_render((1920, 1080), 0.10, 'crop', size=512, enhancer=True)
+    assert pip_target_width(1920, 0.10) == 192
+    assert plan.size == 256 and not plan.enhancer
+    assert plan.output_width == 192
+    assert plan.speedup > 1.0
+    assert plan.seconds_saved(10.0) > 0
+
+
+def test_large_overlay_keeps_request():
+    plan = plan_pip_render((3840, 2160), 0.25, 'crop', size=512, enhancer=True)   # 960px
+    assert plan.size == 512 and plan.enhancer
+    assert plan.output_width is None
+    assert abs(plan.speedup - 1.0) < 1e-9
+
+    # không bao giờ render lớn hơn yêu cầu
+    assert plan_pip_render((3840, 2160), 0.25, 'crop', size=256).size == 256
+
+
+def test_full_mode_downscales_paste_canvas():
+    plan = plan_pip_render((1280, 720), 0.10, 'full', size=256, source_size=(2000, 3000))
+    assert plan.size == 256
+    assert plan.output_width == 128
+    assert plan.cost < plan.requested_cost
+
+
+if __name__ == "__main__":
+    test_small_overlay_drops_512_and_enhancer()
+    test_large_overlay_keeps_request()
+    test_full_mode_downscales_paste_canvas()
+    print("✅ RenderPlanner OK")
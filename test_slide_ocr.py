@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test ocr_slides với _ocr_job giả (không cần tesseract): cache theo hash ảnh, không cache kết quả lỗi (None),
+giữ đúng thứ tự slide và chạy trong tiến trình khi chỉ có một ảnh cần OCR
+"""
+
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.utils.slide_ocr as slide_ocr
+from src.utils.slide_ocr import ocr_slides
+
+
+class FakeOCR():
+    """Thay _ocr_job: text = tên file, trả về None cho các file trong `failing`"""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def __call__(self, args):
+        name = os.path.basename(args[0])
+        self.calls.append(name)
+        return None if name in self.failing else f"text of {name}"
+
+
+def _make_slides(root, n):
+    paths = []
+    for i in range(1, n + 1):
+        path = os.path.join(root, f"slide-{i:02d}.png")
+        with open(path, "wb") as f:
+            f.write(f"slide {i}".encode())     # nội dung khác nhau -> hash khác nhau
+        paths.append(path)
+    return paths
+
+
+def _run(fake, *args, cpu_count=1, **kwargs):
+    original_job, original_count = slide_ocr._ocr_job, os.cpu_count
+    slide_ocr._ocr_job = fake
+    # cpu_count = 1: nhiều ảnh cũng chạy trong tiến trình, process pool không dùng được hàm giả
+    os.cpu_count = lambda: cpu_count
+    try:
+        return ocr_slides(*args, **kwargs)
+    finally:
+        slide_ocr._ocr_job, os.cpu_count = original_job, original_count
+
+
+def test_order_and_cache_hits():
+    with tempfile.TemporaryDirectory() as root:
+        cache = os.path.join(root, "cache")
+        paths = _make_slides(root, 3)
+
+        fake = FakeOCR()
+        texts = _run(fake, paths, cache_root=cache)
+        assert texts == [f"text of slide-0{i}.png" for i in (1, 2, 3)]
+        assert fake.calls == ["slide-01.png", "slide-02.png", "slide-03.png"]
+        assert len(os.listdir(cache)) == 3
+
+        # lần sau: toàn bộ lấy từ cache, thứ tự theo danh sách đầu vào
+        fake = FakeOCR()
+        assert _run(fake, paths[::-1], cache_root=cache) == texts[::-1]
+        assert fake.calls == []
+
+        # khóa cache gồm cả ngôn ngữ / dpi
+        fake = FakeOCR()
+        _run(fake, paths[:1], lang="eng", cache_root=cache)
+        assert fake.calls == ["slide-01.png"]
+
+
+def test_failed_results_are_not_cached():
+    with tempfile.TemporaryDirectory() as root:
+        cache = os.path.join(root, "cache")
+        paths = _make_slides(root, 3)
+
+        fake = FakeOCR(failing={"slide-02.png"})
+        assert _run(fake, paths, cache_root=cache) == ["text of slide-01.png", "", "text of slide-03.png"]
+        assert len(os.listdir(cache)) == 2
+
+        # chỉ slide lỗi được OCR lại
+        fake = FakeOCR()
+        assert _run(fake, paths, cache_root=cache)[1] == "text of slide-02.png"
+        assert fake.calls == ["slide-02.png"]
+
+
+def test_single_image_runs_in_process():
+    with tempfile.TemporaryDirectory() as root:
+        slide_ocr._reset_pool()
+        fake = FakeOCR()
+        paths = _make_slides(root, 1)
+        assert _run(fake, paths, cpu_count=8, cache_root=os.path.join(root, "cache")) == ["text of slide-01.png"]
+        assert fake.calls == ["slide-01.png"]
+        assert slide_ocr._pool is None
+
+
+if __name__ == "__main__":
+    test_order_and_cache_hits()
+    test_failed_results_are_not_cached()
+    test_single_image_runs_in_process()
+    print("✅ ocr_slides: cache, thứ tự và đường chạy trong tiến trình OK")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test: Audio2Pose bản inference_only (không có netD_motion và encoder của CVAE) nạp được checkpoint
+đầy đủ và cho kết quả test() giống hệt bản đầy đủ
+"""
+
+import sys
+import os
+
+import torch
+from yacs.config import CfgNode as CN
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.audio2pose_models.audio2pose import Audio2Pose
+from src.utils.model_registry import module_nbytes, module_report
+
+CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', 'config', 'auido2pose.yaml')
+
+
+def load_cfg():
+    with open(CONFIG) as f:
+        cfg = CN.load_cfg(f)
+    cfg.freeze()
+    return cfg
+
+
+def test_slim_audio2pose_matches_full():
+    cfg = load_cfg()
+    torch.manual_seed(0)
+    full = Audio2Pose(cfg, None, device='cpu').eval()
+    slim = Audio2Pose(cfg, None, device='cpu', inference_only=True).eval()
+    assert slim.netD_motion is None and slim.netG.encoder is None
+
+    # checkpoint đầy đủ: bỏ các khóa chỉ dùng khi huấn luyện, phần còn lại nạp strict
+    state_dict = {k: v for k, v in full.state_dict().items() if not k.startswith(Audio2Pose.TRAINING_ONLY_PREFIXES)}
+    slim.load_state_dict(state_dict)
+    assert module_nbytes(slim) < module_nbytes(full)
+
+    x = {'ref': torch.randn(1, 1, 70), 'class': torch.LongTensor([0]),
+         'indiv_mels': torch.randn(1, 41, 1, 80, 16), 'num_frames': 41}
+    with torch.no_grad():
+        torch.manual_seed(1)
+        expected = full.test(dict(x))['pose_pred']
+        torch.manual_seed(1)
+        got = slim.test(dict(x))['pose_pred']
+    assert torch.allclose(got, expected)
+
+
+def test_module_report_lists_children():
+    slim = Audio2Pose(load_cfg(), None, device='cpu', inference_only=True)
+    report = dict(module_report('audio2pose', slim, depth=1))
+    assert set(report) == {'audio2pose', 'audio2pose.audio_encoder', 'audio2pose.netG'}
+    assert report['audio2pose'] == report['audio2pose.audio_encoder'] + report['audio2pose.netG']
+
+
+if __name__ == "__main__":
+    test_slim_audio2pose_matches_full()
+    test_module_report_lists_children()
+    print("✅ mô hình inference_only khớp với bản đầy đủ")
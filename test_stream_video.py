@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test AnimateFromCoeff.stream_video với output_width (overlay PIP nhỏ) ở chế độ crop và full,
+kể cả ảnh full chưa được crop (không có vùng dán)
+"""
+
+import sys
+import os
+import tempfile
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import src.facerender.animate as animate
+from src.facerender.animate import AnimateFromCoeff
+
+
+class RecordingWriter():
+    """Thay FFmpegVideoWriter: chỉ ghi lại kích thước khung hình"""
+    instances = []
+
+    def __init__(self, save_path, audio_path=None, fps=25, pix_fmt='rgb24'):
+        self.pix_fmt = pix_fmt
+        self.shapes = []
+        RecordingWriter.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write(self, frame):
+        self.shapes.append(frame.shape)
+
+
+def stream(preprocess, crop_info, pic_path=None, output_width=None):
+    chunks = [(0, torch.rand(2, 3, 256, 256)), (2, torch.rand(1, 3, 256, 256))]
+    # stream_video không dùng model nên không cần __init__
+    renderer = AnimateFromCoeff.__new__(AnimateFromCoeff)
+    original = animate.FFmpegVideoWriter
+    animate.FFmpegVideoWriter = RecordingWriter
+    try:
+        renderer.stream_video(chunks, 'out.mp4', None, pic_path, crop_info, preprocess=preprocess,
+                              img_size=256, output_width=output_width)
+    finally:
+        animate.FFmpegVideoWriter = original
+    return RecordingWriter.instances[-1]
+
+
+def test_crop_mode_with_output_width():
+    writer = stream('crop', ((512, 512), None, None), output_width=192)
+    assert writer.pix_fmt == 'rgb24'
+    assert writer.shapes == [(192, 192, 3)] * 3
+
+
+def test_full_mode_with_output_width():
+    with tempfile.TemporaryDirectory() as tmp:
+        pic_path = os.path.join(tmp, 'teacher.png')
+        cv2.imwrite(pic_path, np.full((800, 600, 3), 128, np.uint8))
+
+        # ảnh đã crop: khung hình được dán vào ảnh gốc đã thu nhỏ về output_width
+        crop_info = ((300, 300), (100, 200, 400, 500), (0, 0, 300, 300))
+        writer = stream('full', crop_info, pic_path, output_width=192)
+        assert writer.pix_fmt == 'bgr24'
+        assert writer.shapes == [(256, 192, 3)] * 3
+
+        # ảnh chưa crop: không dán, ghi thẳng khung hình như trước
+        writer = stream('full', ((300, 300),), pic_path, output_width=192)
+        assert writer.pix_fmt == 'rgb24'
+        assert writer.shapes == [(256, 256, 3)] * 3
+
+
+if __name__ == "__main__":
+    test_crop_mode_with_output_width()
+    test_full_mode_with_output_width()
+    print("✅ stream_video đúng ở cả chế độ crop và full khi có output_width")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test TTSCache: khoá theo nội dung + xoá theo LRU khi vượt dung lượng
+"""
+
+import sys
+import os
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.tts_cache import TTSCache
+
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+def test_key_normalizes_text():
+    cache = TTSCache(root=tempfile.mkdtemp())
+    assert cache.key("Xin  chào\n", "edge", "vi-VN-HoaiMyNeural", "vi") == \
+        cache.key("Xin chào", "edge", "vi-VN-HoaiMyNeural", "vi")
+    assert cache.key("Xin chào", "edge", "vi-VN-HoaiMyNeural", "vi") != \
+        cache.key("Xin chào", "edge", "vi-VN-NamMinhNeural", "vi")
+    assert cache.key("Xin chào", "edge", "v", "vi", 1.0) != cache.key("Xin chào", "edge", "v", "vi", 1.25)
+
+
+def test_fetch_returns_copy():
+    with tempfile.TemporaryDirectory() as root:
+        cache = TTSCache(root=os.path.join(root, "cache"))
+        key = cache.key("slide 1", "gtts", "", "vi")
+        assert cache.fetch(key, ".mp3") is None
+
+        src = _write(os.path.join(root, "a.mp3"), 100)
+        cache.store(key, src)
+        out = cache.fetch(key, ".mp3")
+        assert out is not None and out != src
+        os.remove(out)                      # người gọi xoá file tạm
+        assert cache.fetch(key, ".mp3") is not None
+
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as root:
+        cache = TTSCache(root=os.path.join(root, "cache"), max_bytes=250)
+        keys = [cache.key(f"slide {i}", "gtts", "", "vi") for i in range(3)]
+        src = _write(os.path.join(root, "a.wav"), 100)
+
+        cache.store(keys[0], src)
+        cache.store(keys[1], src)
+        past = time.time() - 60
+        os.utime(cache._path(keys[1], ".wav"), (past, past))   # slide 1 dùng lâu nhất
+        cache.store(keys[2], src)
+
+        assert os.path.isfile(cache._path(keys[0], ".wav"))
+        assert not os.path.isfile(cache._path(keys[1], ".wav"))
+        assert os.path.isfile(cache._path(keys[2], ".wav"))
+
+
+if __name__ == "__main__":
+    test_key_normalizes_text()
+    test_fetch_returns_copy()
+    test_lru_eviction()
+    print("✅ TTSCache OK")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test XTTSEngine với model giả (StubXTTSModel) - không cần tải XTTS-v2
+"""
+
+import sys
+import os
+import json
+import wave
+import hashlib
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.xtts_clone import XTTSEngine, XTTSInference, get_xtts_engine, write_wav, CONDITIONING_FILE
+
+
+class StubXTTSModel:
+    """Model giả cùng API get_conditioning_latents / inference với XTTS-v2: trả về một âm sin dài theo độ dài text"""
+
+    output_sample_rate = 24000
+    # config giống xtts_v2: repetition_penalty 5.0 khác mặc định 10.0 của inference()
+    config = SimpleNamespace(temperature=0.75, length_penalty=1.0, repetition_penalty=5.0, top_k=50, top_p=0.85,
+                             gpt_cond_len=30, gpt_cond_chunk_len=4, max_ref_len=30, sound_norm_refs=False)
+
+    def __init__(self):
+        self.conditioning_calls = 0
+        self.inference_calls = 0
+        self.conditioning_kwargs = None
+        self.inference_kwargs = None
+
+    def get_conditioning_latents(self, audio_path, **kwargs):
+        self.conditioning_calls += 1
+        self.conditioning_kwargs = kwargs
+        with open(audio_path[0], "rb") as f:
+            seed = int(hashlib.sha256(f.read()).hexdigest()[:8], 16)
+        g = torch.Generator().manual_seed(seed)
+        return torch.randn(1, 32, 1024, generator=g), torch.randn(1, 512, 1, generator=g)
+
+    def inference(self, text, language, gpt_cond_latent, speaker_embedding, **kwargs):
+        self.inference_calls += 1
+        self.inference_kwargs = kwargs
+        n = int(self.output_sample_rate * (0.2 + 0.05 * len(text)))
+        t = np.arange(n, dtype=np.float32) / self.output_sample_rate
+        return {"wav": 0.1 * np.sin(2 * np.pi * 220.0 * t)}
+
+
+def _make_voice(root):
+    """Tạo thư mục giọng giống create_cloned_voice: config.json + reference_16k_mono.wav"""
+    voice_dir = os.path.join(root, "123_teacher")
+    os.makedirs(voice_dir)
+    write_wav(os.path.join(voice_dir, "reference_16k_mono.wav"), [0.0, 0.1, -0.1, 0.2] * 4000, 16000)
+    with open(os.path.join(voice_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"display_name": "teacher", "reference_wav": "reference_16k_mono.wav"}, f)
+    return voice_dir, os.path.join(voice_dir, "reference_16k_mono.wav")
+
+
+def test_conditioning_computed_once_and_persisted():
+    with tempfile.TemporaryDirectory() as root:
+        voice_dir, ref_wav = _make_voice(root)
+
+        model = StubXTTSModel()
+        engine = XTTSEngine(model=model)
+        for text in ("Xin chào", "Slide hai", "Slide ba"):
+            out = engine.synthesize(text, "vi", ref_wav, use_cache=False)
+            with wave.open(out) as f:
+                assert f.getframerate() == StubXTTSModel.output_sample_rate
+                assert f.getnframes() > 0
+            os.remove(out)
+
+        assert model.conditioning_calls == 1
+        assert model.inference_calls == 3
+        assert os.path.isfile(os.path.join(voice_dir, CONDITIONING_FILE))
+
+        # tiến trình mới: đọc latent từ đĩa, không tính lại
+        model2 = StubXTTSModel()
+        os.remove(XTTSEngine(model=model2).synthesize("Slide bốn", "vi", ref_wav, use_cache=False))
+        assert model2.conditioning_calls == 0
+
+
+def test_settings_come_from_model_config():
+    with tempfile.TemporaryDirectory() as root:
+        _, ref_wav = _make_voice(root)
+        model = StubXTTSModel()
+        os.remove(XTTSEngine(model=model).synthesize("Xin chào", "vi", ref_wav, use_cache=False))
+        assert model.inference_kwargs == {"temperature": 0.75, "length_penalty": 1.0, "repetition_penalty": 5.0,
+                                          "top_k": 50, "top_p": 0.85}
+        assert model.conditioning_kwargs == {"gpt_cond_len": 30, "gpt_cond_chunk_len": 4, "max_ref_length": 30,
+                                             "sound_norm_refs": False}
+
+        # latent đã lưu với thiết lập khác thì phải tính lại
+        model = StubXTTSModel()
+        model.config = SimpleNamespace(**dict(vars(StubXTTSModel.config), gpt_cond_len=12))
+        XTTSEngine(model=model).conditioning(ref_wav)
+        assert model.conditioning_calls == 1
+
+
+def test_conditioning_refreshed_when_reference_changes():
+    with tempfile.TemporaryDirectory() as root:
+        _, ref_wav = _make_voice(root)
+        XTTSEngine(model=StubXTTSModel()).conditioning(ref_wav)
+
+        write_wav(ref_wav, [0.3, -0.3] * 8000, 16000)
+        model = StubXTTSModel()
+        XTTSEngine(model=model).conditioning(ref_wav)
+        assert model.conditioning_calls == 1
+
+
+def test_xtts_inference_shares_engine():
+    model = StubXTTSModel()
+    engine = get_xtts_engine(model=model)
+    assert XTTSInference().engine is engine
+    assert XTTSInference().engine is engine
+
+
+if __name__ == "__main__":
+    test_conditioning_computed_once_and_persisted()
+    test_settings_come_from_model_config()
+    test_conditioning_refreshed_when_reference_changes()
+    test_xtts_inference_shares_engine()
+    print("✅ XTTSEngine OK")